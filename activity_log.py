@@ -0,0 +1,469 @@
+import os
+import json
+import time
+import queue
+import atexit
+import sqlite3
+import datetime
+import threading
+
+LOG_DIR = "logs"                          # Directory holding the activity log segments
+ACTIVE_SEGMENT_NAME = "activity.jsonl"    # Segment currently being appended to
+SEGMENT_MAX_BYTES = 5 * 1024 * 1024       # Rotate the active segment once it grows past this size
+SEGMENT_MAX_AGE = 24 * 60 * 60            # Rotate the active segment once it is older than this (seconds)
+MAX_SEGMENTS = 20                         # Number of rotated segments to keep on disk
+READ_BLOCK_SIZE = 64 * 1024               # Block size used when tail-reading segments backwards
+
+INDEX_DB_NAME = "activity_index.db"       # SQLite index of all entries, kept next to the segments
+INDEX_RETENTION_DAYS = 365                # Entries older than this are pruned from the index
+INDEX_PRUNE_INTERVAL = 60 * 60            # How often the writer prunes expired index entries (seconds)
+QUERY_DEFAULT_LIMIT = 100
+QUERY_MAX_LIMIT = 1000
+
+QUEUE_MAX_SIZE = 10000                    # Entries buffered before new ones are dropped
+BATCH_MAX_ENTRIES = 200                   # Flush once this many entries are pending...
+FLUSH_INTERVAL = 0.5                      # ...or once the oldest pending entry is this old (seconds)
+
+
+def _iter_lines_reversed(path, block_size=READ_BLOCK_SIZE):
+    """Yields the non-empty lines of a file from last to first without reading the whole file."""
+    with open(path, 'rb') as f:
+        f.seek(0, os.SEEK_END)
+        position = f.tell()
+        remainder = b''
+        while position > 0:
+            read_size = min(block_size, position)
+            position -= read_size
+            f.seek(position)
+            lines = (f.read(read_size) + remainder).split(b'\n')
+            remainder = lines[0]  # May be the tail of a line that started in an earlier block
+            for line in reversed(lines[1:]):
+                if line.strip():
+                    yield line
+        if remainder.strip():
+            yield remainder
+
+
+class ActivityLogStore:
+    """
+    Append-only JSON-lines activity log.
+
+    Each entry is written as a single line with one write() call on a file opened
+    with O_APPEND, so concurrent writers never interleave or lose entries. The active
+    segment is rotated by size and age; readers tail the segments backwards, so
+    fetching the newest N entries never parses the whole history.
+    """
+
+    def __init__(self, log_dir=LOG_DIR, max_segment_bytes=SEGMENT_MAX_BYTES,
+                 max_segment_age=SEGMENT_MAX_AGE, max_segments=MAX_SEGMENTS):
+        self.log_dir = os.path.abspath(log_dir)
+        self.max_segment_bytes = max_segment_bytes
+        self.max_segment_age = max_segment_age
+        self.max_segments = max_segments
+        self.active_path = os.path.join(self.log_dir, ACTIVE_SEGMENT_NAME)
+
+        self._lock = threading.Lock()
+        self._fd = None
+        self._segment_size = 0
+        self._segment_started = None
+
+    # --- Writing ---
+    def append(self, entry):
+        """Appends a single log entry (a JSON-serialisable dict)."""
+        self.append_many([entry])
+
+    def append_many(self, entries):
+        """Appends several entries with a single write, oldest first."""
+        if not entries:
+            return
+        data = b''.join(
+            json.dumps(entry, ensure_ascii=False, separators=(',', ':')).encode('utf-8') + b'\n'
+            for entry in entries
+        )
+        with self._lock:
+            self._open_active_segment()
+            if self._should_rotate():
+                self._rotate()
+                self._open_active_segment()
+            os.write(self._fd, data)
+            self._segment_size += len(data)
+
+    def close(self):
+        """Closes the active segment file descriptor."""
+        with self._lock:
+            if self._fd is not None:
+                os.close(self._fd)
+                self._fd = None
+
+    def _open_active_segment(self):
+        """Opens the active segment for appending if it is not open already. Caller holds the lock."""
+        if self._fd is not None:
+            return
+        os.makedirs(self.log_dir, exist_ok=True)
+        self._fd = os.open(self.active_path, os.O_WRONLY | os.O_APPEND | os.O_CREAT, 0o644)
+        self._segment_size = os.fstat(self._fd).st_size
+        self._segment_started = self._read_segment_start_time() if self._segment_size else time.time()
+
+    def _read_segment_start_time(self):
+        """Returns the timestamp of the first entry in the active segment, falling back to now."""
+        try:
+            with open(self.active_path, 'rb') as f:
+                first_entry = json.loads(f.readline())
+            return datetime.datetime.fromisoformat(first_entry['timestamp']).timestamp()
+        except (OSError, ValueError, KeyError, TypeError):
+            return time.time()
+
+    def _should_rotate(self):
+        if self._segment_size == 0:
+            return False
+        if self._segment_size >= self.max_segment_bytes:
+            return True
+        return time.time() - self._segment_started >= self.max_segment_age
+
+    def _rotate(self):
+        """Moves the active segment aside and prunes old segments. Caller holds the lock."""
+        os.close(self._fd)
+        self._fd = None
+        suffix = datetime.datetime.now().strftime('%Y%m%dT%H%M%S_%f')
+        rotated_path = os.path.join(self.log_dir, f"activity.{suffix}.jsonl")
+        try:
+            os.replace(self.active_path, rotated_path)
+        except OSError as e:
+            print(f"ERROR: Could not rotate activity log segment '{self.active_path}': {e}")
+            return
+
+        for old_segment in self._rotated_segments()[self.max_segments:]:
+            try:
+                os.remove(old_segment)
+            except OSError as e:
+                print(f"WARNING: Could not remove old activity log segment '{old_segment}': {e}")
+
+    # --- Reading ---
+    def _rotated_segments(self):
+        """Returns rotated segment paths, newest first."""
+        try:
+            names = os.listdir(self.log_dir)
+        except OSError:
+            return []
+        rotated = [name for name in names
+                   if name.startswith('activity.') and name.endswith('.jsonl') and name != ACTIVE_SEGMENT_NAME]
+        rotated.sort(reverse=True)  # Suffixes are timestamps, so lexical order is chronological
+        return [os.path.join(self.log_dir, name) for name in rotated]
+
+    def iter_newest_first(self):
+        """Yields log entries newest first, reading segments backwards lazily."""
+        for segment_path in [self.active_path] + self._rotated_segments():
+            try:
+                for line in _iter_lines_reversed(segment_path):
+                    try:
+                        yield json.loads(line)
+                    except ValueError:
+                        continue  # Torn or corrupted line, e.g. after a crash mid-write
+            except FileNotFoundError:
+                continue  # Segment was rotated or pruned while we were reading
+            except OSError as e:
+                print(f"Error reading log segment '{segment_path}': {e}")
+
+    def iter_oldest_first(self):
+        """Yields log entries oldest first by reading each segment forwards."""
+        for segment_path in reversed(self._rotated_segments()):
+            yield from self._iter_segment_forwards(segment_path)
+        yield from self._iter_segment_forwards(self.active_path)
+
+    def _iter_segment_forwards(self, segment_path):
+        try:
+            with open(segment_path, 'rb') as f:
+                for line in f:
+                    if not line.strip():
+                        continue
+                    try:
+                        yield json.loads(line)
+                    except ValueError:
+                        continue
+        except FileNotFoundError:
+            return
+        except OSError as e:
+            print(f"Error reading log segment '{segment_path}': {e}")
+
+    def get_recent(self, count=20):
+        """Returns up to `count` of the newest entries, newest first."""
+        entries = []
+        if count <= 0:
+            return entries
+        for entry in self.iter_newest_first():
+            entries.append(entry)
+            if len(entries) >= count:
+                break
+        return entries
+
+    def import_legacy_json(self, legacy_path):
+        """
+        One-time migration of the old logs.json (a newest-first JSON array) into the
+        append-only store. The legacy file is renamed so the import never runs twice.
+        """
+        if not os.path.exists(legacy_path):
+            return
+        try:
+            with open(legacy_path, 'r', encoding='utf-8') as f:
+                legacy_logs = json.load(f)
+            if isinstance(legacy_logs, list):
+                self.append_many([entry for entry in reversed(legacy_logs) if isinstance(entry, dict)])
+            os.replace(legacy_path, legacy_path + ".migrated")
+            print(f"INFO: Migrated {len(legacy_logs) if isinstance(legacy_logs, list) else 0} entries from '{legacy_path}' to '{self.log_dir}'.")
+        except (ValueError, OSError) as e:
+            print(f"Error migrating legacy log file '{legacy_path}': {e}")
+
+
+class ActivityLogIndex:
+    """
+    SQLite index over the activity log for long-retention filtered queries.
+
+    Results are ordered by (timestamp, id) and that pair is also the keyset cursor,
+    so the (column, timestamp) indexes let SQLite answer "newest N entries for this
+    user / action / IP in this time range" by walking one index backwards instead of
+    scanning or sorting the table.
+    """
+
+    SCHEMA = """
+    CREATE TABLE IF NOT EXISTS activity_log (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        timestamp TEXT NOT NULL,
+        username TEXT,
+        ip_address TEXT,
+        action TEXT,
+        details TEXT
+    );
+    CREATE INDEX IF NOT EXISTS idx_activity_timestamp ON activity_log(timestamp);
+    CREATE INDEX IF NOT EXISTS idx_activity_username ON activity_log(username, timestamp);
+    CREATE INDEX IF NOT EXISTS idx_activity_action ON activity_log(action, timestamp);
+    CREATE INDEX IF NOT EXISTS idx_activity_ip_address ON activity_log(ip_address, timestamp);
+    """
+    COLUMNS = ("timestamp", "username", "ip_address", "action", "details")
+
+    def __init__(self, db_path=os.path.join(LOG_DIR, INDEX_DB_NAME), retention_days=INDEX_RETENTION_DAYS):
+        self.db_path = os.path.abspath(db_path)
+        self.retention_days = retention_days
+        self._local = threading.local()
+        self._write_lock = threading.Lock()
+        self._last_prune = 0
+        os.makedirs(os.path.dirname(self.db_path), exist_ok=True)
+        with self._write_lock:
+            conn = self._connect()
+            conn.executescript(self.SCHEMA)
+            conn.commit()
+
+    def _connect(self):
+        """Returns this thread's connection, opening it on first use."""
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            conn = sqlite3.connect(self.db_path, timeout=10)
+            conn.row_factory = sqlite3.Row
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+        return conn
+
+    def is_empty(self):
+        return self._connect().execute("SELECT 1 FROM activity_log LIMIT 1").fetchone() is None
+
+    def add_many(self, entries):
+        """Inserts entries (oldest first) in one transaction and prunes expired rows now and then."""
+        rows = [tuple(entry.get(column) for column in self.COLUMNS) for entry in entries]
+        with self._write_lock:
+            conn = self._connect()
+            with conn:
+                conn.executemany(
+                    f"INSERT INTO activity_log ({', '.join(self.COLUMNS)}) VALUES (?, ?, ?, ?, ?)", rows
+                )
+            if time.time() - self._last_prune >= INDEX_PRUNE_INTERVAL:
+                self._last_prune = time.time()
+                self._prune(conn)
+
+    def _prune(self, conn):
+        if not self.retention_days:
+            return
+        cutoff = (datetime.datetime.now() - datetime.timedelta(days=self.retention_days)).isoformat()
+        with conn:
+            conn.execute("DELETE FROM activity_log WHERE timestamp < ?", (cutoff,))
+
+    def backfill_from(self, store, batch_size=5000):
+        """Fills an empty index from the JSON-lines segments (e.g. on first start)."""
+        if not self.is_empty():
+            return 0
+        batch, total = [], 0
+        for entry in store.iter_oldest_first():
+            batch.append(entry)
+            if len(batch) >= batch_size:
+                self.add_many(batch)
+                total += len(batch)
+                batch = []
+        if batch:
+            self.add_many(batch)
+            total += len(batch)
+        if total:
+            print(f"INFO: Indexed {total} existing activity log entries into '{self.db_path}'.")
+        return total
+
+    def query(self, username=None, actions=None, ip_address=None, since=None, until=None,
+              cursor=None, limit=QUERY_DEFAULT_LIMIT):
+        """
+        Returns entries matching all given filters, newest first.
+        `since`/`until` are ISO timestamps (inclusive/exclusive), `cursor` is the
+        `next_cursor` of a previous page. Returns {"entries": [...], "next_cursor": str or None}.
+        Raises ValueError for a malformed cursor.
+        """
+        limit = max(1, min(int(limit), QUERY_MAX_LIMIT))
+        clauses, params = [], []
+        if username:
+            clauses.append("username = ?")
+            params.append(username)
+        if actions:
+            clauses.append(f"action IN ({', '.join('?' * len(actions))})")
+            params.extend(actions)
+        if ip_address:
+            clauses.append("ip_address = ?")
+            params.append(ip_address)
+        if since:
+            clauses.append("timestamp >= ?")
+            params.append(since)
+        if until:
+            clauses.append("timestamp < ?")
+            params.append(until)
+        if cursor:
+            cursor_timestamp, _, cursor_id = cursor.rpartition('|')
+            clauses.append("(timestamp, id) < (?, ?)")
+            params.extend([cursor_timestamp, int(cursor_id)])
+        where = f"WHERE {' AND '.join(clauses)}" if clauses else ""
+        rows = self._connect().execute(
+            f"SELECT id, {', '.join(self.COLUMNS)} FROM activity_log {where} "
+            f"ORDER BY timestamp DESC, id DESC LIMIT ?",
+            params + [limit + 1]
+        ).fetchall()
+
+        entries = [dict(row) for row in rows[:limit]]
+        next_cursor = None
+        if len(rows) > limit:
+            next_cursor = f"{entries[-1]['timestamp']}|{entries[-1]['id']}"
+        return {"entries": entries, "next_cursor": next_cursor}
+
+
+class ActivityLogPipeline:
+    """
+    Moves activity logging off the request path.
+
+    Requests call submit(), which only puts the entry on a bounded queue. A writer
+    thread drains the queue in batches (by count or time), appends each batch to the
+    store with a single write (and to the query index, if any) and then calls the flush listeners once per batch with
+    the entries that should be broadcast. If the queue is full the entry is dropped
+    and counted rather than blocking the request.
+    """
+
+    def __init__(self, store, index=None, max_queue_size=QUEUE_MAX_SIZE, batch_size=BATCH_MAX_ENTRIES,
+                 flush_interval=FLUSH_INTERVAL):
+        self.store = store
+        self.index = index
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self._queue = queue.Queue(maxsize=max_queue_size)
+        self._flush_listeners = []
+        self._stop_event = threading.Event()
+        self._thread = None
+        self._stats_lock = threading.Lock()
+        self._stats = {
+            "submitted": 0,
+            "dropped": 0,
+            "written": 0,
+            "write_errors": 0,
+            "index_errors": 0,
+            "batches": 0,
+        }
+
+    def add_flush_listener(self, listener):
+        """Registers a callable that receives the list of broadcastable entries after each flush."""
+        self._flush_listeners.append(listener)
+
+    def start(self):
+        """Starts the writer thread (idempotent)."""
+        if self._thread is not None and self._thread.is_alive():
+            return
+        self._stop_event.clear()
+        self._thread = threading.Thread(target=self._run, name="activity-log-writer", daemon=True)
+        self._thread.start()
+        atexit.register(self.stop)
+
+    def stop(self, timeout=5):
+        """Flushes whatever is still queued and stops the writer thread."""
+        self._stop_event.set()
+        if self._thread is not None:
+            self._thread.join(timeout)
+            self._thread = None
+
+    def submit(self, entry, broadcast=False):
+        """Queues an entry for writing. Never blocks; returns False if the entry was dropped."""
+        if self._thread is None:
+            # No writer running (e.g. used from a script): write synchronously
+            self._flush([(entry, broadcast)])
+            return True
+        try:
+            self._queue.put_nowait((entry, broadcast))
+        except queue.Full:
+            with self._stats_lock:
+                self._stats["dropped"] += 1
+            return False
+        with self._stats_lock:
+            self._stats["submitted"] += 1
+        return True
+
+    def get_stats(self):
+        """Returns pipeline counters, including the current queue depth."""
+        with self._stats_lock:
+            stats = dict(self._stats)
+        stats["queue_depth"] = self._queue.qsize()
+        stats["queue_capacity"] = self._queue.maxsize
+        return stats
+
+    def _run(self):
+        while not (self._stop_event.is_set() and self._queue.empty()):
+            try:
+                batch = [self._queue.get(timeout=self.flush_interval)]
+            except queue.Empty:
+                continue
+            deadline = time.monotonic() + self.flush_interval
+            while len(batch) < self.batch_size:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                try:
+                    batch.append(self._queue.get(timeout=remaining))
+                except queue.Empty:
+                    break
+            self._flush(batch)
+
+    def _flush(self, batch):
+        entries = [entry for entry, _ in batch]
+        try:
+            self.store.append_many(entries)
+            with self._stats_lock:
+                self._stats["written"] += len(entries)
+                self._stats["batches"] += 1
+        except OSError as e:
+            with self._stats_lock:
+                self._stats["write_errors"] += len(entries)
+            print(f"Error writing to activity log '{self.store.active_path}': {e}")
+
+        if self.index is not None:
+            try:
+                self.index.add_many(entries)
+            except sqlite3.Error as e:
+                with self._stats_lock:
+                    self._stats["index_errors"] += len(entries)
+                print(f"Error writing to activity log index '{self.index.db_path}': {e}")
+
+        broadcast_entries = [entry for entry, broadcast in batch if broadcast]
+        if not broadcast_entries:
+            return
+        for listener in self._flush_listeners:
+            try:
+                listener(broadcast_entries)
+            except Exception as e:
+                print(f"Error in activity log flush listener: {e}")
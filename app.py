@@ -1,5 +1,5 @@
 from flask import Flask, render_template, request, redirect, url_for, session, jsonify, send_from_directory, g
-from flask_socketio import SocketIO, emit
+from flask_socketio import SocketIO, emit, join_room, leave_room
 import os
 from dotenv import load_dotenv
 import datetime # Added for logging
@@ -9,18 +9,11 @@ import time
 import atexit
 
 from config import get_config, save_config # save_config is needed for updating user SIDs
-from auth import login_required, handle_login, handle_logout, get_current_user_info, get_active_users_count, add_activity_log, read_logs, get_recent_logs, get_real_ip, generate_browser_fingerprint, get_browser_data # Added read_logs, get_recent_logs, get_real_ip, generate_browser_fingerprint, get_browser_data
+from auth import login_required, handle_login, handle_logout, get_current_user_info, get_active_users_count, add_activity_log, read_logs, get_recent_logs, get_real_ip, generate_browser_fingerprint, get_browser_data, activity_log_pipeline, query_logs # Added read_logs, get_recent_logs, get_real_ip, generate_browser_fingerprint, get_browser_data
 from file_manager import FileManager
-
-# File system monitoring
-try:
-    from watchdog.observers import Observer
-    from watchdog.events import FileSystemEventHandler
-    WATCHDOG_AVAILABLE = True
-except ImportError:
-    print("WARNING: watchdog library not installed. External file changes will not be detected.")
-    print("Install with: pip install watchdog")
-    WATCHDOG_AVAILABLE = False
+from download_offload import offloaded_file_response
+from metadata_index import SQLITE_MAX_INTEGER
+from werkzeug.exceptions import RequestedRangeNotSatisfiable
 
 load_dotenv() # Load environment variables from .env if present
 
@@ -43,7 +36,59 @@ active_connections = {
     '/logs': set()      # Set of SIDs connected to /logs namespace
 }
 
-# External file monitoring system removed as requested
+def _relative_to_managed_dir(abs_path):
+    rel_path = os.path.relpath(abs_path, file_manager.managed_dir).replace('\\', '/')
+    return '' if rel_path == '.' else rel_path
+
+# Clients viewing a directory join its room and only receive changes to that directory
+watched_directories = {}  # SID -> directory (relative path) it watches on /updates
+
+def _directory_room(rel_path):
+    return f"dir:{rel_path}"
+
+def broadcast_file_changes(abs_paths, external):
+    """
+    FileManager change listener: sends each watching client the delta for its directory,
+    the changed entries ('upserted', full listing records) and the names that are gone
+    ('removed'), instead of making every client reload its listing.
+    """
+    deltas = {}  # parent directory -> (upserted, removed)
+    for abs_path in dict.fromkeys(abs_paths):
+        rel_path = _relative_to_managed_dir(abs_path)
+        if rel_path == '':
+            # The whole tree may have changed (e.g. the watcher overflowed)
+            socketio.emit('file_changed', {'rescan': True, 'external': external}, namespace='/updates')
+            return
+        entry = file_manager.get_entry_info(abs_path)
+        upserted, removed = deltas.setdefault(os.path.dirname(rel_path), ([], []))
+        if entry is None:
+            removed.append(os.path.basename(rel_path))
+        else:
+            upserted.append(entry)
+        if entry is None or entry['type'] == 'directory':
+            # Clients inside this directory can't patch their view from the parent's delta
+            socketio.emit('file_changed', {
+                'directory': rel_path,
+                'refresh': True,
+                'deleted': entry is None,
+                'external': external
+            }, to=_directory_room(rel_path), namespace='/updates')
+
+    for directory, (upserted, removed) in deltas.items():
+        socketio.emit('file_changed', {
+            'directory': directory,
+            'upserted': upserted,
+            'removed': removed,
+            'external': external
+        }, to=_directory_room(directory), namespace='/updates')
+
+def broadcast_upload_job(job):
+    """FileManager upload job listener: pushes finalization status and progress to the clients."""
+    socketio.emit('upload_job', job, namespace='/updates')
+
+if file_manager:
+    file_manager.add_change_listener(broadcast_file_changes)
+    file_manager.add_upload_job_listener(broadcast_upload_job)
 
 def get_active_users_count():
     """
@@ -53,10 +98,17 @@ def get_active_users_count():
     return len(active_connections['/updates'])
 
 # --- Utility ---
+def broadcast_activity_batch(entries):
+    """Flush listener for the activity log pipeline: one Socket.IO emit per flushed batch."""
+    socketio.emit('new_activity_batch', {'entries': entries}, namespace='/logs')
+
+activity_log_pipeline.add_flush_listener(broadcast_activity_batch)
+
 def log_user_activity(action, details="", username=None, ip_address=None):
     """
-    Log user or system activity and broadcast it.
+    Log user or system activity and queue it for broadcast.
     Can be called with specific user info, or will try to get it from the request context.
+    The write and the Socket.IO broadcast happen in the background log writer.
     """
     try:
         if username is None or ip_address is None:
@@ -70,20 +122,8 @@ def log_user_activity(action, details="", username=None, ip_address=None):
                 username = username or "SYSTEM"
                 ip_address = ip_address or "N/A"
         
-        # Add entry to the persistent log file
-        add_activity_log(username, ip_address, action, details)
-        
-        # Prepare data for SocketIO broadcast
-        log_data = {
-            'timestamp': datetime.datetime.now().isoformat(),
-            'username': username,
-            'ip_address': ip_address,
-            'action': action,
-            'details': details
-        }
-        
-        # Always broadcast the activity via SocketIO
-        socketio.emit('new_activity', log_data, namespace='/logs')
+        # Queue the entry; it is written and broadcast (batched) by the log writer thread
+        add_activity_log(username, ip_address, action, details, broadcast=True)
         
     except Exception as e:
         print(f"Error logging user activity: {e}")
@@ -124,7 +164,7 @@ def logout():
     if user_info:
         log_user_activity("logout", f"Username: {user_info.get('username', 'Unknown')}")
     
-    handle_logout() # This function in auth.py removes the user from config['users'] and saves config
+    handle_logout() # This function in auth.py clears the user from the session
     
     # After user is removed by handle_logout, get the fresh count and broadcast
     current_active_users = get_active_users_count()
@@ -160,7 +200,20 @@ def list_files_api(req_path):
         # req_path can be empty if called from list_files_root_api
         # It will have a value if matched by /api/files/<path:req_path>
         req_path = req_path.strip('/') 
-        data = file_manager.list_directory(req_path)
+        cursor = request.args.get('cursor') or None
+        try:
+            limit = request.args.get('limit', type=int)
+        except ValueError:
+            limit = None
+        if 'limit' in request.args and limit is None:
+            return jsonify({"error": "Invalid limit. It must be an integer."}), 400
+        data = file_manager.list_directory(
+            req_path,
+            sort=request.args.get('sort', 'name'),
+            order=request.args.get('order', 'asc'),
+            limit=limit,
+            cursor=cursor
+        )
         
         if data.get("error"):
             # Distinguish between path not found/not a dir and other errors for status codes
@@ -170,8 +223,18 @@ def list_files_api(req_path):
                  return jsonify(data), 403 # Forbidden if permission issue
             return jsonify(data), 400 # Bad request for other logical errors from FileManager
         
-        log_user_activity("list_dir", f"Path: /{req_path if req_path else ''}")
-        return jsonify(data)
+        if not cursor: # Follow-up pages of the same listing are not logged again
+            log_user_activity("list_dir", f"Path: /{req_path if req_path else ''}")
+
+        # Strong ETag so clients can revalidate with If-None-Match instead of re-downloading the listing
+        etag = data.pop("etag")
+        if request.if_none_match.contains(etag):
+            response = app.response_class(status=304)
+        else:
+            response = jsonify(data)
+        response.set_etag(etag)
+        response.headers['Cache-Control'] = 'private, no-cache'
+        return response
     except PermissionError as e: # Raised by _get_safe_path for traversal attempts
         log_user_activity("access_denied", f"Attempted: View Directory, Path: /{req_path}, Error: {str(e)}")
         return jsonify({"error": str(e)}), 403
@@ -182,6 +245,102 @@ def list_files_api(req_path):
         return jsonify({"error": "An unexpected server error occurred while listing files."}), 500
 
 
+@app.route('/api/usage/', defaults={'req_path': ''}, methods=['GET'])
+@app.route('/api/usage/<path:req_path>', methods=['GET'])
+@login_required
+def usage_api(req_path):
+    """Recursive size and file count of a path, with its largest children. `complete` is false while the first crawl runs."""
+    if not file_manager:
+        return jsonify({"error": "FileManager not initialized"}), 500
+    data = file_manager.get_usage(req_path.strip('/'))
+    if data.get("error"):
+        if "not found" in data["error"]:
+            return jsonify(data), 404
+        return jsonify(data), 403
+    return jsonify(data)
+
+@app.route('/api/file/checksum', methods=['GET'])
+@login_required
+def file_checksum_api():
+    """Digest recorded for a file when it was uploaded (404 if none, or the file changed since)."""
+    if not file_manager:
+        return jsonify({"error": "FileManager not initialized"}), 500
+    file_path = request.args.get('path')
+    if not file_path:
+        return jsonify({"error": "File path is required."}), 400
+    try:
+        result = file_manager.get_checksum(file_path)
+    except PermissionError as e:
+        log_user_activity("access_denied", f"Attempted: File Checksum, Path: {file_path}, Error: {str(e)}")
+        return jsonify({"error": str(e)}), 403
+    if result.get("error"):
+        return jsonify(result), 404
+    return jsonify(result)
+
+def _parse_search_time(value):
+    """Accepts epoch seconds or an ISO timestamp; returns epoch seconds or None."""
+    if not value:
+        return None
+    try:
+        return float(value)
+    except ValueError:
+        return datetime.datetime.fromisoformat(value).timestamp()
+
+def _parse_search_size(value):
+    """Parses a size filter in bytes; None if absent, ValueError if malformed or out of range."""
+    if not value:
+        return None
+    size = int(value)
+    if not 0 <= size <= SQLITE_MAX_INTEGER:
+        raise ValueError(f"Size out of range: {value}")
+    return size
+
+@app.route('/api/search', methods=['GET'])
+@login_required
+def search_files_api():
+    """
+    Searches the metadata index of the whole managed directory.
+    Query parameters: q (name substring, or a glob if it contains * ? [), type (file/directory),
+    ext (comma-separated), path (subtree), min_size/max_size (bytes),
+    modified_after/modified_before (ISO timestamp or epoch seconds), cursor and limit.
+    """
+    if not file_manager:
+        return jsonify({"error": "FileManager not initialized"}), 500
+    args = request.args
+    item_type = args.get('type') or None
+    if item_type not in (None, 'file', 'directory'):
+        return jsonify({"error": "Invalid 'type' parameter. Use 'file' or 'directory'."}), 400
+    try:
+        min_size = _parse_search_size(args.get('min_size'))
+        max_size = _parse_search_size(args.get('max_size'))
+        modified_after = _parse_search_time(args.get('modified_after'))
+        modified_before = _parse_search_time(args.get('modified_before'))
+        limit = int(args.get('limit', 100))
+    except ValueError:
+        return jsonify({"error": "Invalid size, date or 'limit' parameter."}), 400
+
+    extensions = [ext.strip() for ext in args.get('ext', '').split(',') if ext.strip()]
+    try:
+        result = file_manager.search(
+            query=args.get('q') or None,
+            item_type=item_type,
+            extensions=extensions or None,
+            path=args.get('path') or None,
+            min_size=min_size,
+            max_size=max_size,
+            modified_after=modified_after,
+            modified_before=modified_before,
+            cursor=args.get('cursor') or None,
+            limit=limit
+        )
+    except ValueError:
+        return jsonify({"error": "Invalid 'cursor' parameter."}), 400
+    except Exception as e:
+        print(f"Error searching files: {e}")
+        return jsonify({"error": "An error occurred while searching files."}), 500
+    result["index_ready"] = file_manager.metadata_index.ready
+    return jsonify(result)
+
 @app.route('/api/file/content', methods=['GET', 'POST'])
 @login_required
 def file_content_api():
@@ -216,10 +375,6 @@ def file_content_api():
             if result.get("error"):
                 return jsonify(result), 400
             log_user_activity("save_file", f"Path: {file_path}")
-            
-
-                
-            socketio.emit('file_changed', {'path': file_path, 'action': 'modified'}, namespace='/updates')
             return jsonify(result)
         except PermissionError as e:
             log_user_activity("access_denied", f"Attempted: Save File, Path: {file_path}, Error: {str(e)}")
@@ -243,10 +398,6 @@ def create_folder_api():
         if result.get("error"):
             return jsonify(result), 400
         log_user_activity("create_folder", f"Path: {folder_path}")
-        
-
-            
-        socketio.emit('file_changed', {'path': folder_path, 'action': 'created', 'type': 'folder'}, namespace='/updates')
         return jsonify(result)
     except PermissionError as e:
         log_user_activity("access_denied", f"Attempted: Create Folder, Path: {folder_path}, Error: {str(e)}")
@@ -270,7 +421,6 @@ def delete_item_api():
         if result.get("error"):
             return jsonify(result), 400 # Or 404 if not found
         log_user_activity("delete", f"Path: {item_path}")
-        socketio.emit('file_changed', {'path': item_path, 'action': 'deleted'}, namespace='/updates')
         return jsonify(result)
     except PermissionError as e:
         log_user_activity("access_denied", f"Attempted: Delete Item, Path: {item_path}, Error: {str(e)}")
@@ -300,8 +450,6 @@ def batch_delete_api():
         deleted_paths = [res['path'] for res in results.get('results', []) if res['status'] == 'success']
         if deleted_paths:
             log_user_activity("batch_delete", f"Paths: {', '.join(deleted_paths)}")
-            # Emit a single batch delete event instead of individual events
-            socketio.emit('file_changed', {'paths': deleted_paths, 'action': 'batch_deleted'}, namespace='/updates')
         if not results.get("success"): # If any operation failed
             failed_paths = [res['path'] for res in results.get('results', []) if res['status'] == 'error']
             log_user_activity("operation_error", f"Operation: Batch Delete, Failed paths: {', '.join(failed_paths)}")
@@ -322,6 +470,8 @@ def batch_delete_api():
 def upload_file_api():
     if not file_manager:
         return jsonify({"error": "FileManager not initialized"}), 500
+    if request.mimetype == 'application/octet-stream':
+        return upload_raw_file()
     if 'file' not in request.files:
         return jsonify({"error": "No file part in the request."}), 400
     
@@ -351,13 +501,13 @@ def upload_file_api():
 
     # Get target sub_path from form data (e.g., current directory in file manager)
     upload_sub_path = request.form.get('path', '') # Default to root of managed_dir
+    checksum = request.form.get('checksum')  # Optional hex digest of the file, verified after writing it
 
     try:
-        result = file_manager.upload_file(file, upload_sub_path)
+        result = file_manager.upload_file(file, upload_sub_path, checksum=checksum)
         if result.get("error"):
             return jsonify(result), 400
         log_user_activity("upload", f"Filename: {file.filename}, Path: {upload_sub_path}")
-        socketio.emit('file_changed', {'path': result.get('path'), 'action': 'uploaded', 'filename': result.get('filename')}, namespace='/updates')
         return jsonify(result)
     except PermissionError as e:
         log_user_activity("access_denied", f"Attempted: Upload File, Filename: {file.filename}, Path: {upload_sub_path}, Error: {str(e)}")
@@ -366,23 +516,107 @@ def upload_file_api():
         log_user_activity("operation_error", f"Operation: Upload File, Filename: {file.filename}, Path: {upload_sub_path}, Error: {str(e)}")
         return jsonify({"error": "An error occurred uploading the file."}), 500
 
+def upload_raw_file():
+    """
+    Raw-body upload: the request body is the file, `filename`, `path` and optionally
+    `checksum` come in the query string. The body is streamed straight to the destination
+    instead of being spooled by the multipart parser first.
+    """
+    filename = request.args.get('filename', '')
+    upload_sub_path = request.args.get('path', '')
+    checksum = request.args.get('checksum')
+    if not filename:
+        return jsonify({"error": "No selected file."}), 400
+
+    max_file_size_gb = get_config().get('upload', {}).get('max_file_size_gb', 8)
+    max_file_size_bytes = max_file_size_gb * 1024 * 1024 * 1024
+    if request.content_length and request.content_length > max_file_size_bytes:
+        return jsonify({"error": f"File size ({request.content_length / (1024*1024*1024):.2f}GB) exceeds maximum allowed size of {max_file_size_gb}GB."}), 413
+
+    try:
+        result = file_manager.upload_stream(request.stream, filename, upload_sub_path, max_bytes=max_file_size_bytes,
+                                            checksum=checksum, expected_size=request.content_length)
+        if result.get("insufficient_storage"):
+            return jsonify(result), 507
+        if result.get("error"):
+            return jsonify(result), 400
+        log_user_activity("upload", f"Filename: {filename}, Path: {upload_sub_path}")
+        return jsonify(result)
+    except PermissionError as e:
+        log_user_activity("access_denied", f"Attempted: Upload File, Filename: {filename}, Path: {upload_sub_path}, Error: {str(e)}")
+        return jsonify({"error": str(e)}), 403
+    except Exception as e:
+        log_user_activity("operation_error", f"Operation: Upload File, Filename: {filename}, Error: {str(e)}")
+        return jsonify({"error": "An error occurred during upload."}), 500
+
+@app.route('/api/upload/bundle', methods=['POST'])
+@login_required
+def upload_bundle_api():
+    """
+    Many small files in one request: the body is a tar stream (application/x-tar) of the
+    files, with their paths relative to `path` (query string), unpacked as it arrives.
+    """
+    if not file_manager:
+        return jsonify({"error": "FileManager not initialized"}), 500
+    upload_sub_path = request.args.get('path', '')
+
+    max_file_size_gb = get_config().get('upload', {}).get('max_file_size_gb', 8)
+    max_file_size_bytes = max_file_size_gb * 1024 * 1024 * 1024
+    if request.content_length and request.content_length > max_file_size_bytes:
+        return jsonify({"error": f"Bundle size ({request.content_length / (1024*1024*1024):.2f}GB) exceeds maximum allowed size of {max_file_size_gb}GB."}), 413
+
+    try:
+        result = file_manager.upload_bundle(request.stream, upload_sub_path, max_bytes=max_file_size_bytes,
+                                            expected_size=request.content_length)
+        if result.get("too_large"):
+            return jsonify(result), 413
+        if result.get("insufficient_storage"):
+            return jsonify(result), 507
+        if result.get("error"):
+            return jsonify(result), 400
+        log_user_activity("upload", f"Bundle: {result['files']} files, Path: {upload_sub_path}")
+        return jsonify(result)
+    except PermissionError as e:
+        log_user_activity("access_denied", f"Attempted: Upload Bundle, Path: {upload_sub_path}, Error: {str(e)}")
+        return jsonify({"error": str(e)}), 403
+    except Exception as e:
+        log_user_activity("operation_error", f"Operation: Upload Bundle, Path: {upload_sub_path}, Error: {str(e)}")
+        return jsonify({"error": "An error occurred during upload."}), 500
+
 @app.route('/api/upload/chunk', methods=['POST'])
 @login_required
 def upload_chunk_api():
-    """Handle chunked file uploads."""
+    """
+    Handle chunked file uploads. Either multipart form data (the chunk in 'chunk', the
+    parameters as form fields) or, without the multipart spooling, a raw
+    application/octet-stream body with the parameters in the query string.
+    """
     if not file_manager:
         return jsonify({"error": "FileManager not initialized"}), 500
     
     # Get chunk data from request
-    chunk_data = request.files.get('chunk')
-    if not chunk_data:
-        return jsonify({"error": "No chunk data provided"}), 400
+    if request.mimetype == 'application/octet-stream':
+        params = request.args
+        chunk_stream = request.stream
+    else:
+        params = request.form
+        chunk_data = request.files.get('chunk')
+        if not chunk_data:
+            return jsonify({"error": "No chunk data provided"}), 400
+        chunk_stream = chunk_data.stream
     
-    upload_id = request.form.get('uploadId')
-    chunk_index = request.form.get('chunkIndex')
-    total_chunks = request.form.get('totalChunks')
-    filename = request.form.get('filename')
-    upload_path = request.form.get('path', '')
+    upload_id = params.get('uploadId')
+    chunk_index = params.get('chunkIndex')
+    total_chunks = params.get('totalChunks')
+    filename = params.get('filename')
+    upload_path = params.get('path', '')
+    # Optional: with both, chunks are written in place at chunkIndex * chunkSize (no assembly step)
+    chunk_size = params.get('chunkSize')
+    file_size = params.get('fileSize')
+    # Optional hex digests (upload config's checksum_algorithm) of this chunk and of the whole file
+    chunk_checksum = params.get('chunkChecksum')
+    file_checksum = params.get('fileChecksum')
+    chunk_count = params.get('chunkCount', '1')  # Consecutive chunks carried by this request
     
     if not all([upload_id, chunk_index is not None, total_chunks, filename]):
         return jsonify({"error": "Missing required chunk parameters"}), 400
@@ -390,24 +624,28 @@ def upload_chunk_api():
     try:
         chunk_index = int(chunk_index)
         total_chunks = int(total_chunks)
+        chunk_size = int(chunk_size) if chunk_size else None
+        file_size = int(file_size) if file_size else None
+        chunk_count = int(chunk_count)
     except ValueError:
         return jsonify({"error": "Invalid chunk parameters"}), 400
     
     try:
         result = file_manager.upload_chunk(
-            chunk_data, upload_id, chunk_index, total_chunks, filename, upload_path
+            chunk_stream, upload_id, chunk_index, total_chunks, filename, upload_path,
+            chunk_size=chunk_size, file_size=file_size, chunk_checksum=chunk_checksum, file_checksum=file_checksum,
+            chunk_count=chunk_count
         )
+        if result.get("backpressure"):
+            return jsonify(result), 503, {"Retry-After": str(result["retry_after"])}
+        if result.get("insufficient_storage"):
+            return jsonify(result), 507
         if result.get("error"):
             return jsonify(result), 400
         
-        # Log activity for the final chunk
-        if result.get("completed"):
+        # Log activity for the final chunk (the one that handed the upload to a finalize worker)
+        if result.get("queued"):
             log_user_activity("chunked_upload", f"Filename: {filename}, Path: {upload_path}")
-            socketio.emit('file_changed', {
-                'path': result.get('path'), 
-                'action': 'uploaded', 
-                'filename': result.get('filename')
-            }, namespace='/updates')
         
         return jsonify(result)
     except PermissionError as e:
@@ -417,6 +655,74 @@ def upload_chunk_api():
         log_user_activity("operation_error", f"Operation: Chunked Upload, Filename: {filename}, Error: {str(e)}")
         return jsonify({"error": "An error occurred during chunked upload."}), 500
 
+@app.route('/api/upload/dedup', methods=['POST'])
+@login_required
+def upload_dedup_api():
+    """
+    Starts a chunked upload from the checksums of all its chunks (JSON: uploadId, totalChunks,
+    filename, path, chunkSize, fileSize, chunkChecksums and optionally fileChecksum). Chunks the
+    server already holds are copied server-side; the response lists the ones still to be sent.
+    """
+    if not file_manager:
+        return jsonify({"error": "FileManager not initialized"}), 500
+    data = request.json or {}
+    upload_id = data.get('uploadId')
+    filename = data.get('filename')
+    upload_path = data.get('path', '')
+    chunk_checksums = data.get('chunkChecksums')
+    if not all([upload_id, filename, isinstance(chunk_checksums, list)]):
+        return jsonify({"error": "Missing required upload parameters"}), 400
+    try:
+        total_chunks = int(data.get('totalChunks'))
+        chunk_size = int(data.get('chunkSize'))
+        file_size = int(data.get('fileSize'))
+    except (TypeError, ValueError):
+        return jsonify({"error": "Invalid chunk parameters"}), 400
+
+    try:
+        result = file_manager.dedup_upload(upload_id, total_chunks, filename, upload_path, chunk_size, file_size,
+                                           chunk_checksums, file_checksum=data.get('fileChecksum'))
+        if result.get("backpressure"):
+            return jsonify(result), 503, {"Retry-After": str(result["retry_after"])}
+        if result.get("insufficient_storage"):
+            return jsonify(result), 507
+        if result.get("error"):
+            return jsonify(result), 400
+        if result.get("queued"):
+            log_user_activity("chunked_upload", f"Filename: {filename}, Path: {upload_path}, Deduplicated: all chunks")
+        return jsonify(result)
+    except PermissionError as e:
+        log_user_activity("access_denied", f"Attempted: Chunked Upload, Filename: {filename}, Error: {str(e)}")
+        return jsonify({"error": str(e)}), 403
+    except Exception as e:
+        log_user_activity("operation_error", f"Operation: Deduplicated Upload, Filename: {filename}, Error: {str(e)}")
+        return jsonify({"error": "An error occurred during chunked upload."}), 500
+
+@app.route('/api/upload/status', methods=['GET'])
+@login_required
+def upload_status_api():
+    """Which chunks of an upload the server still needs, so the client can resume it."""
+    if not file_manager:
+        return jsonify({"error": "FileManager not initialized"}), 500
+    upload_id = request.args.get('uploadId')
+    if not upload_id:
+        return jsonify({"error": "Upload ID is required"}), 400
+    status = file_manager.get_upload_status(upload_id)
+    if status is None:
+        return jsonify({"error": "Upload not found."}), 404
+    return jsonify(status)
+
+@app.route('/api/upload/jobs/<job_id>', methods=['GET'])
+@login_required
+def upload_job_api(job_id):
+    """Status of the background job finalizing an upload (polling alternative to the 'upload_job' event)."""
+    if not file_manager:
+        return jsonify({"error": "FileManager not initialized"}), 500
+    job = file_manager.get_upload_job(job_id)
+    if job is None:
+        return jsonify({"error": "Upload job not found."}), 404
+    return jsonify(job)
+
 @app.route('/api/upload/cancel', methods=['POST'])
 @login_required
 def cancel_upload_api():
@@ -448,8 +754,15 @@ def get_upload_config():
     return jsonify({
         "chunked_upload_enabled": upload_config.get('enable_chunked_upload', True),
         "chunk_size_mb": upload_config.get('chunk_size_mb', 10),
+        # Bounds for clients adapting chunk size and concurrency to their link, and the current load
+        "min_chunk_size_mb": upload_config.get('min_chunk_size_mb', 1),
+        "max_chunk_size_mb": upload_config.get('max_chunk_size_mb', 64),
         "max_concurrent_chunks": upload_config.get('max_concurrent_chunks', 3),
-        "max_file_size_gb": upload_config.get('max_file_size_gb', 8)
+        "max_concurrency": upload_config.get('max_concurrency', 8),
+        "load": file_manager.get_upload_load() if file_manager else None,
+        "max_file_size_gb": upload_config.get('max_file_size_gb', 8),
+        "checksum_algorithm": file_manager.checksum_algorithm if file_manager else None,
+        "dedup_enabled": bool(file_manager and file_manager.dedup_enabled)
     })
         
 @app.route('/download/<path:file_path>')
@@ -478,15 +791,23 @@ def download_file(file_path):
             mimetype = 'application/octet-stream' 
 
         if is_preview and not force_download:
-            return send_from_directory(os.path.dirname(abs_file_path), os.path.basename(abs_file_path), mimetype=mimetype)
-        elif force_download or not mimetype.startswith(('image/', 'video/', 'audio/', 'text/', 'application/pdf')):
-             return send_from_directory(os.path.dirname(abs_file_path), os.path.basename(abs_file_path), as_attachment=True, mimetype=mimetype)
-        else: 
-             return send_from_directory(os.path.dirname(abs_file_path), os.path.basename(abs_file_path), mimetype=mimetype)
-            
+            as_attachment = False
+        else:
+            as_attachment = force_download or not mimetype.startswith(('image/', 'video/', 'audio/', 'text/', 'application/pdf'))
+
+        # Handed to the front-end server or the kernel when download.offload is set
+        response = offloaded_file_response(request, abs_file_path, _relative_to_managed_dir(abs_file_path), mimetype,
+                                           as_attachment, get_config().get('download', {}))
+        if response is not None:
+            return response
+        return send_from_directory(os.path.dirname(abs_file_path), os.path.basename(abs_file_path),
+                                   as_attachment=as_attachment, mimetype=mimetype)
+
     except PermissionError as e:
         log_user_activity("access_denied", f"Attempted: Download File, Path: {file_path}, Error: {str(e)}")
         return str(e), 403
+    except RequestedRangeNotSatisfiable as e:
+        return e.get_response()  # Range past the end of the file: 416, not a server error
     except Exception as e:
         log_user_activity("operation_error", f"Operation: Download File, Path: {file_path}, Error: {str(e)}")
         print(f"Error in download_file for {file_path}: {e}")
@@ -516,9 +837,6 @@ def zip_items_api():
                 delete_results = file_manager.batch_delete_items(items_to_zip)
                 if delete_results.get("success"):
                     log_user_activity("zip_with_delete", f"Archive: {result.get('archive_path')}, Items count: {len(items_to_zip)}, Original files deleted")
-                    # Emit delete events for each original file
-                    for item_path in items_to_zip:
-                        socketio.emit('file_changed', {'path': item_path, 'action': 'deleted'}, namespace='/updates')
                 else:
                     log_user_activity("zip", f"Archive: {result.get('archive_path')}, Items count: {len(items_to_zip)}, Warning: Could not delete some original files")
             except Exception as delete_error:
@@ -526,8 +844,7 @@ def zip_items_api():
                 log_user_activity("zip", f"Archive: {result.get('archive_path')}, Items count: {len(items_to_zip)}, Warning: Could not delete original files")
         else:
             log_user_activity("zip", f"Archive: {result.get('archive_path')}, Items count: {len(items_to_zip)}")
-        
-        socketio.emit('file_changed', {'path': result.get('archive_path'), 'action': 'created', 'type': 'file'}, namespace='/updates') # A zip is a file
+
         return jsonify(result)
     except PermissionError as e:
         log_user_activity("access_denied", f"Attempted: Zip Items, Archive: {archive_name}, Error: {str(e)}")
@@ -552,11 +869,6 @@ def unzip_file_api():
         if result.get("error"):
             return jsonify(result), 400
         log_user_activity("unzip", f"Zip: {zip_file_path}, Target: {extract_to_sub_path if extract_to_sub_path else os.path.dirname(zip_file_path)}")
-        # Emitting a general update for the directory where files were extracted
-        # A more granular update would list all extracted files/folders
-        target_path_for_update = extract_to_sub_path if extract_to_sub_path else os.path.dirname(zip_file_path)
-        if target_path_for_update == ".": target_path_for_update = "" # normalize for root
-        socketio.emit('file_changed', {'path': target_path_for_update, 'action': 'unzipped_into'}, namespace='/updates')
         return jsonify(result)
     except PermissionError as e:
         log_user_activity("access_denied", f"Attempted: Unzip File, Zip: {zip_file_path}, Error: {str(e)}")
@@ -590,21 +902,6 @@ def rename_item_api():
         # Log the successful rename activity
         log_user_activity("rename", f"From: '{old_name_for_log}' to '{result.get('new_name')}' at '{os.path.dirname(current_relative_path)}'")
         
-        # Emit file change events for real-time update
-        # Option 1: Simple - tell client to refresh parent directory (or current if it was root)
-        parent_dir_of_renamed = os.path.dirname(current_relative_path)
-        if parent_dir_of_renamed == ".": parent_dir_of_renamed = ""
-
-        # More specific event for rename might be better for client-side handling
-        socketio.emit('file_changed', {
-            'action': 'renamed',
-            'old_path': current_relative_path,
-            'new_path': result.get('new_path'),
-            'new_name': result.get('new_name'),
-            'parent_path': parent_dir_of_renamed, # directory where rename happened
-            'type': item_type
-        }, namespace='/updates')
-        
         return jsonify(result)
     except PermissionError as e: # Should be caught by FileManager, but as a safeguard
         log_user_activity("access_denied", f"Attempted: Rename Item, Path: {current_relative_path}, New Name: {new_name}, Error: {str(e)}")
@@ -654,20 +951,13 @@ def move_item_api():
         
         # Perform the move
         import shutil
-        shutil.move(source_abs_path, target_abs_path)
+        with file_manager.watcher.ignoring(source_abs_path, target_abs_path):  # Not reported as external while it runs
+            shutil.move(source_abs_path, target_abs_path)
+        file_manager.notify_changed(source_abs_path, target_abs_path)
         
         # Log the move activity
         log_user_activity("move", f"From: '{source_path}' to '{target_file_path}'")
         
-        # Emit file change events for real-time update
-        socketio.emit('file_changed', {
-            'action': 'moved',
-            'old_path': source_path,
-            'new_path': target_file_path,
-            'source_parent': os.path.dirname(source_path),
-            'target_parent': target_path
-        }, namespace='/updates')
-        
         return jsonify({"success": True, "new_path": target_file_path})
         
     except PermissionError as e:
@@ -790,6 +1080,7 @@ def handle_updates_connect():
 @socketio.on('disconnect', namespace='/updates')
 def handle_updates_disconnect(reason=None):
     # Remove the connection from active_connections if it exists
+    watched_directories.pop(request.sid, None)
     if request.sid in active_connections['/updates']:
         active_connections['/updates'].remove(request.sid)
         print(f"Client (SID: {request.sid}) disconnected from /updates. Reason: {reason}. Active connections: {len(active_connections['/updates'])}")
@@ -797,6 +1088,24 @@ def handle_updates_disconnect(reason=None):
         # Broadcast updated count to all clients
         socketio.emit('user_count_update', {'count': get_active_users_count()}, room=None, namespace='/updates')
 
+@socketio.on('watch_directory', namespace='/updates')
+@login_required
+def handle_watch_directory(data):
+    """Moves the client to the room of the directory it is viewing."""
+    rel_path = ((data or {}).get('path') or '').strip('/')
+    try:
+        abs_path = file_manager._get_safe_path(rel_path)
+    except PermissionError:
+        return {"error": "Access denied"}
+    rel_path = _relative_to_managed_dir(abs_path)
+
+    previous = watched_directories.get(request.sid)
+    if previous is not None and previous != rel_path:
+        leave_room(_directory_room(previous))
+    join_room(_directory_room(rel_path))
+    watched_directories[request.sid] = rel_path
+    return {"success": True, "path": rel_path}
+
 @socketio.on('connect', namespace='/logs')
 @login_required
 def handle_logs_connect():
@@ -821,6 +1130,60 @@ def get_activity_log_api():
     all_logs = read_logs() # Fetch all logs from auth.py (logs.json)
     return jsonify(all_logs)
 
+def _parse_log_time(value):
+    """
+    ISO timestamp as the activity log stores them (naive local time), so the two compare as
+    strings. Timestamps with an offset ('Z', '+02:00') are converted to local time first.
+    """
+    parsed = datetime.datetime.fromisoformat(value)
+    if parsed.tzinfo is not None:
+        parsed = parsed.astimezone().replace(tzinfo=None)
+    return parsed.isoformat()
+
+@app.route('/api/activity_log/query', methods=['GET'])
+@login_required
+def query_activity_log_api():
+    """
+    Filtered, cursor-paginated activity log query.
+    Query parameters: username, action (comma-separated), ip_address, since, until (ISO timestamps,
+    in server local time unless they carry an offset), cursor (next_cursor from the previous page) and limit.
+    """
+    args = request.args
+    try:
+        since = args.get('since')
+        until = args.get('until')
+        if since:
+            since = _parse_log_time(since)
+        if until:
+            until = _parse_log_time(until)
+        limit = int(args.get('limit', 100))
+    except ValueError:
+        return jsonify({"error": "Invalid 'since', 'until' or 'limit' parameter."}), 400
+
+    actions = [action.strip() for action in args.get('action', '').split(',') if action.strip()]
+    try:
+        result = query_logs(
+            username=args.get('username') or None,
+            actions=actions or None,
+            ip_address=args.get('ip_address') or None,
+            since=since,
+            until=until,
+            cursor=args.get('cursor') or None,
+            limit=limit
+        )
+    except ValueError:
+        return jsonify({"error": "Invalid 'cursor' parameter."}), 400
+    except Exception as e:
+        print(f"Error querying activity log: {e}")
+        return jsonify({"error": "An error occurred while querying the activity log."}), 500
+    return jsonify(result)
+
+@app.route('/api/activity_log/stats', methods=['GET'])
+@login_required
+def get_activity_log_stats_api():
+    """Counters of the background activity log writer (queue depth, dropped entries, ...)."""
+    return jsonify(activity_log_pipeline.get_stats())
+
 @app.route('/api/user/status', methods=['GET'])
 @login_required
 def user_status_api():
@@ -942,6 +1305,9 @@ if __name__ == '__main__':
     # Cleanup function 
     def cleanup():
         print("Cleaning up...")
+        activity_log_pipeline.stop() # Flush queued activity log entries
+        if file_manager:
+            file_manager.watcher.stop() # Stop watching the managed directory
     
     # Register cleanup function
     atexit.register(cleanup)
@@ -1,35 +1,42 @@
 from functools import wraps
 from flask import session, redirect, url_for, request, jsonify, g
-from config import get_config, save_config
+from config import CONFIG_FILE, get_config, get_editable_config, save_config
 import datetime
-import json # Added for JSON logging
-import os   # Added for path check
+import time
 import hashlib # For generating browser identity
+from activity_log import ActivityLogStore, ActivityLogIndex, ActivityLogPipeline
+from user_store import UserStore
 
-LOG_FILE = "logs.json"
-MAX_LOG_ENTRIES = 1000 # Max number of log entries to keep
-MAX_BROWSER_HISTORY = 5 # Maximum number of browser entries to keep per user
+LOG_FILE = "logs.json" # Legacy log file, migrated into the activity log store on startup
+MAX_LOG_ENTRIES = 1000 # Max number of log entries returned by read_logs()
+USER_RECHECK_SECONDS = 60 # How long a session's check against the user store is trusted before it is repeated
 
-# --- JSON Log Handling Functions ---
+# Append-only activity log written by a background thread (see activity_log.py)
+activity_log_store = ActivityLogStore()
+activity_log_store.import_legacy_json(LOG_FILE)
+activity_log_index = ActivityLogIndex()
+activity_log_index.backfill_from(activity_log_store)
+activity_log_pipeline = ActivityLogPipeline(activity_log_store, index=activity_log_index)
+activity_log_pipeline.start()
+
+# Users and their browsers live in SQLite rather than config.yml (see user_store.py)
+user_store = UserStore()
+
+def _migrate_users_from_config():
+    """Moves the legacy `users` section of config.yml into the user store, once."""
+    if not get_config().get('users'):
+        return
+    config = get_editable_config()
+    migrated = user_store.import_from_config(config.pop('users'))
+    save_config(config)
+    print(f"INFO: Migrated {migrated} user(s) from '{CONFIG_FILE}' to '{user_store.db_path}'.")
+
+_migrate_users_from_config()
+
+# --- Log Handling Functions ---
 def read_logs():
-    """Reads all logs from the JSON log file."""
-    if not os.path.exists(LOG_FILE):
-        return []
-    try:
-        with open(LOG_FILE, 'r', encoding='utf-8') as f:
-            logs = json.load(f)
-            return logs
-    except (json.JSONDecodeError, IOError) as e:
-        print(f"Error reading log file '{LOG_FILE}': {e}")
-        return [] # Return empty list on error or if file is corrupted/empty
-
-def write_logs(logs_data):
-    """Writes logs data to the JSON log file."""
-    try:
-        with open(LOG_FILE, 'w', encoding='utf-8') as f:
-            json.dump(logs_data, f, indent=4)
-    except IOError as e:
-        print(f"Error writing to log file '{LOG_FILE}': {e}")
+    """Reads the most recent MAX_LOG_ENTRIES logs, newest first."""
+    return activity_log_store.get_recent(MAX_LOG_ENTRIES)
 
 # --- IP Address Helper ---
 def get_real_ip():
@@ -94,95 +101,62 @@ def handle_login(username, password):
     if password == config.get("app_password"):
         # Store username in session
         session['username'] = username
-        
-        # Ensure users dictionary exists
-        if 'users' not in config or config['users'] is None:
-            config['users'] = {}
-        
-        # Get or create user entry
-        if username not in config['users']:
-            config['users'][username] = {
-                "browsers": []
-            }
-        
-        # Get current browser data
-        current_browser = get_browser_data()
-        browser_id = current_browser["browser_identity"]
-        
-        # Check if this browser is already in the list
-        browser_found = False
-        for browser in config['users'][username].get("browsers", []):
-            if browser["browser_identity"] == browser_id:
-                # Update last login time
-                browser["last_login"] = current_browser["last_login"]
-                browser["ip_address"] = current_browser["ip_address"]  # Update IP in case it changed
-                browser["session_id"] = current_browser["session_id"]  # Update session ID
-                browser_found = True
-                break
-        
-        # If browser not found, add it to the list
-        if not browser_found:
-            browsers = config['users'][username].get("browsers", [])
-            browsers.append(current_browser)
-            
-            # Keep only the most recent MAX_BROWSER_HISTORY browsers
-            if len(browsers) > MAX_BROWSER_HISTORY:
-                browsers = sorted(browsers, key=lambda x: x["last_login"], reverse=True)[:MAX_BROWSER_HISTORY]
-            
-            config['users'][username]["browsers"] = browsers
-        
-        save_config(config)
+
+        # Record this browser in the user store (no config.yml rewrite)
+        current_browser = user_store.record_login(username, get_browser_data())
+        _cache_user_info(username, current_browser["browser_identity"])
         return True
     return False
 
 def handle_logout():
     """Handles user logout."""
     session.pop('username', None)
+    session.pop('user_info', None)
     return True
 
+def _cache_user_info(username, browser_id):
+    """
+    Remembers in the session that the user was found in the user store from this browser, and
+    when. Only identifiers go into the cookie, which the client can read (it is signed, not encrypted).
+    """
+    session['user_info'] = {
+        "username": username,
+        "browser_identity": browser_id,
+        "checked_at": time.time()
+    }
+
 def get_current_user_info():
     if 'username' in session:
         username = session['username']
-        config = get_config()
-        
-        # Ensure users exists and is a dictionary
-        users_dict = config.get('users', {})
-        if not isinstance(users_dict, dict):
-            users_dict = {}
-        
-        user_details = users_dict.get(username)
-        if user_details:
-            # Find the current browser
-            browser_id = generate_browser_fingerprint()
-            current_browser = None
-            
-            for browser in user_details.get("browsers", []):
-                if browser["browser_identity"] == browser_id:
-                    current_browser = browser
-                    break
-            
-            return {
-                "username": username,
-                "ip_address": current_browser["ip_address"] if current_browser else get_real_ip(),
-                "browser": current_browser
-            }
+        browser_id = generate_browser_fingerprint()
+
+        # Fast path: checked recently in this session, from the same browser fingerprint
+        cached = session.get('user_info')
+        if not (cached and cached.get("username") == username and cached.get("browser_identity") == browser_id
+                and time.time() - cached.get("checked_at", 0) < USER_RECHECK_SECONDS):
+            # Fingerprint changed (e.g. new IP), check expired or session predates the cache: indexed
+            # lookup, which also ends the sessions of users removed from the store meanwhile
+            if not user_store.user_exists(username):
+                return None
+            _cache_user_info(username, browser_id)
+        return {
+            "username": username,
+            "ip_address": get_real_ip(),  # Part of the fingerprint, so the same as the browser record's
+            "browser_identity": browser_id
+        }
     return None
 
 def get_active_users_count():
     """Count users with recent activity (within the last hour)."""
-    config = get_config()
-    users_dict = config.get('users', {})
-    if not isinstance(users_dict, dict):
-        return 0
-    
     # This function no longer counts active users since that's now handled by socket connections
     # It's kept for backward compatibility
-    return len(users_dict)
+    return user_store.count_users()
 
-def add_activity_log(username, ip_address, action, details=""):
-    """Adds an activity to the logs.json file."""
-    logs = read_logs()
-    
+def add_activity_log(username, ip_address, action, details="", broadcast=False):
+    """
+    Queues an activity for the background log writer and returns immediately.
+    Entries with broadcast=True are also handed to the pipeline's flush listeners.
+    """
     log_entry = {
         "timestamp": datetime.datetime.now().isoformat(),
         "username": username,
@@ -190,17 +164,13 @@ def add_activity_log(username, ip_address, action, details=""):
         "action": action,
         "details": details
     }
-    logs.insert(0, log_entry) # Add to the beginning to show newest first
-    
-    # Keep log size manageable
-    logs = logs[:MAX_LOG_ENTRIES] 
-    
-    write_logs(logs)
+    activity_log_pipeline.submit(log_entry, broadcast=broadcast)
+    return log_entry
 
-def get_recent_logs(count=20):
-    """Gets a specified number of recent logs."""
-    all_logs = read_logs()
-    return all_logs[:count]
+def query_logs(**filters):
+    """Filtered, cursor-paginated log query against the SQLite index (see ActivityLogIndex.query)."""
+    return activity_log_index.query(**filters)
 
-# Need to import datetime for add_activity_log
-import datetime 
\ No newline at end of file
+def get_recent_logs(count=20):
+    """Gets a specified number of recent logs, newest first, without reading the whole history."""
+    return activity_log_store.get_recent(count)
@@ -0,0 +1,48 @@
+"""Shared helpers for the benchmark scripts in this directory."""
+import os
+import sys
+import time
+import shutil
+import tempfile
+import contextlib
+
+# Allow running the scripts directly from the repository root or from benchmarks/
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if REPO_ROOT not in sys.path:
+    sys.path.insert(0, REPO_ROOT)
+
+
+@contextlib.contextmanager
+def temporary_workdir(config_overrides=None):
+    """
+    Creates a throwaway working directory containing a config.yml whose managed
+    directory lives inside it, and chdirs into it for the duration of the block.
+    Yields the absolute path of the managed directory.
+    """
+    import yaml
+
+    previous_cwd = os.getcwd()
+    workdir = tempfile.mkdtemp(prefix="qfm_bench_")
+    managed_dir = os.path.join(workdir, "managed_files")
+    os.makedirs(managed_dir)
+    config = {"app_password": "benchmark", "managed_directory": managed_dir}
+    config.update(config_overrides or {})
+    with open(os.path.join(workdir, "config.yml"), "w", encoding="utf-8") as f:
+        yaml.safe_dump(config, f)
+    os.chdir(workdir)
+    try:
+        yield managed_dir
+    finally:
+        os.chdir(previous_cwd)
+        shutil.rmtree(workdir, ignore_errors=True)
+
+
+def best_of(repeats, func, *args, **kwargs):
+    """Runs func `repeats` times and returns the fastest wall-clock time in seconds."""
+    best = None
+    for _ in range(repeats):
+        start = time.perf_counter()
+        func(*args, **kwargs)
+        elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+    return best
@@ -0,0 +1,94 @@
+"""
+Measures aggregate chunked-upload throughput with several uploads running in
+parallel, each fed by a client stream limited to a fixed bandwidth (the request
+body is read inside FileManager.upload_chunk, so a slow client occupies it for
+the whole chunk). 'one lock' wraps upload_chunk in a single global lock, the way
+every chunk was handled before uploads got their own locks.
+
+Usage: python benchmarks/bench_concurrent_uploads.py [parallel upload counts...]
+       (default: 1 2 4 8)
+"""
+import io
+import sys
+import time
+import threading
+import uuid
+
+from bench_common import temporary_workdir
+
+DEFAULT_PARALLELISM = [1, 2, 4, 8]
+FILE_SIZE_MB = 32
+CHUNK_SIZE_MB = 4
+CLIENT_MBPS = 100  # Bandwidth of each simulated client
+
+
+class ThrottledStream(io.RawIOBase):
+    """Serves `size` bytes no faster than `bytes_per_second`, like a request body arriving over the network."""
+
+    def __init__(self, size, bytes_per_second):
+        self.remaining = size
+        self.bytes_per_second = bytes_per_second
+        self.sent = 0
+        self.started = None
+
+    def readable(self):
+        return True
+
+    def readinto(self, buffer):
+        if self.started is None:
+            self.started = time.perf_counter()
+        count = min(len(buffer), self.remaining)
+        buffer[:count] = b"x" * count
+        self.remaining -= count
+        self.sent += count
+        ahead = self.started + self.sent / self.bytes_per_second - time.perf_counter()
+        if ahead > 0:
+            time.sleep(ahead)
+        return count
+
+
+def upload_file(upload_chunk, name):
+    chunk_size = CHUNK_SIZE_MB * 1024 * 1024
+    total_chunks = FILE_SIZE_MB // CHUNK_SIZE_MB
+    upload_id = uuid.uuid4().hex
+    for chunk_index in range(total_chunks):
+        stream = ThrottledStream(chunk_size, CLIENT_MBPS * 1024 * 1024)
+        result = upload_chunk(stream, upload_id, chunk_index, total_chunks, name)
+        if result.get("error"):
+            raise RuntimeError(result["error"])
+
+
+def run(upload_chunk, parallel):
+    threads = [threading.Thread(target=upload_file, args=(upload_chunk, f"upload_{i}_{uuid.uuid4().hex[:6]}.bin"))
+               for i in range(parallel)]
+    start = time.perf_counter()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    elapsed = time.perf_counter() - start
+    return parallel * FILE_SIZE_MB / elapsed
+
+
+def main():
+    counts = [int(arg) for arg in sys.argv[1:]] or DEFAULT_PARALLELISM
+    with temporary_workdir({"upload": {"chunk_size_mb": CHUNK_SIZE_MB}}):
+        from file_manager import FileManager
+        file_manager = FileManager()
+
+        global_lock = threading.Lock()
+
+        def upload_chunk_one_lock(*args):
+            with global_lock:
+                return file_manager.upload_chunk(*args)
+
+        print(f"{FILE_SIZE_MB} MB per upload in {CHUNK_SIZE_MB} MB chunks, each client limited to {CLIENT_MBPS} MB/s.")
+        print(f"{'uploads':>8} {'one lock (MB/s)':>16} {'per-upload locks (MB/s)':>24} {'speedup':>8}")
+        for parallel in counts:
+            serialized = run(upload_chunk_one_lock, parallel)
+            concurrent = run(file_manager.upload_chunk, parallel)
+            print(f"{parallel:>8} {serialized:>16.1f} {concurrent:>24.1f} {concurrent / serialized:>7.2f}x")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,106 @@
+"""
+Measures download throughput with many concurrent downloads of a large file, per
+download.offload mode: 'none' (Flask's send_from_directory reads the file and writes
+it out through Python) and 'sendfile' (os.sendfile() on the client socket). For
+'x-accel-redirect' and 'x-sendfile' the app only answers with a header and the
+front-end server sends the file, so what is measured there is the hand-off.
+
+The app runs in werkzeug's threaded server on localhost; the downloads run in
+separate processes, so the CPU time reported is the server's alone.
+
+Usage: python benchmarks/bench_downloads.py [concurrent download counts...]
+       (default: 1 4 16)
+"""
+import os
+import sys
+import time
+import http.client
+import threading
+import urllib.parse
+from concurrent.futures import ProcessPoolExecutor
+
+import yaml
+
+from bench_common import temporary_workdir
+
+DEFAULT_CONCURRENCY = [1, 4, 16]
+FILE_SIZE_MB = 256
+PASSWORD = "benchmark"
+MODES = ["none", "sendfile", "x-accel-redirect", "x-sendfile"]
+READ_SIZE = 1024 * 1024
+
+
+def set_offload_mode(mode):
+    with open("config.yml", encoding="utf-8") as f:
+        config = yaml.safe_load(f)
+    config["download"] = {"offload": mode}
+    with open("config.yml", "w", encoding="utf-8") as f:
+        yaml.safe_dump(config, f)
+    stat_result = os.stat("config.yml")
+    os.utime("config.yml", (stat_result.st_atime, stat_result.st_mtime + 1))  # Config cache keys on mtime
+
+
+def login(port):
+    connection = http.client.HTTPConnection("127.0.0.1", port)
+    body = urllib.parse.urlencode({"username": "bench", "password": PASSWORD})
+    connection.request("POST", "/login", body, {"Content-Type": "application/x-www-form-urlencoded"})
+    response = connection.getresponse()
+    response.read()
+    return response.getheader("Set-Cookie").split(";")[0]
+
+
+def download(port, cookie):
+    """Runs in a worker process; returns the number of body bytes received."""
+    connection = http.client.HTTPConnection("127.0.0.1", port)
+    connection.request("GET", "/download/bench.bin", headers={"Cookie": cookie})
+    response = connection.getresponse()
+    if response.status != 200:
+        raise RuntimeError(f"Download failed: HTTP {response.status}")
+    buffer = bytearray(READ_SIZE)
+    received = 0
+    while True:
+        count = response.readinto(buffer)
+        if not count:
+            break
+        received += count
+    connection.close()
+    return received
+
+
+def run(pool, port, cookie, parallel):
+    cpu_before = time.process_time()
+    start = time.perf_counter()
+    received = sum(pool.map(download, [port] * parallel, [cookie] * parallel))
+    return time.perf_counter() - start, time.process_time() - cpu_before, received
+
+
+def main():
+    counts = [int(arg) for arg in sys.argv[1:]] or DEFAULT_CONCURRENCY
+    with temporary_workdir({"app_password": PASSWORD}) as managed_dir:
+        with open(os.path.join(managed_dir, "bench.bin"), "wb") as f:
+            f.write(os.urandom(1024 * 1024) * FILE_SIZE_MB)
+
+        from werkzeug.serving import make_server
+        from app import app
+        server = make_server("127.0.0.1", 0, app, threaded=True)
+        threading.Thread(target=server.serve_forever, daemon=True).start()
+        cookie = login(server.port)
+
+        print(f"{FILE_SIZE_MB} MB file, werkzeug threaded server on localhost.")
+        print(f"{'mode':<18} {'downloads':>9} {'wall (s)':>9} {'MB/s':>9} {'server CPU (s/GB)':>18}")
+        with ProcessPoolExecutor(max_workers=max(counts)) as pool:
+            for mode in MODES:
+                set_offload_mode(mode)
+                for parallel in counts:
+                    wall, cpu, received = run(pool, server.port, cookie, parallel)
+                    if received:
+                        print(f"{mode:<18} {parallel:>9} {wall:>9.2f} {received / wall / 1024 ** 2:>9.0f} "
+                              f"{cpu / (received / 1024 ** 3):>18.2f}")
+                    else:
+                        # Body left to the front-end server: only the hand-off was timed
+                        print(f"{mode:<18} {parallel:>9} {wall:>9.3f} {'hand-off':>9} {cpu * 1000 / parallel:>15.1f} ms/request")
+        server.shutdown()
+
+
+if __name__ == '__main__':
+    main()
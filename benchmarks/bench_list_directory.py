@@ -0,0 +1,91 @@
+"""
+Compares the old os.listdir + os.path.isdir directory listing with the
+os.scandir based FileManager.list_directory on large flat directories.
+
+Usage: python benchmarks/bench_list_directory.py [entry counts...]
+       (default: 10000 50000 200000)
+"""
+import os
+import sys
+import mimetypes
+
+from bench_common import temporary_workdir, best_of
+
+DEFAULT_SIZES = [10000, 50000, 200000]
+DIRECTORY_RATIO = 20  # One in every N entries is a sub-directory
+REPEATS = 3
+
+
+def legacy_list_directory(current_path, sub_path=""):
+    """The listing loop FileManager used before it moved to os.scandir."""
+    items = []
+    for item_name in os.listdir(current_path):
+        item_path = os.path.join(current_path, item_name)
+        item_type = "directory" if os.path.isdir(item_path) else "file"
+        items.append({
+            "name": item_name,
+            "type": item_type,
+            "path": os.path.join(sub_path, item_name).replace('\\', '/')
+        })
+    items.sort(key=lambda x: (x['type'] != 'directory', x['name'].lower()))
+    return {"path": sub_path, "items": items}
+
+
+def legacy_list_directory_with_stat(current_path, sub_path=""):
+    """The old loop extended with the os.stat/mimetypes calls needed to return the same fields."""
+    items = []
+    for item_name in os.listdir(current_path):
+        item_path = os.path.join(current_path, item_name)
+        is_dir = os.path.isdir(item_path)
+        stat_result = os.stat(item_path)
+        items.append({
+            "name": item_name,
+            "type": "directory" if is_dir else "file",
+            "path": os.path.join(sub_path, item_name).replace('\\', '/'),
+            "size": None if is_dir else stat_result.st_size,
+            "mtime": stat_result.st_mtime,
+            "is_symlink": os.path.islink(item_path),
+            "mime_type": None if is_dir else mimetypes.guess_type(item_name)[0]
+        })
+    items.sort(key=lambda x: (x['type'] != 'directory', x['name'].lower()))
+    return {"path": sub_path, "items": items}
+
+
+def list_uncached(file_manager, sub_path):
+    """FileManager.list_directory with its listing cache emptied first, so every run re-scans and re-sorts."""
+    file_manager._listing_snapshots.clear()
+    return file_manager.list_directory(sub_path)
+
+
+def populate(directory, count):
+    for i in range(count):
+        path = os.path.join(directory, f"entry_{i:07d}")
+        if i % DIRECTORY_RATIO == 0:
+            os.mkdir(path)
+        else:
+            with open(path + ".txt", "wb") as f:
+                f.write(b"x" * (i % 512))
+
+
+def main():
+    sizes = [int(arg) for arg in sys.argv[1:]] or DEFAULT_SIZES
+    print("Times are the best of %d runs. 'listdir+stat' is the old loop extended to return the same fields;" % REPEATS)
+    print("the speedup compares it with scandir.")
+    print(f"{'entries':>10} {'listdir+isdir (s)':>18} {'listdir+stat (s)':>17} {'scandir (s)':>12} {'speedup':>8}")
+    for count in sizes:
+        with temporary_workdir() as managed_dir:
+            from file_manager import FileManager
+            target = os.path.join(managed_dir, "bench")
+            os.mkdir(target)
+            populate(target, count)
+            file_manager = FileManager()
+
+            legacy_time = best_of(REPEATS, legacy_list_directory, target, "bench")
+            legacy_stat_time = best_of(REPEATS, legacy_list_directory_with_stat, target, "bench")
+            scandir_time = best_of(REPEATS, list_uncached, file_manager, "bench")
+            print(f"{count:>10} {legacy_time:>18.3f} {legacy_stat_time:>17.3f} {scandir_time:>12.3f} "
+                  f"{legacy_stat_time / scandir_time:>7.2f}x")
+
+
+if __name__ == '__main__':
+    main()
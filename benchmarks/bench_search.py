@@ -0,0 +1,76 @@
+"""
+Measures /api/search query latency on a metadata index with millions of rows.
+The index is filled with synthetic rows directly (no files are created on disk).
+
+Usage: python benchmarks/bench_search.py [row count]
+       (default: 2000000)
+"""
+import os
+import sys
+import random
+import time
+
+from bench_common import temporary_workdir, best_of
+
+DEFAULT_ROWS = 2000000
+FILES_PER_DIRECTORY = 200
+REPEATS = 5
+WORDS = ["report", "invoice", "photo", "IMG", "backup", "draft", "final", "notes", "data", "video", "scan", "budget"]
+EXTENSIONS = ["txt", "jpg", "pdf", "mp4", "docx", "csv", "png", "zip"]
+
+QUERIES = [
+    ("substring", {"query": "invoice_1234"}),
+    ("substring, common", {"query": "report"}),
+    ("substring, 2 chars", {"query": "_7"}),
+    ("glob", {"query": "*_IMG_1*7.jpg"}),
+    ("substring + extension", {"query": "budget", "extensions": ["csv"]}),
+    ("substring + size range", {"query": "scan", "min_size": 1000000, "max_size": 2000000}),
+    ("extension + recent mtime", {"extensions": ["mp4"], "modified_after": time.time() - 7 * 86400}),
+    ("large files", {"min_size": 4000000000}),
+    ("subtree", {"path": "dir_00042"}),
+    ("subtree + glob", {"path": "dir_00042", "query": "*.pdf"}),
+]
+
+
+def synthetic_rows(count, seed=1):
+    rng = random.Random(seed)
+    now = time.time()
+    directory_count = max(1, count // FILES_PER_DIRECTORY)
+    for i in range(count):
+        parent = f"dir_{i % directory_count:05d}"
+        extension = rng.choice(EXTENSIONS)
+        name = f"{rng.choice(WORDS)}_{rng.randint(0, 99999)}.{extension}"
+        size = int(rng.paretovariate(1.2) * 4096)
+        mtime = now - rng.random() * 3 * 365 * 86400
+        yield (f"{parent}/{i}_{name}", parent, f"{i}_{name}", "file", extension, size, mtime)
+
+
+def main():
+    row_count = int(sys.argv[1]) if len(sys.argv) > 1 else DEFAULT_ROWS
+    with temporary_workdir() as managed_dir:
+        from metadata_index import MetadataIndex, CRAWL_BATCH_SIZE
+        index = MetadataIndex(managed_dir, db_path=os.path.join(managed_dir, "..", "bench_index.db"))
+
+        # Same bulk-load path as the first crawl of an empty index
+        start = time.perf_counter()
+        index._drop_secondary_structures()
+        batch = []
+        for row in synthetic_rows(row_count):
+            batch.append(row)
+            if len(batch) >= CRAWL_BATCH_SIZE:
+                index._upsert(batch, 1)
+                batch = []
+        index._upsert(batch, 1)
+        index._rebuild_secondary_structures()
+        print(f"Indexed {index.count()} rows in {time.perf_counter() - start:.1f}s")
+
+        print(f"Times are the best of {REPEATS} runs for the first page (limit 100).")
+        print(f"{'query':<28} {'results':>8} {'time (ms)':>10}")
+        for label, filters in QUERIES:
+            result = index.search(**filters)
+            elapsed = best_of(REPEATS, index.search, **filters)
+            print(f"{label:<28} {len(result['items']):>8} {elapsed * 1000:>10.1f}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,121 @@
+"""
+Measures what it costs the server to ingest uploads: CPU seconds and bytes
+written per GB uploaded, for multipart form uploads (spooled by Werkzeug's form
+parser, then copied to the destination) and raw application/octet-stream
+bodies (streamed straight to the destination), through /api/upload and
+/api/upload/chunk. Requests go through the Flask test client, in-process.
+
+Bytes written come from /proc/self/io: 'written' counts write() calls (wchar),
+'to disk' the bytes the kernel sent to the block layer (write_bytes; 0 on tmpfs).
+Linux only.
+
+Usage: python benchmarks/bench_upload_ingest.py [upload size in MB]
+       (default: 256)
+"""
+import os
+import sys
+import time
+import uuid
+
+from bench_common import temporary_workdir
+
+DEFAULT_SIZE_MB = 256
+CHUNK_SIZE_MB = 8
+PASSWORD = "benchmark"
+HEADERS = {"X-Requested-With": "XMLHttpRequest"}
+GB = 1024 ** 3
+
+
+def read_proc_io():
+    counters = {}
+    with open("/proc/self/io") as f:
+        for line in f:
+            key, value = line.split(":")
+            counters[key] = int(value)
+    return counters
+
+
+def multipart_body(fields, payload):
+    """multipart/form-data body with `fields` and the payload as the file part, like a browser's FormData."""
+    boundary = f"----qfmbench{uuid.uuid4().hex}"
+    parts = [f'--{boundary}\r\nContent-Disposition: form-data; name="{name}"\r\n\r\n{value}\r\n'
+             for name, value in fields.items()]
+    file_field = "chunk" if "chunkIndex" in fields else "file"
+    parts.append(f'--{boundary}\r\nContent-Disposition: form-data; name="{file_field}"; filename="blob"\r\n'
+                 f'Content-Type: application/octet-stream\r\n\r\n')
+    body = "".join(parts).encode() + payload + f"\r\n--{boundary}--\r\n".encode()
+    return body, f"multipart/form-data; boundary={boundary}"
+
+
+class Meter:
+    """Accumulates CPU time and /proc/self/io write counters over the measured requests only."""
+
+    def __init__(self):
+        self.cpu = 0.0
+        self.written = 0
+        self.to_disk = 0
+
+    def post(self, client, url, body, content_type):
+        before_io, before_cpu = read_proc_io(), time.process_time()
+        response = client.post(url, data=body, content_type=content_type, headers=HEADERS)
+        self.cpu += time.process_time() - before_cpu
+        after_io = read_proc_io()
+        self.written += after_io["wchar"] - before_io["wchar"]
+        self.to_disk += after_io["write_bytes"] - before_io["write_bytes"]
+        result = response.get_json()
+        if response.status_code != 200 or result.get("error"):
+            raise RuntimeError(f"{url} failed: {result}")
+        return result
+
+
+def single_upload(client, payload, raw):
+    meter = Meter()
+    name = f"single_{uuid.uuid4().hex[:6]}.bin"
+    if raw:
+        meter.post(client, f"/api/upload?filename={name}&path=", payload, "application/octet-stream")
+    else:
+        body, content_type = multipart_body({"path": ""}, payload)
+        meter.post(client, "/api/upload", body, content_type)
+    return meter
+
+
+def chunked_upload(client, payload, raw):
+    meter = Meter()
+    chunk_size = CHUNK_SIZE_MB * 1024 * 1024
+    total_chunks = -(-len(payload) // chunk_size)
+    params = {"uploadId": uuid.uuid4().hex, "totalChunks": total_chunks, "filename": f"chunked_{uuid.uuid4().hex[:6]}.bin",
+              "path": "", "chunkSize": chunk_size, "fileSize": len(payload)}
+    for chunk_index in range(total_chunks):
+        chunk = payload[chunk_index * chunk_size:(chunk_index + 1) * chunk_size]
+        fields = dict(params, chunkIndex=chunk_index)
+        if raw:
+            query = "&".join(f"{key}={value}" for key, value in fields.items())
+            meter.post(client, f"/api/upload/chunk?{query}", chunk, "application/octet-stream")
+        else:
+            body, content_type = multipart_body(fields, chunk)
+            meter.post(client, "/api/upload/chunk", body, content_type)
+    return meter
+
+
+def main():
+    size_mb = int(sys.argv[1]) if len(sys.argv) > 1 else DEFAULT_SIZE_MB
+    payload = os.urandom(1024 * 1024) * size_mb
+    with temporary_workdir({"app_password": PASSWORD, "upload": {"chunk_size_mb": CHUNK_SIZE_MB, "max_file_size_gb": 64}}):
+        from app import app
+        client = app.test_client()
+        client.post("/login", data={"username": "bench", "password": PASSWORD})
+
+        print(f"{size_mb} MB per upload, {CHUNK_SIZE_MB} MB chunks. Figures are per GB ingested.")
+        print(f"{'upload':<28} {'CPU (s/GB)':>11} {'written (GB/GB)':>16} {'to disk (GB/GB)':>16}")
+        scale = GB / len(payload)
+        for label, upload, raw in [("/api/upload multipart", single_upload, False),
+                                   ("/api/upload raw", single_upload, True),
+                                   ("/api/upload/chunk multipart", chunked_upload, False),
+                                   ("/api/upload/chunk raw", chunked_upload, True)]:
+            meter = upload(client, payload, raw)
+            print(f"{label:<28} {meter.cpu * scale:>11.2f} {meter.written * scale / GB:>16.2f} "
+                  f"{meter.to_disk * scale / GB:>16.2f}")
+
+
+if __name__ == '__main__':
+    main()
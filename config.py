@@ -1,21 +1,99 @@
 import yaml
 import os
+import copy
+import threading
+from types import MappingProxyType
 
 CONFIG_FILE = "config.yml"
 DEFAULT_CONFIG = {
     "app_password": "change_me_please",
     "managed_directory": "./managed_files",
-    "users": {},
     "upload": {
         "enable_chunked_upload": True,
-        "chunk_size_mb": 10,  # Size of each chunk in MB
-        "max_concurrent_chunks": 3,  # Maximum concurrent chunks per file
+        "chunk_size_mb": 10,  # Size of each chunk in MB (clients start with it, then adapt within the bounds below)
+        "min_chunk_size_mb": 1,  # Smallest chunk request, and the unit chunked uploads are tracked in
+        "max_chunk_size_mb": 64,  # Largest chunk request
+        "max_concurrent_chunks": 3,  # Concurrent chunks per file clients start with
+        "max_concurrency": 8,  # Most concurrent chunks per file clients may grow to
+        "max_active_chunk_requests": 32,  # Chunk requests written at once; more are told to back off
+        "backpressure_cpu_load": 2.0,  # Load average per CPU from which chunk requests are told to back off
         "chunk_timeout": 300,  # Timeout for chunk upload in seconds
+        "resumable_timeout_hours": 24,  # How long an interrupted resumable upload waits to be resumed
+        "checksum_algorithm": "sha256",  # Upload digest: any hashlib name, "blake3" or an xxhash one (optional packages)
+        "dedup_enabled": True,  # Chunked uploads skip chunks whose content was uploaded before
+        "min_free_space_mb": 1024,  # Uploads are only admitted if they leave this much disk space free
+        "preallocate": True,  # Allocate a chunked upload's disk space when it starts (fallocate)
         "max_file_size_gb": 8  # Maximum file size limit in GB
+    },
+    "download": {
+        # "none" (Flask sends the file), "x-accel-redirect" (nginx), "x-sendfile" (Apache/lighttpd)
+        # or "sendfile" (os.sendfile() on the client socket, when the app serves clients directly)
+        "offload": "none",
+        "accel_redirect_prefix": "/protected-files/"  # nginx internal location aliasing managed_directory
     }
 }
 
+# --- Process-wide config cache ---
+# The parsed config is kept in memory and only re-read when config.yml's
+# mtime or size changes. Readers share one frozen snapshot per file version.
+_config_lock = threading.RLock()  # Reentrant: loading a missing file saves (and invalidates) the defaults
+_config_data = None       # Plain dict as loaded from disk (never handed out directly)
+_config_snapshot = None   # Read-only view of _config_data shared by all readers
+_config_signature = None  # (mtime_ns, size) of CONFIG_FILE when it was loaded, None if it did not exist
+_config_stale = True      # Set by invalidate_config_cache() to force a reload
+
+def _get_config_signature():
+    """Returns the (mtime_ns, size) of the config file, or None if it does not exist."""
+    try:
+        stat_result = os.stat(CONFIG_FILE)
+    except OSError:
+        return None
+    return (stat_result.st_mtime_ns, stat_result.st_size)
+
+def _freeze(value):
+    """Recursively converts dicts and lists into read-only equivalents."""
+    if isinstance(value, dict):
+        return MappingProxyType({key: _freeze(item) for key, item in value.items()})
+    if isinstance(value, list):
+        return tuple(_freeze(item) for item in value)
+    return value
+
 def get_config():
+    """
+    Returns an immutable snapshot of the configuration.
+    The YAML file is only parsed again when its mtime or size changes, so this is
+    cheap enough to call on every request. Use get_editable_config() to modify and save.
+    """
+    global _config_data, _config_snapshot, _config_signature, _config_stale
+    signature = _get_config_signature()
+    snapshot = _config_snapshot
+    if snapshot is not None and not _config_stale and signature == _config_signature:
+        return snapshot
+
+    with _config_lock:
+        # Another thread may have reloaded while we were waiting for the lock
+        signature = _get_config_signature()
+        if _config_snapshot is None or _config_stale or signature != _config_signature:
+            _config_data = _load_config()
+            _config_snapshot = _freeze(_config_data)
+            # A file that is still missing (e.g. an unwritable directory) is cached as None too
+            _config_signature = _get_config_signature()
+            _config_stale = False
+        return _config_snapshot
+
+def get_editable_config():
+    """Returns a mutable deep copy of the current configuration, suitable for save_config()."""
+    get_config()
+    with _config_lock:
+        return copy.deepcopy(_config_data)
+
+def invalidate_config_cache():
+    """Forces the next get_config() call to re-read the config file."""
+    global _config_stale
+    with _config_lock:
+        _config_stale = True
+
+def _load_config():
     """Loads configuration from YAML file, ensuring defaults and directory status."""
     if not os.path.exists(CONFIG_FILE):
         print(f"INFO: '{CONFIG_FILE}' not found. Creating a default one.")
@@ -36,7 +114,7 @@ def get_config():
                  print(f"WARNING: Default managed directory path '{path_for_creation_check}' exists but is not a directory.")
         except OSError as e:
             print(f"ERROR: Could not create default managed directory '{path_for_creation_check}': {e}")
-        config = DEFAULT_CONFIG.copy() # Use a copy of defaults
+        config = copy.deepcopy(DEFAULT_CONFIG) # Use a copy of defaults
     else:
         try:
             with open(CONFIG_FILE, 'r', encoding='utf-8') as f:
@@ -46,13 +124,13 @@ def get_config():
                     config = {}
         except yaml.YAMLError as e:
             print(f"ERROR: Error parsing '{CONFIG_FILE}': {e}. Loading default configuration.")
-            config = DEFAULT_CONFIG.copy()
+            config = copy.deepcopy(DEFAULT_CONFIG)
         except Exception as e:
             print(f"ERROR: An unexpected error occurred while loading '{CONFIG_FILE}': {e}. Loading default configuration.")
-            config = DEFAULT_CONFIG.copy()
+            config = copy.deepcopy(DEFAULT_CONFIG)
 
     # Merge with defaults to ensure all keys are present
-    final_config = DEFAULT_CONFIG.copy()
+    final_config = copy.deepcopy(DEFAULT_CONFIG)
     if isinstance(config, dict):
         final_config.update(config)
     else: # If config wasn't a dict for some reason
@@ -76,7 +154,7 @@ def get_config():
         path_for_creation_check = managed_dir_path_to_check
     path_for_creation_check = os.path.normpath(path_for_creation_check)
 
-    # This check is for informational purposes during get_config, FileManager will do its own robust check & creation
+    # This check is for informational purposes when the config is (re)loaded, FileManager will do its own robust check & creation
     if not os.path.exists(path_for_creation_check):
         print(f"INFO: Managed directory for '{CONFIG_FILE}' (resolved to '{path_for_creation_check}' from value '{managed_dir_path_to_check}') does not exist yet. FileManager will attempt to create it.")
     elif not os.path.isdir(path_for_creation_check):
@@ -93,6 +171,7 @@ def save_config(config_data):
             yaml.dump(config_data, f, default_flow_style=False)
     except Exception as e:
         print(f"ERROR: Error saving config file '{CONFIG_FILE}': {e}")
+    invalidate_config_cache()
 
 if __name__ == '__main__':
     print("Running config.py directly for testing.")
@@ -0,0 +1,114 @@
+import os
+import ssl
+import select
+import unicodedata
+from urllib.parse import quote
+
+from flask import Response
+from werkzeug.exceptions import RequestedRangeNotSatisfiable
+
+DEFAULT_ACCEL_REDIRECT_PREFIX = "/protected-files/"  # nginx `internal` location aliasing the managed directory
+SENDFILE_WRITE_TIMEOUT = 60  # Seconds a download may stall (client not reading) before it is dropped
+
+
+def set_content_disposition(response, filename, as_attachment):
+    """Content-Disposition as werkzeug's send_file writes it (RFC 6266 filename* for non-ASCII names)."""
+    try:
+        filename.encode("ascii")
+        names = {"filename": filename}
+    except UnicodeEncodeError:
+        simple = unicodedata.normalize("NFKD", filename).encode("ascii", "ignore").decode("ascii")
+        names = {"filename": simple, "filename*": f"UTF-8''{quote(filename, safe='!#$&+-.^_`|~')}"}
+    response.headers.set("Content-Disposition", "attachment" if as_attachment else "inline", **names)
+
+
+class SendfileBody:
+    """
+    WSGI body that copies a byte range of a file to the client socket with os.sendfile(),
+    in the kernel, instead of reading it into Python and writing it back out. The first
+    (empty) item makes the server send the status line and headers; the file follows
+    right behind them on the same socket.
+    """
+
+    def __init__(self, sock, path, offset, count):
+        self.sock = sock
+        self.path = path
+        self.offset = offset
+        self.count = count
+
+    def __iter__(self):
+        yield b""
+        with open(self.path, "rb") as source:
+            offset, remaining = self.offset, self.count
+            while remaining > 0:
+                try:
+                    sent = os.sendfile(self.sock.fileno(), source.fileno(), offset, remaining)
+                except BlockingIOError:
+                    # Sockets with a timeout are non-blocking underneath; wait until the client reads
+                    _, writable, _ = select.select([], [self.sock], [], SENDFILE_WRITE_TIMEOUT)
+                    if not writable:
+                        raise TimeoutError("Client stopped reading the download")
+                    continue
+                if sent == 0:
+                    break  # The file got shorter since the headers were sent
+                offset += sent
+                remaining -= sent
+
+
+def _client_socket(environ):
+    """The raw connection of the request when the server exposes it and it isn't TLS, else None."""
+    sock = environ.get("werkzeug.socket") or environ.get("gunicorn.socket")
+    if sock is None or isinstance(sock, ssl.SSLSocket) or not hasattr(os, "sendfile"):
+        return None
+    return sock
+
+
+def offloaded_file_response(request, abs_file_path, rel_path, mimetype, as_attachment, download_config):
+    """
+    Response for a download that doesn't pass the file's bytes through Python, or None
+    when the configured mode can't serve it (the caller sends the file itself then).
+
+    - "x-accel-redirect": an empty response whose X-Accel-Redirect header makes nginx serve
+      `rel_path` from its internal location at `accel_redirect_prefix`.
+    - "x-sendfile": the same for Apache (mod_xsendfile) and lighttpd, with the absolute path.
+    - "sendfile": the app serves the file itself, with os.sendfile() on the client socket.
+
+    The front-end server handles Range requests in the first two modes; in "sendfile" mode
+    they are answered here (206 with the requested range, 416 if it can't be satisfied), so
+    seeking in videos works in every mode. Auth and path checks happen before this is called.
+    """
+    mode = download_config.get("offload", "none")
+    if mode == "x-accel-redirect":
+        prefix = download_config.get("accel_redirect_prefix", DEFAULT_ACCEL_REDIRECT_PREFIX)
+        response = Response(mimetype=mimetype)
+        response.headers["X-Accel-Redirect"] = prefix.rstrip("/") + "/" + quote(rel_path.lstrip("/"))
+    elif mode == "x-sendfile":
+        response = Response(mimetype=mimetype)
+        response.headers["X-Sendfile"] = abs_file_path
+    elif mode == "sendfile":
+        sock = _client_socket(request.environ)
+        if sock is None:
+            return None
+        stat_result = os.stat(abs_file_path)
+        response = Response(mimetype=mimetype, direct_passthrough=True)
+        response.content_length = stat_result.st_size
+        response.last_modified = stat_result.st_mtime
+        response.set_etag(f"{stat_result.st_mtime}-{stat_result.st_size}-{stat_result.st_ino}")
+        try:
+            # Answers If-None-Match / If-Modified-Since with 304 and Range with 206
+            response.make_conditional(request, accept_ranges=True, complete_length=stat_result.st_size)
+        except RequestedRangeNotSatisfiable as e:
+            return e.get_response()
+        if response.status_code == 206:
+            offset = response.content_range.start
+            count = response.content_range.stop - offset
+        elif response.status_code == 200:
+            offset, count = 0, stat_result.st_size
+        else:
+            return response
+        if request.method != "HEAD" and count > 0:
+            response.response = SendfileBody(sock, abs_file_path, offset, count)
+    else:
+        return None
+    set_content_disposition(response, os.path.basename(abs_file_path), as_attachment)
+    return response
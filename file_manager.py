@@ -1,6 +1,11 @@
 import os
+import stat
+import errno
 import shutil
 import zipfile
+import mimetypes
+import functools
+import contextlib
 try:
     import rarfile
     RARFILE_AVAILABLE = True
@@ -19,12 +24,159 @@ try:
 except ImportError:
     TARFILE_AVAILABLE = False
 
+try:
+    import blake3
+    BLAKE3_AVAILABLE = True
+except ImportError:
+    BLAKE3_AVAILABLE = False
+
+try:
+    import xxhash
+    XXHASH_AVAILABLE = True
+except ImportError:
+    XXHASH_AVAILABLE = False
+
 from werkzeug.utils import secure_filename
 from config import get_config
+from metadata_index import MetadataIndex
+from fs_watcher import FileSystemWatcher
 import tempfile
 import time
 import threading
 import uuid
+import json
+import base64
+import hashlib
+import itertools
+import queue
+from collections import OrderedDict
+
+LISTING_SORT_FIELDS = ("name", "size", "mtime")
+LISTING_MAX_PAGE_SIZE = 5000
+LISTING_SNAPSHOT_MAX_DIRS = 64   # Sorted directory snapshots kept in memory (LRU)
+LISTING_SNAPSHOT_MAX_AGE = 30    # Seconds a snapshot may serve a fresh (cursor-less) listing
+LISTING_SNAPSHOT_PAGING_AGE = 300  # Seconds a snapshot keeps serving follow-up pages of a listing
+PARTIAL_UPLOAD_SUFFIX = ".partial"  # In-progress direct uploads are written to ".<name>.<upload id>.partial"
+UPLOAD_WRITE_BLOCK_SIZE = 1024 * 1024  # Bytes read from the request and written per positional write
+FINALIZE_WORKERS = 2             # Background threads completing uploads whose last chunk arrived
+FINALIZE_PROGRESS_STEP = 5       # Percent of progress between two job updates sent to listeners
+FINALIZE_JOB_TTL = 3600          # Seconds a finished upload job stays queryable
+UPLOAD_SESSIONS_DIR = "upload_sessions"  # State of resumable uploads (<upload id>.json), reloaded on startup
+DEFAULT_CHECKSUM_ALGORITHM = "sha256"
+MAX_UPLOAD_CHUNKS = 100000       # Chunks per upload; bounds its bookkeeping (received set, resume bitmap, missing list)
+CHECKSUM_BUFFER_MAX_BYTES = 64 * 1024 * 1024  # Out-of-order chunk data kept (across all uploads) until their file hash reaches it
+DEDUP_RECORD_BATCH = 1000        # Deduplicated chunks recorded (and the session state saved) at a time
+BUNDLE_MAX_BYTES = 16 * 1024 * 1024  # File content in one bundle upload (UPLOAD_BUNDLE_MAX_BYTES in script.js)
+BUNDLE_MAX_ENTRIES = 1000        # Files and folders in one bundle upload (UPLOAD_BUNDLE_MAX_FILES in script.js)
+BUNDLE_MAX_STREAM_BYTES = BUNDLE_MAX_BYTES + BUNDLE_MAX_ENTRIES * 8 * 512  # The whole tar stream: content plus headers, pax records and padding
+BACKPRESSURE_RETRY_AFTER = 2     # Seconds a chunk request turned away by backpressure is told to wait
+
+_LISTING_SORT_KEYS = {
+    "name": lambda item: (item['name'].lower(), item['name']),
+    "size": lambda item: (item['size'] or 0, item['name'].lower()),
+    "mtime": lambda item: (item['mtime'] or 0, item['name'].lower()),
+}
+
+@functools.lru_cache(maxsize=1024)
+def _guess_mime_type_for_extension(extension):
+    return mimetypes.guess_type(f"file.{extension}")[0]
+
+def _guess_mime_type(filename):
+    """MIME type guess keyed on the (lower-cased) extension, cached across listings."""
+    _, dot, extension = filename.rpartition('.')
+    return _guess_mime_type_for_extension(extension.lower()) if dot else None
+
+def _is_partial_upload_name(name):
+    """True for the hidden files chunked uploads are written to; listings, the index and the watcher skip them."""
+    return name.startswith('.') and name.endswith(PARTIAL_UPLOAD_SUFFIX)
+
+def _encode_chunk_bitmap(chunk_indexes, total_chunks):
+    """Received-chunk set -> base64 bitmap (bit i set = chunk i received), as stored in session files."""
+    bitmap = bytearray((total_chunks + 7) // 8)
+    for chunk_index in chunk_indexes:
+        bitmap[chunk_index // 8] |= 1 << (chunk_index % 8)
+    return base64.b64encode(bytes(bitmap)).decode('ascii')
+
+def _decode_chunk_bitmap(encoded, total_chunks):
+    bitmap = base64.b64decode(encoded)
+    return {chunk_index for chunk_index in range(total_chunks) if bitmap[chunk_index // 8] >> (chunk_index % 8) & 1}
+
+def _new_hasher(algorithm):
+    """Incremental hasher for a checksum algorithm: 'blake3', an xxhash one ('xxh64', 'xxh3_128', ...) or any hashlib name."""
+    if algorithm == "blake3":
+        if not BLAKE3_AVAILABLE:
+            raise ValueError("blake3 is not installed")
+        return blake3.blake3()
+    if algorithm.startswith("xxh"):
+        if not XXHASH_AVAILABLE:
+            raise ValueError("xxhash is not installed")
+        hasher_class = getattr(xxhash, algorithm, None)
+        if hasher_class is None:
+            raise ValueError(f"unsupported xxhash algorithm {algorithm}")
+        return hasher_class()
+    return hashlib.new(algorithm)
+
+def _cpu_load():
+    """1-minute load average per CPU, or None where the platform has none (Windows)."""
+    try:
+        return os.getloadavg()[0] / (os.cpu_count() or 1)
+    except (AttributeError, OSError):
+        return None
+
+def _checksums_match(expected, digest):
+    return expected.strip().lower() == digest
+
+def _copy_range(source_fd, target_fd, source_offset, target_offset, length, blocks):
+    """
+    Copies a file range with os.copy_file_range, which stays in the kernel and shares the
+    extents (reflink) on filesystems that support it (Btrfs, XFS). Falls back to writing
+    `blocks`, the range's data, where it is unavailable (other platforms, across filesystems).
+    """
+    if hasattr(os, "copy_file_range"):
+        try:
+            copied = 0
+            while copied < length:
+                count = os.copy_file_range(source_fd, target_fd, length - copied, source_offset + copied, target_offset + copied)
+                if count == 0:
+                    raise IOError("Source file ends before the chunk")
+                copied += count
+            return
+        except OSError as e:
+            if e.errno not in (errno.EXDEV, errno.ENOSYS, errno.EINVAL, errno.EOPNOTSUPP):
+                raise
+    for block in blocks:  # Rewrites the whole range, also whatever a failed copy_file_range got through
+        _write_at(target_fd, block, target_offset)
+        target_offset += len(block)
+
+def _write_at(file_descriptor, data, offset):
+    """Positional write; os.pwrite where available (Unix), seek + write elsewhere."""
+    if hasattr(os, "pwrite"):
+        while data:
+            written = os.pwrite(file_descriptor, data, offset)
+            data, offset = data[written:], offset + written
+    else:
+        os.lseek(file_descriptor, offset, os.SEEK_SET)
+        while data:
+            data = data[os.write(file_descriptor, data):]
+
+class _BoundedReader:
+    """Reads `stream` up to `limit` bytes; past that it ends as if truncated and sets `exceeded`."""
+
+    def __init__(self, stream, limit):
+        self.stream = stream
+        self.remaining = limit
+        self.exceeded = False
+
+    def read(self, size=-1):
+        if size is None or size < 0 or size > self.remaining:
+            size = self.remaining + 1  # One byte more tells a stream that is too long from one that ends at the limit
+        data = self.stream.read(size)
+        if len(data) > self.remaining:
+            self.exceeded = True
+            self.remaining = 0
+            return b''
+        self.remaining -= len(data)
+        return data
 
 class FileManager:
     def __init__(self):
@@ -36,8 +188,45 @@ class FileManager:
         # Initialize chunked upload storage
         self.chunk_uploads = {}  # Store information about ongoing chunked uploads
         self.upload_lock = threading.Lock()  # Thread safety for chunked uploads
+        self._active_chunk_requests = 0  # Chunk requests being written, for backpressure
+        self._space_reservations = {}  # Disk space promised to uploads in progress, see _reserve_space()
+        self._space_lock = threading.Lock()
+        self._hash_buffered_bytes = 0  # Chunk data of all uploads waiting for their file hash, see CHECKSUM_BUFFER_MAX_BYTES
+        self._hash_buffer_lock = threading.Lock()
         self._setup_cleanup_timer()  # Start cleanup timer for abandoned uploads
 
+        # Uploads are finalized (assembled, moved into place, indexed) off the request thread
+        self.upload_jobs = {}  # job id -> job dict, see _queue_finalize_job()
+        self._upload_job_ids = {}  # upload id -> job id, so retried final chunks find their job
+        self._upload_job_listeners = []  # Called with a copy of the job on every status/progress change
+        self._finalize_queue = queue.Queue()
+        for worker_number in range(FINALIZE_WORKERS):
+            threading.Thread(target=self._run_finalize_worker, name=f"upload-finalize-{worker_number}",
+                             daemon=True).start()
+        self.upload_sessions_dir = os.path.abspath(UPLOAD_SESSIONS_DIR)
+        self.checksum_algorithm = self._get_checksum_algorithm()  # Uploads are hashed as they are written
+        self.dedup_enabled = self.config.get('upload', {}).get('dedup_enabled', True)  # See dedup_upload()
+
+        # Sorted directory snapshots used to serve paginated listings without re-scanning
+        self._listing_snapshots = OrderedDict()  # (abs_path, path_prefix) -> snapshot dict
+        self._listing_lock = threading.Lock()
+        self._snapshot_versions = itertools.count(1)
+        self._listing_generation = 0  # Bumped by invalidate_listings() so in-flight scans are not cached as fresh
+        self._listing_instance = uuid.uuid4().hex[:8]  # Keeps ETags from matching across restarts
+
+        # Searchable metadata of the whole tree, crawled in the background and updated via notify_changed()
+        self.metadata_index = MetadataIndex(self.managed_dir, exclude_name=_is_partial_upload_name)
+        self.metadata_index.start()
+
+        self._change_listeners = []  # Called by notify_changed() with (abs_paths, external)
+
+        # Picks up changes made outside the app; the app's own changes are excluded via notify_changed()
+        self.watcher = FileSystemWatcher(self.managed_dir, exclude_name=_is_partial_upload_name)
+        self.watcher.add_batch_listener(self._on_external_changes)
+        self.watcher.start()
+
+        self._load_upload_sessions()  # Resumable uploads interrupted by a restart (may need the index/watcher)
+
     def _get_managed_dir(self):
         """Get and validate the managed directory path."""
         managed_dir = self.config.get('managed_directory', './managed_files')
@@ -57,6 +246,15 @@ class FileManager:
         # Don't print the info message on every call
         return abs_managed_dir
 
+    def _get_checksum_algorithm(self):
+        algorithm = self.config.get('upload', {}).get('checksum_algorithm', DEFAULT_CHECKSUM_ALGORITHM)
+        try:
+            _new_hasher(algorithm).hexdigest()
+        except (ValueError, TypeError) as e:
+            print(f"WARNING: Checksum algorithm '{algorithm}' unavailable ({e}), using {DEFAULT_CHECKSUM_ALGORITHM}.")
+            return DEFAULT_CHECKSUM_ALGORITHM
+        return algorithm
+
     def _get_safe_path(self, relative_path):
         """Convert a relative path to a safe absolute path within managed directory."""
         if not self.managed_dir:
@@ -204,8 +402,22 @@ class FileManager:
         """Lists the contents (filenames and directories) of a ZIP archive."""
         return self.get_archive_contents(zip_file_relative_path)
 
-    def list_directory(self, sub_path=""):
-        """Lists contents of a directory within the managed scope."""
+    def list_directory(self, sub_path="", sort="name", order="asc", limit=None, cursor=None):
+        """
+        Lists contents of a directory within the managed scope.
+        Directories always come first; within each group items are sorted by `sort`
+        (name, size or mtime) in `order` (asc/desc). With `limit`, only one page is
+        returned together with a `next_cursor` to pass back for the following page.
+        Pages are cut from a cached sorted snapshot, so paging does not re-list the directory.
+        The result carries a strong `etag` that only changes when the page's content can have changed.
+        """
+        if sort not in LISTING_SORT_FIELDS:
+            return {"error": f"Invalid sort field '{sort}'. Use one of: {', '.join(LISTING_SORT_FIELDS)}."}
+        if order not in ("asc", "desc"):
+            return {"error": f"Invalid sort order '{order}'. Use 'asc' or 'desc'."}
+        if limit is not None and not 1 <= limit <= LISTING_MAX_PAGE_SIZE:
+            return {"error": f"Invalid limit. It must be between 1 and {LISTING_MAX_PAGE_SIZE}."}
+
         try:
             current_path = self._get_safe_path(sub_path)
         except PermissionError as e:
@@ -217,23 +429,255 @@ class FileManager:
         if not os.path.isdir(current_path):
             return {"error": f"Path is not a directory: {current_path}"} 
 
-        items = []
+        cursor_state = None
+        if cursor:
+            cursor_state = self._decode_listing_cursor(cursor)
+            if cursor_state is None:
+                return {"error": "Invalid listing cursor."}
+
+        path_prefix = os.path.join(sub_path, '').replace('\\', '/') # '' for the root, 'a/b/' otherwise
         try:
-            for item_name in os.listdir(current_path):
-                item_path = os.path.join(current_path, item_name)
-                item_type = "directory" if os.path.isdir(item_path) else "file"
-                items.append({
-                    "name": item_name,
-                    "type": item_type,
-                    "path": os.path.join(sub_path, item_name).replace('\\', '/') # Relative path for client
-                })
+            snapshot = self._get_directory_snapshot(current_path, path_prefix, paging=cursor_state is not None)
         except OSError as e:
             print(f"ERROR: OSError when listing directory '{current_path}': {e}")
             return {"error": f"Cannot access directory contents: {e.strerror}"} 
-        
-        # Sort: directories first, then by name
-        items.sort(key=lambda x: (x['type'] != 'directory', x['name'].lower()))
-        return {"path": sub_path.replace('\\', '/'), "items": items}
+
+        view = self._get_sorted_view(snapshot, sort, order)
+        items = view["items"]
+        start = self._resolve_cursor_offset(snapshot, view, cursor_state) if cursor_state else 0
+        end = len(items) if limit is None else min(start + limit, len(items))
+
+        page, usage_version = self._with_directory_usage(items[start:end])
+        result = {
+            "path": sub_path.replace('\\', '/'),
+            "items": page,
+            "total": len(items),
+            "sort": sort,
+            "order": order,
+            "next_cursor": None
+        }
+        if end < len(items):
+            result["next_cursor"] = self._encode_listing_cursor(snapshot["version"], end, items[end - 1]["name"])
+        result["etag"] = f"{self._listing_instance}-{snapshot['version']}-{sort}-{order}-{start}-{end}-{usage_version}"
+        return result
+
+    def _with_directory_usage(self, page):
+        """
+        Returns the page with `total_size`/`file_count` (recursive, from the metadata index)
+        added to directory entries, plus the usage version those numbers came from.
+        Entries are copied, never changed in place, because they belong to the cached snapshot.
+        """
+        directory_paths = [item['path'] for item in page if item['type'] == 'directory']
+        if not directory_paths:
+            return page, 0
+        usage_version = self.metadata_index.usage_version
+        usage = self.metadata_index.get_usage_many(directory_paths)
+        decorated = []
+        for item in page:
+            if item['type'] == 'directory':
+                total_size, file_count, _ = usage.get(item['path'], (None, None, None))
+                item = dict(item, total_size=total_size, file_count=file_count)
+            decorated.append(item)
+        return decorated, usage_version
+
+    def get_usage(self, sub_path=""):
+        """Recursive disk usage of a file or directory and its largest children, from the metadata index."""
+        try:
+            self._get_safe_path(sub_path)
+        except PermissionError as e:
+            return {"error": str(e)}
+        usage = self.metadata_index.get_usage(sub_path.replace('\\', '/'))
+        if usage is None:
+            return {"error": f"Path not found in index: {sub_path}"}
+        usage["complete"] = self.metadata_index.ready
+        return usage
+
+    def notify_changed(self, *abs_paths, external=False):
+        """
+        Must be called after anything under `abs_paths` was created, modified or removed
+        (every mutating method here does, app.py does for moves). Updates the listing
+        cache and the metadata index, and tells the watcher to ignore the echo of changes
+        the app made itself (`external` is set for changes reported by the watcher). The
+        change itself should run inside watcher.ignoring(), so that the watcher doesn't
+        report a long operation halfway through.
+        """
+        if not external:
+            self.watcher.ignore(*abs_paths)
+        self.invalidate_listings(*abs_paths)
+        self.metadata_index.refresh(*abs_paths)
+        for listener in self._change_listeners:
+            try:
+                listener(abs_paths, external)
+            except Exception as e:
+                print(f"ERROR: Change listener failed: {e}")
+
+    def add_change_listener(self, listener):
+        """Registers listener(abs_paths, external), called after every notify_changed()."""
+        self._change_listeners.append(listener)
+
+    def get_entry_info(self, abs_path):
+        """The listing record (see _build_entry_info) for a single path, or None if it does not exist."""
+        try:
+            link_stat = os.lstat(abs_path)
+        except OSError:
+            return None
+        is_symlink = stat.S_ISLNK(link_stat.st_mode)
+        try:
+            stat_result = os.stat(abs_path) if is_symlink else link_stat
+        except OSError:
+            stat_result = link_stat  # Broken symlink: describe the link itself
+        is_dir = stat.S_ISDIR(stat_result.st_mode)
+        name = os.path.basename(abs_path)
+        rel_path = os.path.relpath(abs_path, self.managed_dir).replace('\\', '/')
+        return {
+            "name": name,
+            "type": "directory" if is_dir else "file",
+            "path": rel_path,
+            "size": None if is_dir else stat_result.st_size,
+            "mtime": stat_result.st_mtime,
+            "is_symlink": is_symlink,
+            "mime_type": None if is_dir else _guess_mime_type(name)
+        }
+
+    def _on_external_changes(self, changes):
+        """Batch listener of the file system watcher."""
+        for change in changes:
+            self.notify_changed(*(change["paths"] or [change["directory"]]), external=True)
+
+    def search(self, **filters):
+        """Searches the metadata index. See MetadataIndex.search for the filters."""
+        return self.metadata_index.search(**filters)
+
+    def invalidate_listings(self, *abs_paths):
+        """
+        Marks cached listings affected by changes to `abs_paths` as stale: the parent
+        directory of each path, the path itself and anything below it. Needed on top
+        of the mtime check, since a directory's mtime does not change when a file
+        inside it is overwritten.
+        """
+        targets = [os.path.normpath(path) for path in abs_paths if path]
+        with self._listing_lock:
+            self._listing_generation += 1
+            for (snapshot_path, _), snapshot in self._listing_snapshots.items():
+                for target in targets:
+                    if snapshot_path in (target, os.path.dirname(target)) \
+                            or snapshot_path.startswith(os.path.join(target, '')):
+                        snapshot["stale"] = True
+                        break
+
+    def _scan_directory(self, current_path, path_prefix):
+        """Reads every entry of a directory (unsorted) with a single os.scandir pass."""
+        # scandir returns the entry type from the directory read itself, so each entry
+        # costs at most one stat() call for size/mtime (the old isdir() already paid that)
+        with os.scandir(current_path) as entries:
+            return [self._build_entry_info(entry, path_prefix) for entry in entries
+                    if not _is_partial_upload_name(entry.name)]
+
+    def _get_directory_snapshot(self, current_path, path_prefix, paging=False):
+        """
+        Returns the cached snapshot of a directory, scanning it again if it was invalidated,
+        the directory's mtime/inode changed or the snapshot is too old. Follow-up pages
+        (`paging`) accept older snapshots so a listing stays consistent while it is being
+        paged through. A rescan that finds exactly the same entries keeps the old version,
+        so ETags and cursors stay valid.
+        """
+        dir_stat = os.stat(current_path)
+        signature = (dir_stat.st_mtime_ns, dir_stat.st_ino)
+        key = (current_path, path_prefix)
+        max_age = LISTING_SNAPSHOT_PAGING_AGE if paging else LISTING_SNAPSHOT_MAX_AGE
+
+        with self._listing_lock:
+            previous = self._listing_snapshots.get(key)
+            if previous is not None and not previous.get("stale") and previous["signature"] == signature \
+                    and time.monotonic() - previous["created"] <= max_age:
+                self._listing_snapshots.move_to_end(key)
+                return previous
+            generation = self._listing_generation
+
+        entries = self._scan_directory(current_path, path_prefix)
+        if previous is not None and previous["entries"] == entries:
+            snapshot = dict(previous, signature=signature, created=time.monotonic(), stale=False)
+        else:
+            snapshot = {
+                "version": next(self._snapshot_versions),
+                "signature": signature,
+                "created": time.monotonic(),
+                "entries": entries,
+                "views": {}  # (sort, order) -> {"items": [...], "positions": {name: index}}
+            }
+        with self._listing_lock:
+            if generation != self._listing_generation:
+                # Something changed while we were scanning; serve this result once but don't trust it
+                snapshot["stale"] = True
+            self._listing_snapshots[key] = snapshot
+            self._listing_snapshots.move_to_end(key)
+            while len(self._listing_snapshots) > LISTING_SNAPSHOT_MAX_DIRS:
+                self._listing_snapshots.popitem(last=False)
+        return snapshot
+
+    def _get_sorted_view(self, snapshot, sort, order):
+        """Returns (and memoizes on the snapshot) the entries sorted by (sort, order), directories first."""
+        view = snapshot["views"].get((sort, order))
+        if view is None:
+            sort_key = _LISTING_SORT_KEYS[sort]
+            reverse = order == "desc"
+            directories = sorted((item for item in snapshot["entries"] if item["type"] == "directory"),
+                                 key=sort_key, reverse=reverse)
+            files = sorted((item for item in snapshot["entries"] if item["type"] != "directory"),
+                           key=sort_key, reverse=reverse)
+            view = {"items": directories + files, "positions": None}
+            snapshot["views"][(sort, order)] = view
+        return view
+
+    def _resolve_cursor_offset(self, snapshot, view, cursor_state):
+        """Finds where the next page starts. Falls back to the last item's name if the snapshot was rebuilt."""
+        if cursor_state["v"] == snapshot["version"]:
+            return cursor_state["o"]
+        if view["positions"] is None:
+            view["positions"] = {item["name"]: index for index, item in enumerate(view["items"])}
+        position = view["positions"].get(cursor_state["n"])
+        return position + 1 if position is not None else min(cursor_state["o"], len(view["items"]))
+
+    @staticmethod
+    def _encode_listing_cursor(version, offset, last_name):
+        payload = json.dumps({"v": version, "o": offset, "n": last_name}, separators=(',', ':'))
+        return base64.urlsafe_b64encode(payload.encode('utf-8')).decode('ascii')
+
+    @staticmethod
+    def _decode_listing_cursor(cursor):
+        try:
+            state = json.loads(base64.urlsafe_b64decode(cursor.encode('ascii')))
+            if isinstance(state, dict) and isinstance(state.get("v"), int) and isinstance(state.get("o"), int) \
+                    and state["o"] >= 0 and isinstance(state.get("n"), str):
+                return state
+        except (ValueError, UnicodeError):
+            pass
+        return None
+
+    def _build_entry_info(self, entry, path_prefix):
+        """Builds the listing record for an os.DirEntry: name, type, path, size, mtime, symlink flag, MIME."""
+        is_symlink = False
+        try:
+            is_symlink = entry.is_symlink()
+            is_dir = entry.is_dir()  # Follows symlinks, like os.path.isdir did
+            stat_result = entry.stat()
+        except OSError:
+            # Broken symlink or entry removed while listing: fall back to the link itself
+            is_dir = False
+            try:
+                stat_result = entry.stat(follow_symlinks=False)
+            except OSError:
+                stat_result = None
+
+        return {
+            "name": entry.name,
+            "type": "directory" if is_dir else "file",
+            "path": path_prefix + entry.name, # Relative path for client
+            "size": stat_result.st_size if stat_result is not None and not is_dir else None,
+            "mtime": stat_result.st_mtime if stat_result is not None else None,
+            "is_symlink": is_symlink,
+            "mime_type": None if is_dir else _guess_mime_type(entry.name)
+        }
 
     def get_file_content(self, file_path):
         """Reads content of a file within the managed scope."""
@@ -250,10 +694,12 @@ class FileManager:
         """Saves content to a file within the managed scope."""
         abs_file_path = self._get_safe_path(file_path)
         try:
-            # Ensure parent directory exists
-            os.makedirs(os.path.dirname(abs_file_path), exist_ok=True)
-            with open(abs_file_path, 'w', encoding='utf-8') as f:
-                f.write(content)
+            with self.watcher.ignoring(abs_file_path):
+                # Ensure parent directory exists
+                os.makedirs(os.path.dirname(abs_file_path), exist_ok=True)
+                with open(abs_file_path, 'w', encoding='utf-8') as f:
+                    f.write(content)
+            self.notify_changed(abs_file_path)
             return {"success": True, "message": "File saved."}
         except PermissionError as e:
              raise e # Re-raise to be caught by app route
@@ -266,7 +712,9 @@ class FileManager:
         if os.path.exists(abs_folder_path):
             return {"error": "Folder or file already exists."}
         try:
-            os.makedirs(abs_folder_path)
+            with self.watcher.ignoring(abs_folder_path):
+                os.makedirs(abs_folder_path)
+            self.notify_changed(abs_folder_path)
             return {"success": True, "message": "Folder created."}
         except Exception as e:
             return {"error": f"Could not create folder: {str(e)}"}
@@ -277,10 +725,12 @@ class FileManager:
         if not os.path.exists(abs_item_path):
             return {"error": "Item not found."}
         try:
-            if os.path.isfile(abs_item_path):
-                os.remove(abs_item_path)
-            elif os.path.isdir(abs_item_path):
-                shutil.rmtree(abs_item_path) # Danger: Recursive delete
+            with self.watcher.ignoring(abs_item_path):
+                if os.path.isfile(abs_item_path):
+                    os.remove(abs_item_path)
+                elif os.path.isdir(abs_item_path):
+                    shutil.rmtree(abs_item_path) # Danger: Recursive delete
+            self.notify_changed(abs_item_path)
             return {"success": True, "message": "Item deleted."}
         except PermissionError as e:
              raise e # Re-raise
@@ -290,6 +740,7 @@ class FileManager:
     def batch_delete_items(self, item_paths):
         """Deletes multiple files or folders within the managed scope."""
         results = []
+        deleted_paths = []
         all_successful = True
         for item_path in item_paths:
             try:
@@ -298,10 +749,12 @@ class FileManager:
                     results.append({"path": item_path, "status": "error", "message": "Item not found."})
                     all_successful = False
                     continue
-                if os.path.isfile(abs_item_path):
-                    os.remove(abs_item_path)
-                elif os.path.isdir(abs_item_path):
-                    shutil.rmtree(abs_item_path)
+                with self.watcher.ignoring(abs_item_path):
+                    if os.path.isfile(abs_item_path):
+                        os.remove(abs_item_path)
+                    elif os.path.isdir(abs_item_path):
+                        shutil.rmtree(abs_item_path)
+                deleted_paths.append(abs_item_path)
                 results.append({"path": item_path, "status": "success", "message": "Item deleted."})
             except PermissionError:
                 results.append({"path": item_path, "status": "error", "message": "Permission denied."})
@@ -310,38 +763,230 @@ class FileManager:
                 results.append({"path": item_path, "status": "error", "message": str(e)})
                 all_successful = False
         
+        if deleted_paths:
+            self.notify_changed(*deleted_paths) # One notification, so listeners can batch per directory
         return {"success": all_successful, "results": results}
 
 
-    def upload_file(self, file_storage, upload_sub_path=""):
+    def upload_file(self, file_storage, upload_sub_path="", checksum=None):
         """Saves an uploaded file to the specified sub_path within the managed directory."""
         if not file_storage:
             return {"error": "No file provided."}
-        
-        filename = secure_filename(file_storage.filename)
-        if not filename: # Empty filename after secure_filename (e.g. just "..")
-             return {"error": "Invalid filename."}
+        return self.upload_stream(file_storage.stream, file_storage.filename, upload_sub_path, checksum=checksum)
+
+    def upload_stream(self, stream, filename, upload_sub_path="", max_bytes=None, checksum=None, expected_size=None):
+        """
+        Saves a raw request body (application/octet-stream uploads) straight to its destination,
+        UPLOAD_WRITE_BLOCK_SIZE bytes at a time, without the multipart parser's temporary spool.
+        The data goes to a hidden partial file first, so a broken-off upload never shows up.
+
+        The content is hashed as it is written; if the client sent a `checksum` (hex digest,
+        self.checksum_algorithm) that doesn't match, the file is discarded. An `expected_size`
+        (the Content-Length) is admitted against the free disk space first.
+        """
+        filename = secure_filename(filename or "")
+        if not filename:
+            return {"error": "Invalid filename."}
 
         target_folder = self._get_safe_path(upload_sub_path)
-        if not os.path.isdir(target_folder): # Ensure target_folder is a directory and exists
+        if not os.path.isdir(target_folder):
             try:
                 os.makedirs(target_folder, exist_ok=True)
             except Exception as e:
-                 return {"error": f"Could not create upload directory: {str(e)}"}
-
+                return {"error": f"Could not create upload directory: {str(e)}"}
         abs_file_path = os.path.join(target_folder, filename)
-
-        # Security: Check again to ensure the final path is still within managed_dir
-        # This is somewhat redundant if _get_safe_path and secure_filename are robust,
-        # but good for defense in depth.
         if not os.path.normpath(abs_file_path).startswith(self.managed_dir):
             return {"error": "Upload path is outside managed directory."}
 
+        reservation = uuid.uuid4().hex
+        if expected_size is not None:
+            admission = self._reserve_space(reservation, expected_size)
+            if admission:
+                return admission
         try:
-            file_storage.save(abs_file_path)
-            return {"success": True, "message": f"File '{filename}' uploaded to '{upload_sub_path}'.", "filename": filename, "path": os.path.join(upload_sub_path, filename).replace('\\','/')}
+            with self.watcher.ignoring(abs_file_path):
+                digest = self._write_upload_file(stream, abs_file_path, max_bytes, checksum)
         except Exception as e:
             return {"error": f"Could not save uploaded file: {str(e)}"}
+        finally:
+            self._release_space(reservation)
+        if checksum and not _checksums_match(checksum, digest):
+            return {"error": f"Checksum mismatch: expected {checksum}, received data has {digest}.", "checksum_mismatch": True}
+
+        self._record_checksum(abs_file_path, self.checksum_algorithm, digest)
+        self.notify_changed(abs_file_path)
+        return {"success": True, "message": f"File '{filename}' uploaded to '{upload_sub_path}'.", "filename": filename,
+                "path": os.path.join(upload_sub_path, filename).replace('\\','/'), "checksum": digest}
+
+    def _write_upload_file(self, stream, abs_file_path, max_bytes=None, checksum=None):
+        """
+        Writes `stream` to `abs_file_path` through a hidden partial file, hashing it on the way,
+        and returns the digest. If it doesn't match `checksum`, the file is discarded instead of
+        moved into place. Nothing is left behind if writing fails.
+        """
+        target_folder, filename = os.path.split(abs_file_path)
+        partial_path = os.path.join(target_folder, f".{filename}.{uuid.uuid4().hex}{PARTIAL_UPLOAD_SUFFIX}")
+        written = 0
+        hasher = _new_hasher(self.checksum_algorithm)
+        try:
+            with open(partial_path, 'wb', buffering=0) as output_file:
+                while True:
+                    block = stream.read(UPLOAD_WRITE_BLOCK_SIZE)
+                    if not block:
+                        break
+                    written += len(block)
+                    if max_bytes is not None and written > max_bytes:
+                        raise ValueError(f"File exceeds the maximum allowed size of {max_bytes} bytes.")
+                    output_file.write(block)
+                    hasher.update(block)
+            digest = hasher.hexdigest()
+            if checksum and not _checksums_match(checksum, digest):
+                os.remove(partial_path)
+            else:
+                os.replace(partial_path, abs_file_path)
+        except Exception:
+            try:
+                os.remove(partial_path)
+            except OSError:
+                pass
+            raise
+        return digest
+
+    def upload_bundle(self, stream, upload_sub_path="", max_bytes=None, expected_size=None):
+        """
+        Unpacks a streamed tar archive of many (small) files into upload_sub_path, one member
+        at a time as the request body arrives, so a folder of thousands of files takes a single
+        request. Member paths are sanitized component by component with secure_filename and
+        resolved through _get_safe_path; entries that aren't regular files or directories are
+        refused. Each file goes through a partial file like upload_stream, and listeners get
+        one change notification for the whole bundle.
+
+        Entries that could not be written are reported in "errors" without stopping the rest.
+        An `expected_size` (the Content-Length) is admitted against the free disk space first.
+        A bundle is limited to BUNDLE_MAX_ENTRIES entries and BUNDLE_MAX_BYTES of file content
+        (checked on the tar headers) and its stream to BUNDLE_MAX_STREAM_BYTES, whether or not a
+        Content-Length was sent. Past a limit unpacking stops with a `too_large` error; the files
+        written until then are kept and counted.
+        """
+        if not TARFILE_AVAILABLE:
+            return {"error": "Bundle uploads need the tarfile module."}
+        if expected_size is not None and expected_size > BUNDLE_MAX_STREAM_BYTES:
+            return {"error": f"Bundle exceeds the maximum allowed size of {BUNDLE_MAX_BYTES // (1024 * 1024)}MB.",
+                    "too_large": True}
+        reservation = uuid.uuid4().hex
+        if expected_size is not None:
+            admission = self._reserve_space(reservation, expected_size)
+            if admission:
+                return admission
+        try:
+            # Everything the bundle touches stays ignored by the watcher until it is unpacked
+            with contextlib.ExitStack() as ignored:
+                return self._unpack_bundle(stream, upload_sub_path, max_bytes, ignored)
+        finally:
+            self._release_space(reservation)
+
+    def _unpack_bundle(self, stream, upload_sub_path, max_bytes, ignored):
+        target_folder = self._get_safe_path(upload_sub_path)
+        created_folder = None  # Topmost folder of upload_sub_path that doesn't exist yet
+        folder = target_folder
+        while not os.path.isdir(folder) and folder != self.managed_dir:
+            created_folder, folder = folder, os.path.dirname(folder)
+        if created_folder:
+            ignored.enter_context(self.watcher.ignoring(created_folder))
+        try:
+            os.makedirs(target_folder, exist_ok=True)
+        except Exception as e:
+            return {"error": f"Could not create upload directory: {str(e)}"}
+
+        changed_paths = {}  # Top-level entries under the target, the only paths listeners need to hear about
+        if created_folder:
+            changed_paths[created_folder] = None
+        checksums = []
+        errors = []
+        files = directories = 0
+        entries = content_bytes = 0
+        too_large = None
+        bounded_stream = _BoundedReader(stream, BUNDLE_MAX_STREAM_BYTES)
+        try:
+            with tarfile.open(fileobj=bounded_stream, mode='r|') as archive:
+                for member in archive:
+                    entries += 1
+                    content_bytes += member.size
+                    if entries > BUNDLE_MAX_ENTRIES:
+                        too_large = f"Bundle has more than {BUNDLE_MAX_ENTRIES} entries."
+                        break
+                    if content_bytes > BUNDLE_MAX_BYTES:
+                        too_large = f"Bundle exceeds the maximum allowed size of {BUNDLE_MAX_BYTES // (1024 * 1024)}MB."
+                        break
+                    parts = [secure_filename(part) for part in member.name.replace('\\', '/').split('/')
+                             if part not in ('', '.')]
+                    if not parts or '' in parts:
+                        errors.append({"path": member.name, "error": "Invalid path."})
+                        continue
+                    if not (member.isfile() or member.isdir()):
+                        errors.append({"path": member.name, "error": "Only files and folders can be uploaded."})
+                        continue
+                    rel_path = '/'.join(parts)
+                    try:
+                        abs_path = self._get_safe_path(os.path.join(upload_sub_path, rel_path))
+                    except PermissionError as e:
+                        errors.append({"path": member.name, "error": str(e)})
+                        continue
+                    top_level_path = os.path.join(target_folder, parts[0])
+                    if top_level_path not in changed_paths:
+                        ignored.enter_context(self.watcher.ignoring(top_level_path))
+                        changed_paths[top_level_path] = None
+                    try:
+                        if member.isdir():
+                            os.makedirs(abs_path, exist_ok=True)
+                            directories += 1
+                            continue
+                        os.makedirs(os.path.dirname(abs_path), exist_ok=True)
+                        digest = self._write_upload_file(archive.extractfile(member), abs_path, max_bytes)
+                    except (OSError, ValueError) as e:
+                        errors.append({"path": rel_path, "error": getattr(e, 'strerror', None) or str(e)})
+                        continue
+                    checksums.append((abs_path, self.checksum_algorithm, digest))
+                    files += 1
+        except (tarfile.TarError, EOFError) as e:
+            if not bounded_stream.exceeded:
+                errors.append({"path": None, "error": f"Bundle is not a valid tar stream: {str(e)}"})
+        if bounded_stream.exceeded:  # Also when the cut fell between two members, which tarfile takes for the end
+            too_large = f"Bundle stream exceeds {BUNDLE_MAX_STREAM_BYTES} bytes."
+
+        if checksums:
+            self._record_checksums(checksums)
+        if changed_paths:
+            self.notify_changed(*changed_paths)
+        result = {"files": files, "directories": directories, "errors": errors, "path": upload_sub_path}
+        if too_large:
+            return dict(result, error=too_large, too_large=True)
+        if not files and not directories and errors:
+            return dict(result, error=errors[-1]["error"])
+        return dict(result, success=True, message=f"{files} files uploaded to '{upload_sub_path or '/'}'.")
+
+    def _record_checksums(self, entries):
+        try:
+            self.metadata_index.set_checksums(entries)
+        except Exception as e:
+            print(f"WARNING: Could not record checksums of {len(entries)} uploaded files: {e}")
+
+    def _record_checksum(self, abs_file_path, algorithm, digest):
+        try:
+            self.metadata_index.set_checksum(abs_file_path, algorithm, digest)
+        except Exception as e:
+            print(f"WARNING: Could not record checksum of '{abs_file_path}': {e}")
+
+    def get_checksum(self, file_path):
+        """The digest recorded for a file when it was uploaded, if its content hasn't changed since."""
+        abs_path = self._get_safe_path(file_path)
+        if not os.path.isfile(abs_path):
+            return {"error": "File not found."}
+        rel_path = os.path.relpath(abs_path, self.managed_dir).replace('\\', '/')
+        checksum = self.metadata_index.get_checksum(rel_path)
+        if checksum is None:
+            return {"error": "No checksum recorded for this file."}
+        return dict(checksum, success=True, path=rel_path)
 
     def _setup_cleanup_timer(self):
         """Setup periodic cleanup of abandoned chunked uploads."""
@@ -357,23 +1002,44 @@ class FileManager:
         """Clean up abandoned chunked uploads older than timeout."""
         config = get_config()
         timeout = config.get('upload', {}).get('chunk_timeout', 300)
+        # Resumable uploads wait much longer for their client to come back (flaky links, reloads)
+        resumable_timeout = config.get('upload', {}).get('resumable_timeout_hours', 24) * 3600
         current_time = time.time()
         
         with self.upload_lock:
-            abandoned_uploads = []
-            for upload_id, upload_info in self.chunk_uploads.items():
-                if current_time - upload_info['last_activity'] > timeout:
-                    abandoned_uploads.append(upload_id)
-            
-            for upload_id in abandoned_uploads:
-                self._cleanup_upload_chunks(upload_id)
+            candidates = [(upload_id, upload_info) for upload_id, upload_info in self.chunk_uploads.items()
+                          if current_time - upload_info['last_activity'] >
+                          (resumable_timeout if 'partial_path' in upload_info else timeout)]
+        # Session locks are taken outside self.upload_lock, which must never wait on one
+        abandoned = [(upload_id, upload_info) for upload_id, upload_info in candidates if self._mark_cancelled(upload_info)]
+        abandoned_infos = []
+        with self.upload_lock:
+            for upload_id, upload_info in abandoned:
+                if self.chunk_uploads.get(upload_id) is upload_info:  # Not cancelled by its client meanwhile
+                    abandoned_infos.append(self.chunk_uploads.pop(upload_id))
 
-    def _cleanup_upload_chunks(self, upload_id):
-        """Clean up temporary files for a specific upload."""
-        if upload_id not in self.chunk_uploads:
-            return
-        
-        upload_info = self.chunk_uploads[upload_id]
+            expired_jobs = [job for job in self.upload_jobs.values()
+                            if job['finished'] is not None and current_time - job['finished'] > FINALIZE_JOB_TTL]
+            for job in expired_jobs:
+                del self.upload_jobs[job['id']]
+                self._upload_job_ids.pop(job['upload_id'], None)
+
+        for upload_info in abandoned_infos:
+            self._cleanup_upload_chunks(upload_info)
+
+    def _mark_cancelled(self, upload_info):
+        """
+        Stops an upload from accepting chunks. Returns False if it is already being
+        assembled (its chunks are being read, and it completes on its own).
+        """
+        with upload_info['lock']:
+            if upload_info['assembling']:
+                return False
+            upload_info['cancelled'] = True
+            return True
+
+    def _cleanup_upload_chunks(self, upload_info):
+        """Clean up temporary files of an upload that was removed from self.chunk_uploads."""
         temp_dir = upload_info.get('temp_dir')
         
         if temp_dir and os.path.exists(temp_dir):
@@ -381,83 +1047,935 @@ class FileManager:
                 shutil.rmtree(temp_dir)
             except Exception as e:
                 print(f"Warning: Could not clean up temp directory {temp_dir}: {e}")
-        
-        del self.chunk_uploads[upload_id]
 
-    def upload_chunk(self, chunk_data, upload_id, chunk_index, total_chunks, filename, upload_path=""):
-        """Handle individual chunk uploads for large files."""
+        partial_path = upload_info.get('partial_path')
+        if partial_path and os.path.exists(partial_path):  # Gone already if the upload completed
+            try:
+                os.remove(partial_path)
+            except Exception as e:
+                print(f"Warning: Could not remove partial upload {partial_path}: {e}")
+        if partial_path:
+            self._remove_upload_session_file(upload_info['upload_id'])
+            with upload_info['lock']:
+                self._drop_hash_buffers(upload_info)
+        self._release_space(upload_info['upload_id'])
+
+    # --- Resumable upload state ---
+
+    def _upload_session_file(self, upload_id):
+        return os.path.join(self.upload_sessions_dir, f"{secure_filename(upload_id)}.json")
+
+    def _save_upload_session(self, upload_info):
+        """Persists a resumable upload's state. Called with the session lock held, so saves don't reorder."""
+        state = {
+            "upload_id": upload_info['upload_id'],
+            "filename": upload_info['filename'],
+            "upload_path": upload_info['upload_path'],
+            "total_chunks": upload_info['total_chunks'],
+            "chunk_size": upload_info['chunk_size'],
+            "file_size": upload_info['file_size'],
+            "partial_path": upload_info['partial_path'],
+            "target_path": upload_info['target_path'],
+            "checksum_algorithm": upload_info['checksum_algorithm'],
+            "expected_checksum": upload_info['expected_checksum'],
+            "received": _encode_chunk_bitmap(upload_info['chunks_received'], upload_info['total_chunks']),
+            "last_activity": upload_info['last_activity']
+        }
+        session_file = self._upload_session_file(upload_info['upload_id'])
+        try:
+            os.makedirs(self.upload_sessions_dir, exist_ok=True)
+            with open(session_file + ".tmp", 'w', encoding='utf-8') as f:
+                json.dump(state, f)
+            os.replace(session_file + ".tmp", session_file)  # Never leaves a half-written state behind
+        except Exception as e:
+            print(f"WARNING: Could not save upload session '{upload_info['upload_id']}': {e}")
+
+    def _remove_upload_session_file(self, upload_id):
+        try:
+            os.remove(self._upload_session_file(upload_id))
+        except FileNotFoundError:
+            pass
+        except Exception as e:
+            print(f"WARNING: Could not remove upload session '{upload_id}': {e}")
+
+    def _load_upload_sessions(self):
+        """Restores the resumable uploads saved by a previous run; complete ones are finalized now."""
+        if not os.path.isdir(self.upload_sessions_dir):
+            return
+        restored = 0
+        for entry in os.listdir(self.upload_sessions_dir):
+            if not entry.endswith(".json"):
+                continue
+            try:
+                with open(os.path.join(self.upload_sessions_dir, entry), encoding='utf-8') as f:
+                    state = json.load(f)
+                upload_id = state['upload_id']
+                if not os.path.isfile(state['partial_path']):
+                    # Finished (renamed into place) or removed while the server was down
+                    self._remove_upload_session_file(upload_id)
+                    continue
+                upload_info = {
+                    'upload_id': upload_id,
+                    'filename': state['filename'],
+                    'upload_path': state['upload_path'],
+                    'total_chunks': state['total_chunks'],
+                    'chunk_size': state['chunk_size'],
+                    'file_size': state['file_size'],
+                    'partial_path': state['partial_path'],
+                    'target_path': state['target_path'],
+                    'chunks_received': _decode_chunk_bitmap(state['received'], state['total_chunks']),
+                    'last_activity': time.time(),  # The client gets a full timeout to come back
+                    'lock': threading.Lock(),
+                    'hash_lock': threading.Lock(),
+                    'assembling': False,
+                    'cancelled': False,
+                    'setup_error': None,
+                    'checksum_algorithm': state.get('checksum_algorithm', self.checksum_algorithm),
+                    'expected_checksum': state.get('expected_checksum'),
+                    'chunk_digests': {}  # Not persisted; chunks from before the restart aren't added to the chunk store
+                }
+                # Hasher state can't be saved: the file hash restarts and re-reads the chunks on disk
+                self._reset_upload_hash(upload_info)
+            except Exception as e:
+                print(f"WARNING: Skipping unreadable upload session '{entry}': {e}")
+                continue
+            self.chunk_uploads[upload_id] = upload_info
+            # Admitted before the restart; its file is there already, so no new admission check
+            self._space_reservations[upload_id] = {"size": upload_info['file_size'], "path": upload_info['partial_path']}
+            restored += 1
+            if len(upload_info['chunks_received']) == upload_info['total_chunks']:
+                # Every chunk had arrived when the server stopped; finish what the old job started
+                upload_info['assembling'] = True
+                upload_info['job_id'] = uuid.uuid4().hex
+                self._queue_finalize_job(upload_id, upload_info)
+        if restored:
+            print(f"INFO: Restored {restored} interrupted upload(s) from '{self.upload_sessions_dir}'.")
+
+    def get_upload_status(self, upload_id):
+        """
+        What the server has of a chunked upload, so a client can resume it: the chunks
+        still missing, or the job finalizing it. None if the upload is unknown.
+        """
+        with self.upload_lock:
+            upload_info = self.chunk_uploads.get(upload_id)
+            job_id = self._upload_job_ids.get(upload_id)
+        if upload_info is None:
+            if job_id is None:
+                return None
+            return dict(self._upload_job_response(job_id), upload_id=upload_id)
+        with upload_info['lock']:
+            received = set(upload_info['chunks_received'])
+            assembling = upload_info['assembling']
+        if assembling:
+            return dict(self._upload_job_response(upload_info['job_id']), upload_id=upload_id)
+        return {
+            "success": True,
+            "upload_id": upload_id,
+            "filename": upload_info['filename'],
+            "path": upload_info['upload_path'],
+            "resumable": 'partial_path' in upload_info,
+            "total_chunks": upload_info['total_chunks'],
+            "chunk_size": upload_info.get('chunk_size'),
+            "file_size": upload_info.get('file_size'),
+            "chunks_received": len(received),
+            "missing_chunks": [index for index in range(upload_info['total_chunks']) if index not in received]
+        }
+
+    def _get_or_create_upload_session(self, upload_id, total_chunks, filename, upload_path, chunk_size=None, file_size=None):
+        """
+        Returns the session dict of a chunked upload, registering it on its first chunk. The new
+        session is only added to the registry under self.upload_lock; creating and preallocating
+        its file, admitting it and persisting it happen afterwards under the session's own lock,
+        which requests for the same upload wait on, so other uploads are never held up by it.
+        """
         with self.upload_lock:
-            # Initialize upload info if this is the first chunk
-            if upload_id not in self.chunk_uploads:
+            upload_info = self.chunk_uploads.get(upload_id)
+            if upload_info is None and upload_id in self._upload_job_ids:
+                return {"job_id": self._upload_job_ids[upload_id]}  # A retry of a chunk of a finished upload
+            created = upload_info is None
+            if created:
                 # Check file size limit for chunked uploads
                 config = get_config()
                 upload_config = config.get('upload', {})
                 max_file_size_gb = upload_config.get('max_file_size_gb', 8)
                 chunk_size_mb = upload_config.get('chunk_size_mb', 10)
                 
-                # Estimate total file size from chunk count and chunk size
-                estimated_file_size_bytes = total_chunks * chunk_size_mb * 1024 * 1024
+                # Estimate total file size from chunk count and chunk size, unless the client sent it
+                estimated_file_size_bytes = file_size if file_size is not None else total_chunks * chunk_size_mb * 1024 * 1024
                 max_file_size_bytes = max_file_size_gb * 1024 * 1024 * 1024
                 
                 if estimated_file_size_bytes > max_file_size_bytes:
                     return {"error": f"Estimated file size ({estimated_file_size_bytes / (1024*1024*1024):.2f}GB) exceeds maximum allowed size of {max_file_size_gb}GB."}
+                invalid = self._check_chunk_layout(total_chunks, chunk_size, file_size)
+                if invalid:
+                    return invalid
                 
-                temp_dir = tempfile.mkdtemp(prefix=f"chunk_upload_{upload_id}_")
-                self.chunk_uploads[upload_id] = {
-                    'temp_dir': temp_dir,
+                upload_info = {
+                    'upload_id': upload_id,
                     'filename': filename,
                     'upload_path': upload_path,
                     'total_chunks': total_chunks,
                     'chunks_received': set(),
-                    'last_activity': time.time()
+                    'last_activity': time.time(),
+                    'lock': threading.Lock(),  # Guards this session's fields; never held during chunk I/O
+                    'hash_lock': threading.Lock(),  # Held by the one thread advancing the file hash
+                    'assembling': False,
+                    'cancelled': False,
+                    'setup_error': None,  # Set if the session could not be set up; it is dropped then
+                    'checksum_algorithm': self.checksum_algorithm,
+                    'expected_checksum': None  # Whole-file digest sent by the client, checked when finalizing
                 }
-            
-            upload_info = self.chunk_uploads[upload_id]
+                upload_info['lock'].acquire()  # Released once set up below
+                self.chunk_uploads[upload_id] = upload_info
             upload_info['last_activity'] = time.time()
-            
-            # Save chunk to temporary file
-            chunk_filename = f"chunk_{chunk_index:06d}"
-            chunk_path = os.path.join(upload_info['temp_dir'], chunk_filename)
-            
+
+        if created:
             try:
-                chunk_data.save(chunk_path)
-                upload_info['chunks_received'].add(chunk_index)
+                result = self._set_up_upload_session(upload_info, chunk_size, file_size, estimated_file_size_bytes)
             except Exception as e:
-                return {"error": f"Failed to save chunk {chunk_index}: {str(e)}"}
-            
-            # Check if all chunks have been received
-            if len(upload_info['chunks_received']) == total_chunks:
-                # Assemble the final file
-                result = self._assemble_chunks(upload_id)
-                if result.get('success'):
-                    self._cleanup_upload_chunks(upload_id)
-                    return {
-                        "success": True, 
-                        "completed": True, 
-                        "message": f"File '{filename}' uploaded successfully.",
-                        "filename": filename,
-                        "path": result.get('path')
-                    }
-                else:
-                    self._cleanup_upload_chunks(upload_id)
+                result = {"error": f"Could not start upload: {str(e)}"}
+            if result.get("error"):
+                upload_info['setup_error'] = result
+                upload_info['cancelled'] = True
+            upload_info['lock'].release()
+            if result.get("error"):
+                with self.upload_lock:
+                    if self.chunk_uploads.get(upload_id) is upload_info:
+                        del self.chunk_uploads[upload_id]
+                return result
+            return upload_info
+
+        with upload_info['lock']:  # Waits for a session another request is still setting up
+            if upload_info['setup_error']:
+                return upload_info['setup_error']
+        if 'partial_path' in upload_info and (chunk_size, file_size) != (upload_info['chunk_size'], upload_info['file_size']):
+            return {"error": "Chunk size or file size differs from the upload being resumed."}
+        return upload_info
+
+    @staticmethod
+    def _check_chunk_layout(total_chunks, chunk_size=None, file_size=None):
+        """
+        Error dict if a new upload's chunking is out of bounds: more than MAX_UPLOAD_CHUNKS chunks,
+        or (for direct uploads) a chunk size outside [min_chunk_size_mb, max_chunk_size_mb] or a
+        chunk count that doesn't match the file size. None if it is acceptable.
+        """
+        if chunk_size is not None and file_size is not None:
+            upload_config = get_config().get('upload', {})
+            min_chunk_bytes = int(upload_config.get('min_chunk_size_mb', 1) * 1024 * 1024)
+            max_chunk_bytes = int(upload_config.get('max_chunk_size_mb', 64) * 1024 * 1024)
+            if file_size < 0 or not min_chunk_bytes <= chunk_size <= max_chunk_bytes:
+                return {"error": f"Chunk size must be between {min_chunk_bytes} and {max_chunk_bytes} bytes."}
+            if total_chunks != max(1, -(-file_size // chunk_size)):
+                return {"error": "Chunk count does not match file size and chunk size."}
+        if not 1 <= total_chunks <= MAX_UPLOAD_CHUNKS:
+            return {"error": f"Uploads are limited to {MAX_UPLOAD_CHUNKS} chunks."}
+        return None
+
+    def _set_up_upload_session(self, upload_info, chunk_size, file_size, estimated_file_size_bytes):
+        """Admits a new session and creates its file or chunk directory. Called with the session lock held."""
+        upload_id = upload_info['upload_id']
+        if chunk_size is not None and file_size is not None:
+            result = self._create_partial_upload(upload_info, upload_id, chunk_size, file_size)
+            if result.get("error"):
+                return result
+            self._save_upload_session(upload_info)
+            return result
+        # Clients that don't send chunkSize/fileSize can't be placed by offset
+        admission = self._reserve_space(upload_id, estimated_file_size_bytes)
+        if admission:
+            return admission
+        try:
+            upload_info['temp_dir'] = tempfile.mkdtemp(prefix=f"chunk_upload_{upload_id}_")
+        except Exception:
+            self._release_space(upload_id)
+            raise
+        return {"success": True}
+
+    def _create_partial_upload(self, upload_info, upload_id, chunk_size, file_size):
+        """
+        Sets up an upload whose chunks are written straight into a hidden partial file next
+        to its destination, at chunk_index * chunk_size; completing it is a rename. The chunk
+        layout has been checked by _check_chunk_layout() already.
+        """
+        filename = secure_filename(upload_info['filename'])
+        if not filename:
+            return {"error": "Invalid filename"}
+
+        target_folder = self._get_safe_path(upload_info['upload_path'])
+        if not os.path.isdir(target_folder):
+            try:
+                os.makedirs(target_folder, exist_ok=True)
+            except Exception as e:
+                return {"error": f"Could not create upload directory: {str(e)}"}
+        abs_file_path = os.path.join(target_folder, filename)
+        if not os.path.normpath(abs_file_path).startswith(self.managed_dir):
+            return {"error": "Upload path is outside managed directory"}
+
+        # Same volume as the destination, so completing the upload is a rename, not a copy
+        partial_path = os.path.join(target_folder, f".{filename}.{secure_filename(upload_id)}{PARTIAL_UPLOAD_SUFFIX}")
+        admission = self._reserve_space(upload_id, file_size, partial_path)
+        if admission:
+            return admission
+        try:
+            with open(partial_path, 'wb') as partial_file:
+                partial_file.truncate(file_size)  # Sized up front so chunks can land in any order
+                if file_size and get_config().get('upload', {}).get('preallocate', True):
+                    self._preallocate(partial_file.fileno(), file_size)
+        except Exception as e:
+            self._release_space(upload_id)
+            try:
+                os.remove(partial_path)
+            except OSError:
+                pass
+            if getattr(e, 'errno', None) == errno.ENOSPC:
+                return {"error": "Not enough disk space for the upload.", "insufficient_storage": True}
+            return {"error": f"Could not create upload file: {str(e)}"}
+
+        upload_info.update({
+            'partial_path': partial_path,
+            'target_path': abs_file_path,
+            'chunk_size': chunk_size,
+            'file_size': file_size,
+            'chunk_digests': {}  # chunk index -> verified digest, recorded in the chunk store on completion
+        })
+        self._reset_upload_hash(upload_info)
+        return {"success": True}
+
+    @staticmethod
+    def _preallocate(file_descriptor, size):
+        """
+        Allocates the blocks of an upload file up front, so the upload can't run out of disk
+        space halfway through (and the file is laid out contiguously). Where the file system
+        doesn't support it, the reservation made by _reserve_space() is all there is.
+        """
+        try:
+            os.posix_fallocate(file_descriptor, 0, size)
+        except AttributeError:
+            pass  # Not available on this platform
+        except OSError as e:
+            if e.errno == errno.ENOSPC:
+                raise
+            if e.errno not in (errno.EOPNOTSUPP, errno.EINVAL, errno.ENOSYS):
+                print(f"WARNING: Could not preallocate upload file: {e}")
+
+    def _reset_upload_hash(self, upload_info):
+        """
+        Chunks of a direct upload arrive in any order, so the whole-file hash is advanced over
+        the contiguous run of received chunks (see _advance_upload_hash), from 'hashed_chunks' on.
+        Called with the session lock held, or before the session is shared.
+        """
+        self._drop_hash_buffers(upload_info)
+        upload_info.update({
+            'file_hasher': _new_hasher(upload_info['checksum_algorithm']),
+            'hashed_chunks': 0,
+            'hash_buffers': {},  # chunk index -> (data blocks, size) of received chunks the hash hasn't reached yet
+        })
+
+    def _buffer_chunk_for_hash(self, upload_info, chunk_index, blocks):
+        """
+        Keeps the data of a chunk just received for the file hash, if it is the next one to hash
+        or fits the buffer budget shared by all uploads; otherwise the hash reads it back from the
+        partial file when it gets there. Called with the session lock held.
+        """
+        if blocks is None or chunk_index < upload_info['hashed_chunks'] or chunk_index in upload_info['hash_buffers']:
+            return
+        size = sum(len(block) for block in blocks)
+        with self._hash_buffer_lock:
+            if chunk_index != upload_info['hashed_chunks'] and self._hash_buffered_bytes + size > CHECKSUM_BUFFER_MAX_BYTES:
+                return
+            self._hash_buffered_bytes += size
+        upload_info['hash_buffers'][chunk_index] = (blocks, size)
+
+    def _take_hash_buffer(self, upload_info, chunk_index):
+        """The buffered data blocks of a chunk, or None if it wasn't buffered. Called with the session lock held."""
+        buffered = upload_info['hash_buffers'].pop(chunk_index, None)
+        if buffered is None:
+            return None
+        with self._hash_buffer_lock:
+            self._hash_buffered_bytes -= buffered[1]
+        return buffered[0]
+
+    def _drop_hash_buffers(self, upload_info):
+        """Gives the budget of an upload's buffered chunks back. Called with the session lock held."""
+        buffers = upload_info.get('hash_buffers')
+        if buffers:
+            with self._hash_buffer_lock:
+                self._hash_buffered_bytes -= sum(size for _, size in buffers.values())
+            buffers.clear()
+
+    def _advance_upload_hash(self, upload_info, wait=False):
+        """
+        Feeds the file hasher every received chunk that continues its contiguous prefix. Only one
+        thread advances an upload's hash at a time (the holder of its 'hash_lock'); the session lock
+        is only taken to claim the next chunk and record its progress, never while a chunk is read
+        or hashed. A chunk's data comes from 'hash_buffers' where possible and is only read back
+        from the partial file otherwise (chunks over the buffer budget, restored sessions).
+
+        Without `wait`, returns right away if another thread is advancing the hash (it picks up
+        the chunks received meanwhile); with it, returns once every received chunk is hashed.
+        """
+        while True:
+            if not upload_info['hash_lock'].acquire(blocking=wait):
+                return
+            try:
+                while True:
+                    with upload_info['lock']:
+                        index = upload_info['hashed_chunks']
+                        if upload_info['cancelled'] or index not in upload_info['chunks_received']:
+                            break
+                        blocks = self._take_hash_buffer(upload_info, index)
+                    if blocks is None:
+                        blocks = self._read_upload_chunk(upload_info, index)
+                    for block in blocks:
+                        upload_info['file_hasher'].update(block)
+                    with upload_info['lock']:
+                        upload_info['hashed_chunks'] = index + 1
+            except Exception:
+                with upload_info['lock']:
+                    self._reset_upload_hash(upload_info)  # Hashed again from disk when the upload is finalized
+                raise
+            finally:
+                upload_info['hash_lock'].release()
+            with upload_info['lock']:
+                # A chunk may have arrived after the last check, while its request couldn't get hash_lock
+                if upload_info['cancelled'] or upload_info['hashed_chunks'] not in upload_info['chunks_received']:
+                    return
+
+    def _read_upload_chunk(self, upload_info, chunk_index):
+        """Yields one chunk of a direct upload back from its partial file, in UPLOAD_WRITE_BLOCK_SIZE blocks."""
+        offset = chunk_index * upload_info['chunk_size']
+        remaining = min(upload_info['chunk_size'], upload_info['file_size'] - offset)
+        with open(upload_info['partial_path'], 'rb') as partial_file:
+            partial_file.seek(offset)
+            while remaining > 0:
+                block = partial_file.read(min(UPLOAD_WRITE_BLOCK_SIZE, remaining))
+                if not block:
+                    raise IOError(f"Partial upload file ends before chunk {chunk_index}")
+                remaining -= len(block)
+                yield block
+
+    def _write_chunks_at_offset(self, upload_info, chunk_stream, first_index, chunk_count, chunk_checksums):
+        """
+        Writes a run of `chunk_count` consecutive chunks of a direct upload, read one after the
+        other from `chunk_stream`, into the partial file at first_index * chunk_size. Chunks with
+        an entry in `chunk_checksums` are hashed on the way and checked against it. The result
+        carries them as [(chunk_index, data blocks, digest)] for _add_received_chunks(); blocks
+        are None for chunks larger than CHECKSUM_BUFFER_MAX_BYTES.
+        """
+        if first_index < 0 or first_index + chunk_count > upload_info['total_chunks']:
+            return {"error": f"Invalid chunk index {first_index}"}
+        chunk_size, file_size = upload_info['chunk_size'], upload_info['file_size']
+
+        chunks = []
+        file_descriptor = os.open(upload_info['partial_path'], os.O_WRONLY | getattr(os, 'O_BINARY', 0))
+        try:
+            for chunk_index in range(first_index, first_index + chunk_count):
+                offset = chunk_index * chunk_size
+                expected = min(chunk_size, file_size - offset)
+                expected_digest = chunk_checksums[chunk_index - first_index] if chunk_checksums else None
+                # Only worth a second hash pass when there is a digest to compare with
+                hasher = _new_hasher(upload_info['checksum_algorithm']) if expected_digest else None
+                blocks = [] if expected <= CHECKSUM_BUFFER_MAX_BYTES else None
+                written = 0
+                while written < expected:
+                    block = chunk_stream.read(min(UPLOAD_WRITE_BLOCK_SIZE, expected - written))
+                    if not block:
+                        return {"error": f"Chunk {chunk_index} is incomplete ({written} of {expected} bytes)"}
+                    _write_at(file_descriptor, block, offset + written)
+                    if hasher:
+                        hasher.update(block)
+                    if blocks is not None:
+                        blocks.append(block)
+                    written += len(block)
+                digest = hasher.hexdigest() if hasher else None
+                if expected_digest and not _checksums_match(expected_digest, digest):
+                    # Not recorded as received; the retry overwrites what landed in the partial file
+                    return {"error": f"Chunk {chunk_index} failed checksum verification, send it again.",
+                            "checksum_mismatch": True, "chunk_index": chunk_index}
+                chunks.append((chunk_index, blocks, digest))
+            if chunk_stream.read(1):
+                return {"error": f"Chunk data is larger than expected for {chunk_count} chunk(s) from {first_index}"}
+        finally:
+            os.close(file_descriptor)
+        return {"success": True, "chunks": chunks}
+
+    def upload_chunk(self, chunk_stream, upload_id, chunk_index, total_chunks, filename, upload_path="",
+                     chunk_size=None, file_size=None, chunk_checksum=None, file_checksum=None, chunk_count=1):
+        """
+        Handle individual chunk uploads for large files. `chunk_stream` is read in
+        UPLOAD_WRITE_BLOCK_SIZE blocks: the raw request body, or a multipart part's stream.
+
+        With `chunk_size` and `file_size` (bytes) known, each chunk is written at its offset
+        into a hidden partial file next to the destination, which is renamed into place
+        once every chunk has arrived. Without them, chunks are collected in a temporary
+        directory and concatenated at the end.
+
+        A direct upload's request may carry a run of `chunk_count` consecutive chunks, so
+        clients can size their requests to their link (up to the max_chunk_size_mb setting)
+        while offsets, resume state and checksums stay per chunk.
+
+        self.upload_lock only guards the session registry and each session has its own
+        lock for its bookkeeping; writing the chunk and assembling the file happen outside
+        both, so chunks of the same and of different uploads are written in parallel. When
+        the server is saturated (see get_upload_load()), chunks are turned away with a
+        `backpressure` error before anything is written.
+
+        Every chunk is hashed while it is written. A chunk not matching `chunk_checksum` is not
+        counted (the client sends it again); `file_checksum`, sent with any chunk, is checked
+        against the whole file when it is finalized. Both are hex digests of the upload's
+        checksum algorithm; a run takes one chunk checksum per chunk, comma-separated.
+        """
+        if chunk_count < 1:
+            return {"error": "Invalid chunk count."}
+        chunk_checksums = chunk_checksum.split(',') if chunk_checksum else None
+        if chunk_checksums and len(chunk_checksums) != chunk_count:
+            return {"error": "Expected one checksum per chunk."}
+        if chunk_count > 1 and (chunk_size is None or file_size is None):
+            return {"error": "Sending several chunks per request needs chunkSize and fileSize."}
+        if chunk_size is not None:
+            max_request_bytes = get_config().get('upload', {}).get('max_chunk_size_mb', 64) * 1024 * 1024
+            if chunk_count * chunk_size > max_request_bytes:
+                return {"error": f"Chunk requests are limited to {max_request_bytes} bytes."}
+        upload_info = self._get_or_create_upload_session(upload_id, total_chunks, filename, upload_path,
+                                                         chunk_size, file_size)
+        if upload_info.get("error"):
+            return upload_info
+        if upload_info.get("job_id") or upload_info.get("assembling"):
+            # Every chunk is in already (the client is retrying one whose response it lost)
+            return self._upload_job_response(upload_info["job_id"])
+
+        busy = self._begin_chunk_request()
+        if busy:
+            return busy
+        try:
+            if 'partial_path' in upload_info:
+                result = self._write_chunks_at_offset(upload_info, chunk_stream, chunk_index, chunk_count, chunk_checksums)
+                if result.get("error"):
                     return result
+                received = result["chunks"]
             else:
-                # Return progress info
-                progress = (len(upload_info['chunks_received']) / total_chunks) * 100
-                return {
-                    "success": True, 
-                    "completed": False, 
-                    "progress": progress,
-                    "chunks_received": len(upload_info['chunks_received']),
-                    "total_chunks": total_chunks
-                }
+                # Save chunk to temporary file; the rename makes it visible to assembly only once complete
+                chunk_hasher = _new_hasher(upload_info['checksum_algorithm']) if chunk_checksum else None
+                chunk_path = os.path.join(upload_info['temp_dir'], f"chunk_{chunk_index:06d}")
+                with open(chunk_path + ".part", 'wb') as chunk_file:
+                    while True:
+                        block = chunk_stream.read(UPLOAD_WRITE_BLOCK_SIZE)
+                        if not block:
+                            break
+                        chunk_file.write(block)
+                        if chunk_hasher:
+                            chunk_hasher.update(block)
+                if chunk_checksum and not _checksums_match(chunk_checksum, chunk_hasher.hexdigest()):
+                    os.remove(chunk_path + ".part")
+                    return {"error": f"Chunk {chunk_index} failed checksum verification, send it again.",
+                            "checksum_mismatch": True, "chunk_index": chunk_index}
+                os.replace(chunk_path + ".part", chunk_path)
+                received = [(chunk_index, None, None)]
+        except Exception as e:
+            return {"error": f"Failed to save chunk {chunk_index}: {str(e)}"}
+        finally:
+            self._end_chunk_request()
+
+        result = self._add_received_chunks(upload_id, upload_info, received, file_checksum)
+        if result.get("success"):
+            result["server_busy"] = self.get_upload_load()["busy"]  # Lets clients back off before being turned away
+        return result
+
+    # --- Disk space admission ---
 
-    def _assemble_chunks(self, upload_id):
-        """Assemble all chunks into the final file."""
-        if upload_id not in self.chunk_uploads:
-            return {"error": "Upload information not found"}
+    def _reserve_space(self, key, size, path=None):
+        """
+        Admits an upload of `size` bytes if the volume of managed_dir has room for it next to
+        the uploads admitted before it (keeping upload.min_free_space_mb free), and holds that
+        room for it until _release_space(key): when the upload completes, is cancelled or times
+        out. With `path`, the file being filled, the reservation only counts the part not yet
+        allocated on disk, so preallocated and already written blocks aren't counted twice.
+        Returns None if admitted, otherwise an error dict flagged "insufficient_storage".
+        """
+        min_free_bytes = get_config().get('upload', {}).get('min_free_space_mb', 1024) * 1024 * 1024
+        with self._space_lock:
+            try:
+                volume = os.statvfs(self.managed_dir)
+            except (AttributeError, OSError):
+                volume = None  # No statvfs on this platform: size limits are the only admission check
+            if volume is not None:
+                available = volume.f_bavail * volume.f_frsize - min_free_bytes - self._outstanding_reservations()
+                if size > available:
+                    return {"error": f"Not enough disk space: the upload needs {size} bytes, "
+                                     f"{max(0, available)} bytes are available.", "insufficient_storage": True}
+            self._space_reservations[key] = {"size": size, "path": path}
+        return None
+
+    def _outstanding_reservations(self):
+        """Bytes promised to admitted uploads that the volume doesn't show as used yet. Called with _space_lock."""
+        outstanding = 0
+        for reservation in self._space_reservations.values():
+            allocated = 0
+            if reservation["path"]:
+                try:
+                    allocated = os.stat(reservation["path"]).st_blocks * 512
+                except (AttributeError, OSError):
+                    pass
+            outstanding += max(0, reservation["size"] - allocated)
+        return outstanding
+
+    def _release_space(self, key):
+        with self._space_lock:
+            self._space_reservations.pop(key, None)
+
+    def get_upload_load(self):
+        """
+        How busy the server is with uploads, advertised to clients: chunk requests being written
+        against the max_active_chunk_requests setting, and the 1-minute load average per CPU
+        against backpressure_cpu_load (on Linux it counts tasks waiting on the disk as well, so
+        it rises with a saturated disk too). `busy` >= 1 means new chunk requests are turned away.
+        """
+        upload_config = get_config().get('upload', {})
+        max_active = upload_config.get('max_active_chunk_requests', 32)
+        cpu_limit = upload_config.get('backpressure_cpu_load', 2.0)
+        with self.upload_lock:
+            active = self._active_chunk_requests
+        cpu_load = _cpu_load()
+        busy = active / max_active
+        if cpu_load is not None:
+            busy = max(busy, cpu_load / cpu_limit)
+        return {
+            "active_chunk_requests": active,
+            "max_active_chunk_requests": max_active,
+            "finalize_queue": self._finalize_queue.qsize(),
+            "cpu_load": round(cpu_load, 2) if cpu_load is not None else None,
+            "busy": round(busy, 2)
+        }
+
+    def _begin_chunk_request(self):
+        """Admits a chunk request (None) or turns it away with a backpressure error when saturated."""
+        upload_config = get_config().get('upload', {})
+        max_active = upload_config.get('max_active_chunk_requests', 32)
+        cpu_load = _cpu_load()
+        cpu_saturated = cpu_load is not None and cpu_load >= upload_config.get('backpressure_cpu_load', 2.0)
+        with self.upload_lock:
+            # One request always gets through, so uploads still progress on a host busy with other work
+            if self._active_chunk_requests >= max_active or (cpu_saturated and self._active_chunk_requests > 0):
+                return {"error": "Server is busy, retry shortly.", "backpressure": True,
+                        "retry_after": BACKPRESSURE_RETRY_AFTER}
+            self._active_chunk_requests += 1
+        return None
+
+    def _end_chunk_request(self):
+        with self.upload_lock:
+            self._active_chunk_requests -= 1
+
+    def _add_received_chunks(self, upload_id, upload_info, chunks, file_checksum=None):
+        """
+        Records chunks whose data is in place, [(chunk_index, data blocks or None, verified digest
+        or None)], and hands the upload to a finalize worker once the set is complete.
+        """
+        total_chunks = upload_info['total_chunks']
+        with upload_info['lock']:
+            if upload_info['cancelled']:
+                return {"error": "Upload was cancelled or timed out."}
+            if file_checksum and not upload_info['expected_checksum']:
+                upload_info['expected_checksum'] = file_checksum.strip().lower()
+            for chunk_index, blocks, digest in chunks:
+                upload_info['chunks_received'].add(chunk_index)
+                if 'partial_path' not in upload_info:
+                    continue
+                if digest:
+                    upload_info['chunk_digests'][chunk_index] = digest
+                self._buffer_chunk_for_hash(upload_info, chunk_index, blocks)
+            chunks_received = len(upload_info['chunks_received'])
+            if 'partial_path' in upload_info:
+                self._save_upload_session(upload_info)
+            # Exactly one request (the one completing the set) assembles the file
+            assemble = chunks_received == total_chunks and not upload_info['assembling']
+            if assemble:
+                upload_info['assembling'] = True
+                upload_info['job_id'] = uuid.uuid4().hex
+
+        if 'partial_path' in upload_info:
+            try:
+                self._advance_upload_hash(upload_info)
+            except Exception as e:
+                print(f"WARNING: Could not hash upload '{upload_id}' incrementally: {e}")
         
-        upload_info = self.chunk_uploads[upload_id]
+        # Check if all chunks have been received
+        if assemble:
+            # Finalizing can take minutes for large files; hand it to a worker and answer right away
+            self._queue_finalize_job(upload_id, upload_info)
+            return dict(self._upload_job_response(upload_info['job_id']), queued=True)
+        else:
+            # Return progress info
+            progress = (chunks_received / total_chunks) * 100
+            return {
+                "success": True, 
+                "completed": False, 
+                "progress": progress,
+                "chunks_received": chunks_received,
+                "total_chunks": total_chunks
+            }
+
+    def dedup_upload(self, upload_id, total_chunks, filename, upload_path, chunk_size, file_size, chunk_checksums,
+                     file_checksum=None):
+        """
+        Starts (or resumes) a direct chunked upload from the digests of all its chunks. Chunks
+        whose content the chunk store (MetadataIndex.find_chunk) or this upload already holds
+        are copied into the partial file instead of being sent; the answer lists the chunks the
+        client still has to upload, like get_upload_status(), or the finalize job if none.
+        The copying is admitted like a chunk request (a `backpressure` error when saturated),
+        and copied chunks are recorded in batches of DEDUP_RECORD_BATCH.
+        """
+        if not self.dedup_enabled:
+            return {"error": "Upload deduplication is disabled."}
+        if len(chunk_checksums) != total_chunks:
+            return {"error": "Expected one checksum per chunk."}
+        upload_info = self._get_or_create_upload_session(upload_id, total_chunks, filename, upload_path,
+                                                         chunk_size, file_size)
+        if upload_info.get("error"):
+            return upload_info
+        if upload_info.get("job_id") or upload_info.get("assembling"):
+            return self._upload_job_response(upload_info["job_id"])
+
+        algorithm = upload_info['checksum_algorithm']
+        with upload_info['lock']:
+            received = set(upload_info['chunks_received'])
+            # Repeated content inside the file itself (e.g. zeroed regions of disk images)
+            own_chunks = {digest: chunk_index for chunk_index, digest in upload_info['chunk_digests'].items()}
+        # Copying chunks is disk work like writing them, so it takes a slot under the same backpressure
+        busy = self._begin_chunk_request()
+        if busy:
+            return busy
+        deduplicated = 0
+        result = None
+        pending, pending_bytes = [], 0  # Copied chunks not recorded yet, and their data kept for the file hash
+        try:
+            target_fd = os.open(upload_info['partial_path'], os.O_WRONLY | getattr(os, 'O_BINARY', 0))
+            try:
+                for chunk_index, digest in enumerate(chunk_checksums):
+                    if chunk_index in received or not digest:
+                        continue
+                    digest = digest.strip().lower()
+                    offset = chunk_index * chunk_size
+                    length = min(chunk_size, file_size - offset)
+                    source = None
+                    if digest in own_chunks and min(chunk_size, file_size - own_chunks[digest] * chunk_size) == length:
+                        source = (upload_info['partial_path'], own_chunks[digest] * chunk_size)
+                    if source is None:
+                        source = self.metadata_index.find_chunk(algorithm, digest, length)
+                    if source is None:
+                        continue
+                    try:
+                        blocks = self._copy_verified_chunk(source, target_fd, offset, length, algorithm, digest)
+                    except Exception as e:
+                        print(f"WARNING: Could not copy chunk {chunk_index} of upload '{upload_id}' from '{source[0]}': {e}")
+                        continue
+                    if blocks is None:
+                        continue  # Content changed without its size or mtime changing; the client sends it
+                    own_chunks.setdefault(digest, chunk_index)
+                    deduplicated += 1
+                    # Data is only kept for the hash up to the buffer budget; the rest is read back later
+                    if pending_bytes + length > CHECKSUM_BUFFER_MAX_BYTES:
+                        blocks = None
+                    else:
+                        pending_bytes += length
+                    pending.append((chunk_index, blocks, digest))
+                    if len(pending) >= DEDUP_RECORD_BATCH or pending_bytes >= CHECKSUM_BUFFER_MAX_BYTES:
+                        result = self._add_received_chunks(upload_id, upload_info, pending, file_checksum)
+                        pending, pending_bytes = [], 0
+                        if result.get("error"):
+                            return result
+            finally:
+                os.close(target_fd)
+        finally:
+            self._end_chunk_request()
+        if pending:
+            result = self._add_received_chunks(upload_id, upload_info, pending, file_checksum)
+            if result.get("error"):
+                return result
+
+        if result and result.get("queued"):
+            return dict(result, deduplicated=deduplicated)
+        if file_checksum:
+            with upload_info['lock']:
+                if not upload_info['expected_checksum']:
+                    upload_info['expected_checksum'] = file_checksum.strip().lower()
+        status = self.get_upload_status(upload_id) or {"error": "Upload not found."}
+        return dict(status, deduplicated=deduplicated)
+
+    def _copy_verified_chunk(self, source, target_fd, target_offset, length, algorithm, digest):
+        """
+        Copies `length` bytes at `source` ((abs_path, offset)) into the target file after checking
+        they still hash to `digest`. Returns the data blocks read for that, or None if they don't match.
+        """
+        source_path, source_offset = source
+        with open(source_path, 'rb') as source_file:
+            source_file.seek(source_offset)
+            hasher = _new_hasher(algorithm)
+            blocks = []
+            remaining = length
+            while remaining > 0:
+                block = source_file.read(min(UPLOAD_WRITE_BLOCK_SIZE, remaining))
+                if not block:
+                    return None
+                hasher.update(block)
+                blocks.append(block)
+                remaining -= len(block)
+            if hasher.hexdigest() != digest:
+                return None
+            _copy_range(source_file.fileno(), target_fd, source_offset, target_offset, length, blocks)
+        return blocks
+
+    def _record_chunk_refs(self, upload_info, abs_file_path):
+        """Adds the verified chunks of a completed direct upload to the chunk store, for later deduplication."""
+        if not self.dedup_enabled or not upload_info['chunk_digests']:
+            return
+        chunk_size, file_size = upload_info['chunk_size'], upload_info['file_size']
+        chunks = [(digest, chunk_index * chunk_size, min(chunk_size, file_size - chunk_index * chunk_size))
+                  for chunk_index, digest in sorted(upload_info['chunk_digests'].items())]
+        try:
+            self.metadata_index.add_chunk_refs(abs_file_path, upload_info['checksum_algorithm'], chunks)
+        except Exception as e:
+            print(f"WARNING: Could not add chunks of '{abs_file_path}' to the chunk store: {e}")
+
+    def _queue_finalize_job(self, upload_id, upload_info):
+        job = {
+            "id": upload_info['job_id'],
+            "upload_id": upload_id,
+            "filename": upload_info['filename'],
+            "path": None,  # Set once the file is in place
+            "status": "queued",  # queued -> running -> done | error
+            "stage": None,
+            "progress": 0,
+            "error": None,
+            "checksum": None,  # Digest of the finished file
+            "created": time.time(),
+            "finished": None
+        }
+        with self.upload_lock:
+            self.upload_jobs[job['id']] = job
+            self._upload_job_ids[upload_id] = job['id']
+        self._finalize_queue.put((job, upload_info))
+        self._publish_upload_job(job)
+
+    def _run_finalize_worker(self):
+        while True:
+            job, upload_info = self._finalize_queue.get()
+            try:
+                self._finalize_upload(job, upload_info)
+            except Exception as e:
+                print(f"ERROR: Finalizing upload '{job['filename']}' failed: {e}")
+                self._update_upload_job(job, status="error", error=str(e), finished=time.time())
+
+    def _finalize_upload(self, job, upload_info):
+        """Assembles or moves the uploaded file into place, then updates the listing cache and index."""
+        self._update_upload_job(job, status="running", stage="moving" if 'partial_path' in upload_info else "assembling")
+        last_reported = [0]
+
+        def report_progress(fraction):
+            progress = int(fraction * 100)
+            if progress - last_reported[0] >= FINALIZE_PROGRESS_STEP:
+                last_reported[0] = progress
+                self._update_upload_job(job, progress=progress)
+
+        try:
+            if 'partial_path' in upload_info:
+                result = self._complete_partial_upload(upload_info)
+            else:
+                result = self._assemble_chunks(upload_info, progress_callback=report_progress)
+        finally:
+            # Also when finalizing raised: an assembling session is skipped by cancel and the
+            # abandoned-upload sweep, so its files and disk space would otherwise never be freed
+            with self.upload_lock:
+                if self.chunk_uploads.get(job['upload_id']) is upload_info:
+                    del self.chunk_uploads[job['upload_id']]
+            self._cleanup_upload_chunks(upload_info)
+
+        if result.get('success'):
+            self._update_upload_job(job, status="done", stage=None, progress=100, path=result.get('path'),
+                                    filename=result.get('filename'), checksum=result.get('checksum'),
+                                    finished=time.time())
+        else:
+            self._update_upload_job(job, status="error", stage=None, error=result.get('error'), finished=time.time())
+
+    def _update_upload_job(self, job, **changes):
+        with self.upload_lock:
+            job.update(changes)
+        self._publish_upload_job(job)
+
+    def _publish_upload_job(self, job):
+        with self.upload_lock:
+            snapshot = dict(job)
+        for listener in self._upload_job_listeners:
+            try:
+                listener(snapshot)
+            except Exception as e:
+                print(f"ERROR: Upload job listener failed: {e}")
+
+    def add_upload_job_listener(self, listener):
+        """Registers listener(job), called from the finalize workers whenever an upload job changes."""
+        self._upload_job_listeners.append(listener)
+
+    def get_upload_job(self, job_id):
+        """A copy of an upload finalization job, or None if unknown (or finished over FINALIZE_JOB_TTL ago)."""
+        with self.upload_lock:
+            job = self.upload_jobs.get(job_id)
+            return dict(job) if job is not None else None
+
+    def _upload_job_response(self, job_id):
+        """upload_chunk() result for an upload whose chunks have all arrived."""
+        job = self.get_upload_job(job_id) or {"status": "queued"}  # Not registered yet: just handed off
+        if job['status'] == "error":
+            return {"error": job['error'], "job_id": job_id}
+        if job['status'] == "done":
+            return {
+                "success": True,
+                "completed": True,
+                "message": f"File '{job['filename']}' uploaded successfully.",
+                "filename": job['filename'],
+                "path": job['path'],
+                "checksum": job['checksum'],
+                "job_id": job_id
+            }
+        return {
+            "success": True,
+            "completed": False,
+            "finalizing": True,
+            "progress": 100,  # Of the transfer; the job reports its own progress
+            "message": "All chunks received, finalizing.",
+            "job_id": job_id
+        }
+
+    def _complete_partial_upload(self, upload_info):
+        """Verifies a fully written partial file against the client's checksum and moves it into place; no data is copied."""
+        abs_file_path = upload_info['target_path']
+        try:
+            self._advance_upload_hash(upload_info, wait=True)  # Reads only chunks that weren't buffered
+            with upload_info['hash_lock']:
+                digest = upload_info['file_hasher'].hexdigest()
+            expected = upload_info['expected_checksum']
+            if expected and not _checksums_match(expected, digest):
+                return {"error": f"Checksum mismatch: expected {expected}, uploaded file has {digest}.", "checksum_mismatch": True}
+            with self.watcher.ignoring(abs_file_path):
+                os.replace(upload_info['partial_path'], abs_file_path)
+        except Exception as e:
+            return {"error": f"Failed to complete upload: {str(e)}"}
+        self._record_checksum(abs_file_path, upload_info['checksum_algorithm'], digest)
+        self._record_chunk_refs(upload_info, abs_file_path)
+        self.notify_changed(abs_file_path)
+        filename = os.path.basename(abs_file_path)
+        return {
+            "success": True,
+            "message": f"File '{filename}' uploaded successfully.",
+            "filename": filename,
+            "path": os.path.join(upload_info['upload_path'], filename).replace('\\', '/'),
+            "checksum": digest
+        }
+
+    def _assemble_chunks(self, upload_info, progress_callback=None):
+        """
+        Assemble all chunks into the final file, hashing them on the way. The result goes to a
+        partial file first and only replaces the destination if it matches the client's checksum.
+        progress_callback(fraction done) is called after each chunk.
+        """
         temp_dir = upload_info['temp_dir']
         filename = secure_filename(upload_info['filename'])
         upload_path = upload_info['upload_path']
@@ -480,9 +1998,11 @@ class FileManager:
         if not os.path.normpath(abs_file_path).startswith(self.managed_dir):
             return {"error": "Upload path is outside managed directory"}
         
+        partial_path = os.path.join(target_folder, f".{filename}.{secure_filename(upload_info['upload_id'])}{PARTIAL_UPLOAD_SUFFIX}")
+        hasher = _new_hasher(upload_info['checksum_algorithm'])
         try:
             # Assemble chunks in order
-            with open(abs_file_path, 'wb') as output_file:
+            with open(partial_path, 'wb') as output_file:
                 for chunk_index in range(total_chunks):
                     chunk_filename = f"chunk_{chunk_index:06d}"
                     chunk_path = os.path.join(temp_dir, chunk_filename)
@@ -491,26 +2011,54 @@ class FileManager:
                         return {"error": f"Missing chunk {chunk_index}"}
                     
                     with open(chunk_path, 'rb') as chunk_file:
-                        shutil.copyfileobj(chunk_file, output_file)
-            
+                        while True:
+                            block = chunk_file.read(UPLOAD_WRITE_BLOCK_SIZE)
+                            if not block:
+                                break
+                            output_file.write(block)
+                            hasher.update(block)
+                    if progress_callback:
+                        progress_callback((chunk_index + 1) / total_chunks)
+
+            digest = hasher.hexdigest()
+            expected = upload_info['expected_checksum']
+            if expected and not _checksums_match(expected, digest):
+                return {"error": f"Checksum mismatch: expected {expected}, uploaded file has {digest}.", "checksum_mismatch": True}
+            with self.watcher.ignoring(abs_file_path):
+                os.replace(partial_path, abs_file_path)
+            self._record_checksum(abs_file_path, upload_info['checksum_algorithm'], digest)
+            self.notify_changed(abs_file_path)
             final_path = os.path.join(upload_path, filename).replace('\\', '/')
             return {
                 "success": True, 
                 "message": f"File '{filename}' assembled successfully.",
                 "filename": filename,
-                "path": final_path
+                "path": final_path,
+                "checksum": digest
             }
         except Exception as e:
             return {"error": f"Failed to assemble file: {str(e)}"}
+        finally:
+            if os.path.exists(partial_path):  # Left over when assembly failed or the checksum didn't match
+                try:
+                    os.remove(partial_path)
+                except OSError as e:
+                    print(f"Warning: Could not remove partial upload {partial_path}: {e}")
 
     def cancel_chunked_upload(self, upload_id):
         """Cancel a chunked upload and clean up temporary files."""
         with self.upload_lock:
-            if upload_id in self.chunk_uploads:
-                self._cleanup_upload_chunks(upload_id)
-                return {"success": True, "message": "Upload cancelled and cleaned up"}
-            else:
-                return {"success": True, "message": "Upload not found or already completed"}
+            upload_info = self.chunk_uploads.get(upload_id)
+        if upload_info is None:
+            return {"success": True, "message": "Upload not found or already completed"}
+        if not self._mark_cancelled(upload_info):
+            return {"success": True, "message": "Upload is already being finalized"}
+        with self.upload_lock:
+            if self.chunk_uploads.get(upload_id) is not upload_info:
+                return {"success": True, "message": "Upload not found or already completed"}  # Timed out meanwhile
+            del self.chunk_uploads[upload_id]
+        self._cleanup_upload_chunks(upload_info)
+        return {"success": True, "message": "Upload cancelled and cleaned up"}
 
     def zip_items(self, items_to_zip, archive_name, output_sub_path=""):
         """
@@ -536,7 +2084,7 @@ class FileManager:
             return {"error": "Archive path is outside managed directory."}
 
         try:
-            with zipfile.ZipFile(abs_archive_path, 'w', zipfile.ZIP_DEFLATED) as zf:
+            with self.watcher.ignoring(abs_archive_path), zipfile.ZipFile(abs_archive_path, 'w', zipfile.ZIP_DEFLATED) as zf:
                 for item_rel_path in items_to_zip:
                     abs_item_path = self._get_safe_path(item_rel_path)
                     if not os.path.exists(abs_item_path):
@@ -554,6 +2102,7 @@ class FileManager:
                                 # arcname should be relative to the item_rel_path base
                                 arcname = os.path.join(os.path.basename(item_rel_path), os.path.relpath(file_abs_path, abs_item_path))
                                 zf.write(file_abs_path, arcname=arcname)
+            self.notify_changed(abs_archive_path)
             return {"success": True, "message": f"Archive '{archive_name}' created.", "archive_path": os.path.join(output_sub_path, archive_name).replace('\\','/')}
         except PermissionError as e:
             raise e
@@ -573,9 +2122,11 @@ class FileManager:
         else:
             abs_extract_path = os.path.dirname(abs_zip_file_path) 
 
-        if not os.path.isdir(abs_extract_path):
+        extract_dir_created = not os.path.isdir(abs_extract_path)
+        if extract_dir_created:
             try:
-                os.makedirs(abs_extract_path, exist_ok=True)
+                with self.watcher.ignoring(abs_extract_path):
+                    os.makedirs(abs_extract_path, exist_ok=True)
             except Exception as e:
                  return {"error": f"Could not create extraction directory: {str(e)}"}
         
@@ -591,7 +2142,14 @@ class FileManager:
                     if member_path.startswith("..") or os.path.isabs(member_path):
                         return {"error": f"Zip file contains potentially unsafe path: {member}"}
                 
-                zf.extractall(abs_extract_path)
+                # Only the archive's top-level entries change, not the whole extraction directory
+                top_level_names = {os.path.normpath(member).split(os.sep)[0] for member in zf.namelist()}
+                changed_paths = [os.path.join(abs_extract_path, name) for name in top_level_names]
+                if extract_dir_created:
+                    changed_paths.append(abs_extract_path)
+                with self.watcher.ignoring(*changed_paths):
+                    zf.extractall(abs_extract_path)
+            self.notify_changed(*changed_paths)
             return {"success": True, "message": f"File '{os.path.basename(zip_file_path)}' unzipped to '{os.path.relpath(abs_extract_path, self.managed_dir)}'."}
         except zipfile.BadZipFile:
             return {"error": "Bad zip file."}
@@ -635,7 +2193,9 @@ class FileManager:
             return {"error": f"An item named '{new_name_safe}' already exists in this location."}
 
         try:
-            os.rename(abs_current_path, abs_new_path)
+            with self.watcher.ignoring(abs_current_path, abs_new_path):
+                os.rename(abs_current_path, abs_new_path)
+            self.notify_changed(abs_current_path, abs_new_path)
             new_relative_path = os.path.join(os.path.dirname(current_relative_path), new_name_safe).replace('\\', '/')
             return {"success": True, "message": f"Item renamed to '{new_name_safe}'.", "new_path": new_relative_path, "new_name": new_name_safe}
         except OSError as e:
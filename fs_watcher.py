@@ -0,0 +1,249 @@
+import os
+import time
+import threading
+from contextlib import contextmanager
+
+try:
+    from watchdog.observers import Observer
+    from watchdog.events import FileSystemEventHandler
+    WATCHDOG_AVAILABLE = True
+except ImportError:
+    Observer = None
+    FileSystemEventHandler = object
+    WATCHDOG_AVAILABLE = False
+
+DEBOUNCE_SECONDS = 0.5           # Flush once no new event arrived for this long...
+MAX_BATCH_DELAY = 2.0            # ...or once the oldest pending event is this old (steady streams like rsync)
+MAX_PENDING_DIRS = 2000          # Directories tracked per batch before collapsing to a full rescan
+MAX_PENDING_NAMES_PER_DIR = 200  # Changed names tracked per directory before treating the whole directory as changed
+MAX_DIRS_PER_FLUSH = 500         # Directory events emitted per flush; the rest are reported as a full rescan
+SELF_CHANGE_TTL = 3.0            # Seconds events under a path changed by the app itself are ignored
+
+HANDLED_EVENT_TYPES = {"created", "deleted", "moved", "modified", "closed"}
+
+
+class _EventCollector(FileSystemEventHandler):
+    """Feeds watchdog events into the watcher. Runs on the observer thread, so it does as little as possible."""
+
+    def __init__(self, watcher):
+        super().__init__()
+        self.watcher = watcher
+
+    def on_any_event(self, event):
+        if event.event_type not in HANDLED_EVENT_TYPES:
+            return  # opened / closed_no_write are reads, not changes
+        if event.is_directory and event.event_type in ("modified", "closed"):
+            return  # A directory's own "modified" event only repeats what its children's events say
+        self.watcher._record(os.fsdecode(event.src_path))
+        if event.event_type == "moved":
+            self.watcher._record(os.fsdecode(event.dest_path))
+
+
+class FileSystemWatcher:
+    """
+    Watches the managed directory (inotify on Linux, through watchdog) for changes
+    made outside the app and reports them in debounced, per-directory batches.
+
+    Events are only recorded into a bounded {directory: changed names} map; a flusher
+    thread waits until the stream goes quiet (or MAX_BATCH_DELAY passes) and then
+    calls the batch listeners once with one entry per changed directory. A directory
+    with too many changes is reported as changed as a whole, and too many directories
+    collapse into a single full rescan, so memory and per-flush work stay bounded no
+    matter how large the burst is. Changes the app makes itself are dropped: under
+    paths held by ignoring() while the operation runs, and under paths passed to
+    ignore() (or released by ignoring()) for SELF_CHANGE_TTL seconds.
+    """
+
+    def __init__(self, root_dir, exclude_name=None):
+        self.root_dir = os.path.abspath(root_dir)
+        self.exclude_name = exclude_name  # Optional predicate: events for names it accepts are dropped
+        self._listeners = []
+        self._lock = threading.Lock()
+        self._wakeup = threading.Event()
+        self._pending = {}  # abs directory -> set of changed names, or None if the whole directory changed
+        self._overflow = False
+        self._first_event_at = None
+        self._last_event_at = None
+        self._ignored = {}  # abs path -> monotonic expiry
+        self._ignoring = {}  # abs path -> number of app operations in progress under it
+        self._observer = None
+        self._flusher = None
+        self._running = False
+        self._stats = {"events": 0, "ignored": 0, "flushes": 0, "overflows": 0}
+
+    def add_batch_listener(self, listener):
+        """
+        Registers listener(changes), called from the flusher thread once per batch.
+        `changes` is a list of {"directory": abs path, "paths": [abs paths] or None} (None
+        means the whole directory changed); a single entry for the root directory with
+        paths None means "everything may have changed, rescan".
+        """
+        self._listeners.append(listener)
+
+    def start(self):
+        """Starts watching in the background. Returns False if watchdog is not installed."""
+        if not WATCHDOG_AVAILABLE:
+            print("WARNING: watchdog library not installed. External file changes will not be detected.")
+            print("Install with: pip install watchdog")
+            return False
+        if self._running:
+            return True
+        self._running = True
+        self._flusher = threading.Thread(target=self._run_flusher, name="fs-watcher-flush", daemon=True)
+        self._flusher.start()
+        # Adding the recursive inotify watches walks the whole tree, so don't do it on the caller's thread
+        threading.Thread(target=self._start_observer, name="fs-watcher-start", daemon=True).start()
+        return True
+
+    def _start_observer(self):
+        started = time.time()
+        try:
+            observer = Observer()
+            observer.schedule(_EventCollector(self), self.root_dir, recursive=True)
+            observer.daemon = True
+            observer.start()
+        except OSError as e:
+            # Typically ENOSPC: fs.inotify.max_user_watches is lower than the number of directories
+            print(f"ERROR: Could not watch '{self.root_dir}' for external changes: {e}")
+            return
+        if not self._running:
+            observer.stop()
+            return
+        self._observer = observer
+        print(f"INFO: Watching '{self.root_dir}' for external changes (set up in {time.time() - started:.1f}s).")
+
+    def stop(self):
+        self._running = False
+        self._wakeup.set()
+        observer = self._observer
+        self._observer = None
+        if observer is not None:
+            observer.stop()
+            observer.join(timeout=5)
+
+    def ignore(self, *abs_paths):
+        """Drops events for these paths (and anything below them) for the next SELF_CHANGE_TTL seconds."""
+        expiry = time.monotonic() + SELF_CHANGE_TTL
+        with self._lock:
+            for abs_path in abs_paths:
+                if abs_path:
+                    self._ignored[os.path.normpath(abs_path)] = expiry
+
+    @contextmanager
+    def ignoring(self, *abs_paths):
+        """
+        Drops events for these paths (and anything below them) while the block runs and for
+        SELF_CHANGE_TTL seconds after it. Wraps the app's own changes from before the file
+        system is touched, so a long operation's events aren't flushed as external halfway.
+        """
+        paths = [os.path.normpath(abs_path) for abs_path in abs_paths if abs_path]
+        with self._lock:
+            for path in paths:
+                self._ignoring[path] = self._ignoring.get(path, 0) + 1
+        try:
+            yield
+        finally:
+            expiry = time.monotonic() + SELF_CHANGE_TTL  # Events can be delivered after the operation returns
+            with self._lock:
+                for path in paths:
+                    if self._ignoring[path] == 1:
+                        del self._ignoring[path]
+                    else:
+                        self._ignoring[path] -= 1
+                    self._ignored[path] = max(self._ignored.get(path, 0), expiry)
+
+    def get_stats(self):
+        with self._lock:
+            return dict(self._stats, pending_dirs=len(self._pending), watching=self._observer is not None)
+
+    def _record(self, abs_path):
+        directory, name = os.path.split(abs_path)
+        if self.exclude_name and self.exclude_name(name):
+            return
+        now = time.monotonic()
+        with self._lock:
+            self._stats["events"] += 1
+            if self._first_event_at is None:
+                self._first_event_at = now
+            self._last_event_at = now
+            if self._overflow:
+                return
+            names = self._pending.get(directory, ())
+            if names is None:
+                return
+            if not names:
+                if len(self._pending) >= MAX_PENDING_DIRS:
+                    self._overflow = True
+                    self._pending.clear()
+                    self._stats["overflows"] += 1
+                    return
+                names = self._pending[directory] = set()
+            names.add(name)
+            if len(names) > MAX_PENDING_NAMES_PER_DIR:
+                self._pending[directory] = None
+        self._wakeup.set()
+
+    def _is_ignored(self, abs_path, now):
+        """True if abs_path or one of its ancestors (below the root) is being or was recently changed by the app."""
+        path = abs_path
+        while len(path) >= len(self.root_dir):
+            if path in self._ignoring:
+                return True
+            expiry = self._ignored.get(path)
+            if expiry is not None and expiry > now:
+                return True
+            parent = os.path.dirname(path)
+            if parent == path:
+                break
+            path = parent
+        return False
+
+    def _run_flusher(self):
+        while self._running:
+            self._wakeup.wait()
+            self._wakeup.clear()
+            while self._running:
+                with self._lock:
+                    if self._last_event_at is None:
+                        break
+                    now = time.monotonic()
+                    quiet_for = now - self._last_event_at
+                    waited = now - self._first_event_at
+                if quiet_for >= DEBOUNCE_SECONDS or waited >= MAX_BATCH_DELAY:
+                    self._flush()
+                    break
+                time.sleep(min(DEBOUNCE_SECONDS - quiet_for, MAX_BATCH_DELAY - waited))
+
+    def _flush(self):
+        now = time.monotonic()
+        with self._lock:
+            pending, overflow = self._pending, self._overflow
+            self._pending, self._overflow = {}, False
+            self._first_event_at = self._last_event_at = None
+            self._ignored = {path: expiry for path, expiry in self._ignored.items() if expiry > now}
+
+            changes = []
+            if not overflow:
+                for directory, names in pending.items():
+                    if names is None:
+                        if not self._is_ignored(directory, now):
+                            changes.append({"directory": directory, "paths": None})
+                        continue
+                    paths = [os.path.join(directory, name) for name in names]
+                    kept = [path for path in paths if not self._is_ignored(path, now)]
+                    self._stats["ignored"] += len(paths) - len(kept)
+                    if kept:
+                        changes.append({"directory": directory, "paths": sorted(kept)})
+                if len(changes) > MAX_DIRS_PER_FLUSH:
+                    overflow = True
+            if overflow:
+                changes = [{"directory": self.root_dir, "paths": None}]
+            if not changes:
+                return
+            self._stats["flushes"] += 1
+
+        for listener in self._listeners:
+            try:
+                listener(changes)
+            except Exception as e:
+                print(f"ERROR: File watcher listener failed: {e}")
@@ -0,0 +1,744 @@
+import os
+import time
+import queue
+import atexit
+import sqlite3
+import threading
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+
+INDEX_DB_FILE = "file_index.db"        # SQLite metadata index of the managed directory
+CRAWL_WORKERS = min(8, (os.cpu_count() or 1) * 2)  # Threads reading directories during a crawl
+CRAWL_BATCH_SIZE = 5000                # Rows written per transaction while crawling
+REFRESH_QUEUE_MAX_SIZE = 10000         # Pending refresh requests before the index falls back to a full crawl
+SEARCH_DEFAULT_LIMIT = 100
+SEARCH_MAX_LIMIT = 1000
+SQLITE_MAX_INTEGER = 2 ** 63 - 1       # Largest integer SQLite takes as a query parameter (larger ones raise OverflowError)
+SEARCH_PROBE_LIMIT = 5000              # Filters matching fewer rows than this drive the search through their index
+USAGE_CHILDREN_LIMIT = 100             # Largest children returned by get_usage()
+
+GLOB_CHARACTERS = set("*?[")
+
+
+def _ancestors(rel_path):
+    """Yields the directories above rel_path, nearest first, ending with '' (the root)."""
+    while rel_path:
+        rel_path = rel_path.rpartition('/')[0]
+        yield rel_path
+
+
+def _extension_of(name, is_directory):
+    if is_directory:
+        return ""
+    return os.path.splitext(name)[1][1:].lower()
+
+
+class MetadataIndex:
+    """
+    Metadata (path, name, size, mtime, type, extension) of every item in the managed
+    directory, kept in SQLite so items can be found without browsing.
+
+    Names are indexed with an FTS5 trigram table, which answers both substring
+    (MATCH) and glob (GLOB) queries from the index instead of scanning millions of
+    rows. The index is filled by a parallel crawl in a background thread and then
+    kept current by refresh() calls from the FileManager mutation methods; those are
+    queued and applied by the same thread, so requests never wait on index writes.
+
+    It also keeps recursive disk usage (bytes, files, sub-directories) per directory
+    in `dir_usage`. That table is derived from the indexed rows after a crawl. A
+    refresh only re-aggregates the refreshed subtree and adds the before/after
+    difference to its ancestors, so usage stays current without walking the tree.
+
+    Content digests computed while files were uploaded are kept in `checksums`,
+    together with the size and mtime they were computed for; a digest whose file
+    has changed since is not returned. `chunk_refs` is the content-addressed chunk
+    store of upload deduplication: where in which uploaded file a chunk with a given
+    digest can be copied from, validated the same way.
+    """
+
+    SCHEMA = """
+    CREATE TABLE IF NOT EXISTS index_meta (
+        key TEXT PRIMARY KEY,
+        value TEXT
+    );
+    CREATE TABLE IF NOT EXISTS files (
+        id INTEGER PRIMARY KEY,
+        path TEXT NOT NULL UNIQUE,
+        parent TEXT NOT NULL,
+        name TEXT NOT NULL,
+        type TEXT NOT NULL,
+        extension TEXT NOT NULL,
+        size INTEGER,
+        mtime REAL,
+        scan_id INTEGER NOT NULL
+    );
+    CREATE TABLE IF NOT EXISTS dir_usage (
+        path TEXT PRIMARY KEY,
+        bytes INTEGER NOT NULL,
+        files INTEGER NOT NULL,
+        dirs INTEGER NOT NULL
+    ) WITHOUT ROWID;
+    CREATE TABLE IF NOT EXISTS checksums (
+        path TEXT PRIMARY KEY,
+        algorithm TEXT NOT NULL,
+        digest TEXT NOT NULL,
+        size INTEGER NOT NULL,
+        mtime REAL NOT NULL
+    ) WITHOUT ROWID;
+    CREATE TABLE IF NOT EXISTS chunk_refs (
+        algorithm TEXT NOT NULL,
+        digest TEXT NOT NULL,
+        path TEXT NOT NULL,
+        offset INTEGER NOT NULL,
+        length INTEGER NOT NULL,
+        size INTEGER NOT NULL,
+        mtime REAL NOT NULL,
+        PRIMARY KEY (algorithm, digest, path, offset)
+    ) WITHOUT ROWID;
+    """
+    INDEX_SCHEMA = """
+    CREATE INDEX IF NOT EXISTS idx_files_parent ON files(parent);
+    CREATE INDEX IF NOT EXISTS idx_files_extension ON files(extension);
+    CREATE INDEX IF NOT EXISTS idx_files_size ON files(size);
+    CREATE INDEX IF NOT EXISTS idx_files_mtime ON files(mtime);
+    """
+    FTS_SCHEMA = """
+    CREATE VIRTUAL TABLE IF NOT EXISTS files_fts USING fts5(
+        name, content='files', content_rowid='id', tokenize='trigram'
+    );
+    """
+    FTS_TRIGGERS = """
+    CREATE TRIGGER IF NOT EXISTS files_fts_insert AFTER INSERT ON files BEGIN
+        INSERT INTO files_fts (rowid, name) VALUES (new.id, new.name);
+    END;
+    CREATE TRIGGER IF NOT EXISTS files_fts_delete AFTER DELETE ON files BEGIN
+        INSERT INTO files_fts (files_fts, rowid, name) VALUES ('delete', old.id, old.name);
+    END;
+    CREATE TRIGGER IF NOT EXISTS files_fts_update AFTER UPDATE OF name ON files BEGIN
+        INSERT INTO files_fts (files_fts, rowid, name) VALUES ('delete', old.id, old.name);
+        INSERT INTO files_fts (rowid, name) VALUES (new.id, new.name);
+    END;
+    """
+    SECONDARY_INDEXES = ("idx_files_parent", "idx_files_extension", "idx_files_size", "idx_files_mtime")
+    FTS_TRIGGER_NAMES = ("files_fts_insert", "files_fts_delete", "files_fts_update")
+    COLUMNS = ("path", "parent", "name", "type", "extension", "size", "mtime")
+
+    def __init__(self, root_dir, db_path=INDEX_DB_FILE, crawl_workers=CRAWL_WORKERS, exclude_name=None):
+        self.root_dir = os.path.abspath(root_dir)
+        self.db_path = os.path.abspath(db_path)
+        self.crawl_workers = crawl_workers
+        self.exclude_name = exclude_name  # Optional predicate: entries whose name it accepts are not indexed
+        self.fts_enabled = True
+        self.ready = False  # True once the initial crawl has finished
+        self._local = threading.local()
+        self._write_lock = threading.Lock()
+        self._queue = queue.Queue(maxsize=REFRESH_QUEUE_MAX_SIZE)
+        self._needs_full_crawl = False
+        self._thread = None
+        self._scan_id = 0
+        self.usage_version = 0  # Bumped whenever dir_usage changes
+
+        with self._write_lock:
+            conn = self._connect()
+            conn.executescript(self.SCHEMA)
+            try:
+                conn.executescript(self.FTS_SCHEMA)
+            except sqlite3.OperationalError as e:
+                # SQLite older than 3.34 has no trigram tokenizer; name searches fall back to LIKE scans
+                print(f"WARNING: Full-text name index unavailable ({e}). File search will scan all names.")
+                self.fts_enabled = False
+
+            meta = dict(conn.execute("SELECT key, value FROM index_meta").fetchall())
+            if meta.get("root_dir", self.root_dir) != self.root_dir or meta.get("bulk_load_pending"):
+                # Another tree, or a first crawl that was interrupted before the FTS rebuild
+                print(f"INFO: Clearing file index '{self.db_path}', it will be rebuilt.")
+                self._reset(conn)
+            with conn:
+                conn.execute("INSERT OR REPLACE INTO index_meta (key, value) VALUES ('root_dir', ?)", (self.root_dir,))
+            conn.executescript(self.INDEX_SCHEMA)
+            if self.fts_enabled:
+                conn.executescript(self.FTS_TRIGGERS)
+            self._scan_id = conn.execute("SELECT COALESCE(MAX(scan_id), 0) FROM files").fetchone()[0]
+
+    def _reset(self, conn):
+        with conn:
+            for trigger_name in self.FTS_TRIGGER_NAMES:
+                conn.execute(f"DROP TRIGGER IF EXISTS {trigger_name}")
+            conn.execute("DELETE FROM files")
+            conn.execute("DELETE FROM dir_usage")
+            conn.execute("DELETE FROM checksums")
+            conn.execute("DELETE FROM chunk_refs")
+            if self.fts_enabled:
+                conn.execute("INSERT INTO files_fts (files_fts) VALUES ('delete-all')")
+            conn.execute("DELETE FROM index_meta WHERE key = 'bulk_load_pending'")
+
+    def _connect(self):
+        """Returns this thread's connection, opening it on first use."""
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            conn = sqlite3.connect(self.db_path, timeout=10)
+            conn.row_factory = sqlite3.Row
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+        return conn
+
+    # --- Background maintenance ---
+
+    def start(self):
+        """Starts the background thread: a full crawl first, then queued refreshes."""
+        if self._thread is not None:
+            return
+        self._thread = threading.Thread(target=self._run, name="metadata-index", daemon=True)
+        self._thread.start()
+        atexit.register(self.stop)
+
+    def stop(self, timeout=5):
+        thread = self._thread
+        if thread is None:
+            return
+        self._thread = None
+        try:
+            self._queue.put(None, timeout=timeout)
+        except queue.Full:
+            return
+        thread.join(timeout)
+
+    def refresh(self, *abs_paths):
+        """
+        Schedules the index entries for `abs_paths` (and everything below them) to be
+        re-read from disk. Paths that no longer exist are removed from the index.
+        """
+        for abs_path in abs_paths:
+            if not abs_path:
+                continue
+            if self._thread is None:
+                self._refresh_paths([abs_path])
+                continue
+            try:
+                self._queue.put_nowait(abs_path)
+            except queue.Full:
+                self._needs_full_crawl = True
+
+    def _run(self):
+        try:
+            self.crawl()
+        except Exception as e:
+            print(f"ERROR: Initial file index crawl failed: {e}")
+        while True:
+            abs_path = self._queue.get()
+            if abs_path is None:
+                return
+            pending = [abs_path]
+            # Coalesce whatever else is already waiting into one pass
+            while True:
+                try:
+                    abs_path = self._queue.get_nowait()
+                except queue.Empty:
+                    break
+                if abs_path is None:
+                    self._apply_pending(pending)
+                    return
+                pending.append(abs_path)
+            self._apply_pending(pending)
+
+    def _apply_pending(self, pending):
+        try:
+            if self._needs_full_crawl:
+                self._needs_full_crawl = False
+                self.crawl()
+            else:
+                self._refresh_paths(pending)
+        except Exception as e:
+            print(f"ERROR: Updating the file index failed: {e}")
+
+    # --- Crawling ---
+
+    def _scan_directory(self, abs_dir, rel_dir):
+        """Reads one directory. Returns (rows, [(abs_subdir, rel_subdir), ...])."""
+        rows, subdirectories = [], []
+        prefix = rel_dir + '/' if rel_dir else ''
+        try:
+            with os.scandir(abs_dir) as entries:
+                for entry in entries:
+                    if self.exclude_name and self.exclude_name(entry.name):
+                        continue
+                    try:
+                        is_directory = entry.is_dir()
+                        stat_result = entry.stat()
+                        size, mtime = (None if is_directory else stat_result.st_size), stat_result.st_mtime
+                    except OSError:  # Broken symlink or entry removed mid-scan
+                        is_directory, size, mtime = False, None, None
+                    rel_path = prefix + entry.name
+                    rows.append((rel_path, rel_dir, entry.name, "directory" if is_directory else "file",
+                                 _extension_of(entry.name, is_directory), size, mtime))
+                    # Symlinked directories are indexed but not followed, so links can't create cycles
+                    if is_directory and not entry.is_symlink():
+                        subdirectories.append((entry.path, rel_path))
+        except OSError as e:
+            print(f"WARNING: File index could not read '{abs_dir}': {e}")
+        return rows, subdirectories
+
+    def crawl(self):
+        """
+        Re-reads the whole managed directory, reading directories on a thread pool
+        (directory reads and stats release the GIL) and writing rows in batches.
+        Rows that were not seen by this crawl are removed afterwards.
+        """
+        started = time.time()
+        scan_id = self._scan_id + 1
+        # Filling an empty index is several times faster without the secondary indexes and FTS triggers
+        bulk_load = self._connect().execute("SELECT 1 FROM files LIMIT 1").fetchone() is None
+        if bulk_load:
+            self._drop_secondary_structures()
+        total = 0
+        batch = []
+        with ThreadPoolExecutor(max_workers=self.crawl_workers, thread_name_prefix="metadata-crawl") as pool:
+            pending = {pool.submit(self._scan_directory, self.root_dir, "")}
+            while pending:
+                done, pending = wait(pending, return_when=FIRST_COMPLETED)
+                for future in done:
+                    rows, subdirectories = future.result()
+                    batch.extend(rows)
+                    for abs_dir, rel_dir in subdirectories:
+                        pending.add(pool.submit(self._scan_directory, abs_dir, rel_dir))
+                if len(batch) >= CRAWL_BATCH_SIZE:
+                    self._upsert(batch, scan_id)
+                    total += len(batch)
+                    batch = []
+        self._upsert(batch, scan_id)
+        total += len(batch)
+
+        if bulk_load:
+            self._rebuild_secondary_structures()
+        with self._write_lock:
+            conn = self._connect()
+            with conn:
+                conn.execute("DELETE FROM files WHERE scan_id < ?", (scan_id,))
+                self._rebuild_usage(conn)
+            conn.execute("PRAGMA optimize")
+        self._scan_id = scan_id
+        self.ready = True
+        print(f"INFO: Indexed {total} items under '{self.root_dir}' in {time.time() - started:.1f}s.")
+        return total
+
+    def _drop_secondary_structures(self):
+        with self._write_lock:
+            conn = self._connect()
+            with conn:
+                conn.execute("INSERT OR REPLACE INTO index_meta (key, value) VALUES ('bulk_load_pending', '1')")
+                for index_name in self.SECONDARY_INDEXES:
+                    conn.execute(f"DROP INDEX IF EXISTS {index_name}")
+                for trigger_name in self.FTS_TRIGGER_NAMES:
+                    conn.execute(f"DROP TRIGGER IF EXISTS {trigger_name}")
+
+    def _rebuild_secondary_structures(self):
+        with self._write_lock:
+            conn = self._connect()
+            conn.executescript(self.INDEX_SCHEMA)
+            if self.fts_enabled:
+                with conn:
+                    conn.execute("INSERT INTO files_fts (files_fts) VALUES ('rebuild')")
+                conn.executescript(self.FTS_TRIGGERS)
+            with conn:
+                conn.execute("DELETE FROM index_meta WHERE key = 'bulk_load_pending'")
+
+    def _upsert(self, rows, scan_id):
+        if not rows:
+            return
+        with self._write_lock:
+            conn = self._connect()
+            with conn:
+                conn.executemany(
+                    f"""
+                    INSERT INTO files ({', '.join(self.COLUMNS)}, scan_id) VALUES (?, ?, ?, ?, ?, ?, ?, ?)
+                    ON CONFLICT (path) DO UPDATE SET
+                        type = excluded.type, extension = excluded.extension, size = excluded.size,
+                        mtime = excluded.mtime, scan_id = excluded.scan_id
+                    """,
+                    [row + (scan_id,) for row in rows]
+                )
+
+    def _refresh_paths(self, abs_paths):
+        """Replaces the index entries of each path's subtree with what is on disk now."""
+        rel_paths = set()
+        for abs_path in abs_paths:
+            rel_path = os.path.relpath(os.path.normpath(abs_path), self.root_dir).replace('\\', '/')
+            if rel_path == '.':
+                self.crawl()
+                return
+            if not rel_path.startswith('../'):
+                rel_paths.add(rel_path)
+        # A path below another refreshed path is covered by its ancestor's refresh
+        rel_paths = [path for path in rel_paths
+                     if not any(path.startswith(other + '/') for other in rel_paths if other != path)]
+
+        for rel_path in rel_paths:
+            abs_path = os.path.join(self.root_dir, rel_path)
+            exists = os.path.lexists(abs_path)
+            with self._write_lock:
+                conn = self._connect()
+                with conn:
+                    previous_totals = self._subtree_totals(conn, rel_path)
+                    # '0' sorts right after '/', so this range is exactly the subtree
+                    conn.execute("DELETE FROM files WHERE path = ? OR (path >= ? AND path < ?)",
+                                 (rel_path, rel_path + '/', rel_path + '0'))
+                    if not exists:
+                        self._prune_content_rows(conn, rel_path)
+            if exists:
+                self._index_subtree(abs_path, rel_path)
+            with self._write_lock:
+                conn = self._connect()
+                with conn:
+                    if exists:
+                        # Entries removed from the subtree while the path itself stayed
+                        self._prune_content_rows(conn, rel_path, orphans_only=True)
+                    totals = self._subtree_totals(conn, rel_path)
+                    self._add_to_ancestors(conn, rel_path, [new - old for new, old in zip(totals, previous_totals)])
+                    self._rebuild_usage(conn, rel_path)
+
+    @staticmethod
+    def _prune_content_rows(conn, rel_path, orphans_only=False):
+        """Deletes the checksums and chunk refs recorded for paths in a subtree."""
+        for table in ('checksums', 'chunk_refs'):
+            sql = f"DELETE FROM {table} WHERE (path = ? OR (path >= ? AND path < ?))"
+            if orphans_only:
+                sql += " AND path NOT IN (SELECT path FROM files)"
+            conn.execute(sql, (rel_path, rel_path + '/', rel_path + '0'))
+
+    def _index_subtree(self, abs_path, rel_path):
+        parent, _, name = rel_path.rpartition('/')
+        if self.exclude_name and self.exclude_name(name):
+            return
+        is_directory = os.path.isdir(abs_path)
+        try:
+            stat_result = os.stat(abs_path)
+            size, mtime = (None if is_directory else stat_result.st_size), stat_result.st_mtime
+        except OSError:
+            size, mtime = None, None
+        self._upsert([(rel_path, parent, name, "directory" if is_directory else "file",
+                       _extension_of(name, is_directory), size, mtime)], self._scan_id)
+        if is_directory and not os.path.islink(abs_path):
+            pending = [(abs_path, rel_path)]
+            while pending:
+                rows, subdirectories = self._scan_directory(*pending.pop())
+                self._upsert(rows, self._scan_id)
+                pending.extend(subdirectories)
+
+    # --- Disk usage ---
+
+    @staticmethod
+    def _subtree_totals(conn, rel_path):
+        """(bytes, files, directories) of rel_path itself plus everything below it, from the indexed rows."""
+        return tuple(conn.execute(
+            """
+            SELECT COALESCE(SUM(CASE WHEN type = 'file' THEN COALESCE(size, 0) ELSE 0 END), 0),
+                   COALESCE(SUM(type = 'file'), 0), COALESCE(SUM(type = 'directory'), 0)
+            FROM files WHERE path = ? OR (path >= ? AND path < ?)
+            """,
+            (rel_path, rel_path + '/', rel_path + '0')
+        ).fetchone())
+
+    @staticmethod
+    def _add_to_ancestors(conn, rel_path, delta):
+        if not any(delta):
+            return
+        conn.executemany(
+            """
+            INSERT INTO dir_usage (path, bytes, files, dirs) VALUES (?, ?, ?, ?)
+            ON CONFLICT (path) DO UPDATE SET
+                bytes = bytes + excluded.bytes, files = files + excluded.files, dirs = dirs + excluded.dirs
+            """,
+            [(ancestor, *delta) for ancestor in _ancestors(rel_path)]
+        )
+
+    def _rebuild_usage(self, conn, rel_root=''):
+        """
+        Recomputes dir_usage for rel_root and every directory below it (the whole tree
+        by default) by summing each directory's direct entries and rolling the sums up.
+        """
+        if rel_root:
+            rows = conn.execute(
+                """
+                SELECT parent, SUM(CASE WHEN type = 'file' THEN COALESCE(size, 0) ELSE 0 END),
+                       SUM(type = 'file'), SUM(type = 'directory')
+                FROM files WHERE path >= ? AND path < ? GROUP BY parent
+                """,
+                (rel_root + '/', rel_root + '0')
+            )
+        else:
+            rows = conn.execute(
+                """
+                SELECT parent, SUM(CASE WHEN type = 'file' THEN COALESCE(size, 0) ELSE 0 END),
+                       SUM(type = 'file'), SUM(type = 'directory')
+                FROM files GROUP BY parent
+                """
+            )
+        totals = {}
+        for parent, size, files, directories in rows:
+            path = parent
+            while True:
+                total = totals.setdefault(path, [0, 0, 0])
+                total[0] += size
+                total[1] += files
+                total[2] += directories
+                if path == rel_root:
+                    break
+                path = path.rpartition('/')[0]
+
+        if rel_root:
+            conn.execute("DELETE FROM dir_usage WHERE path = ? OR (path >= ? AND path < ?)",
+                         (rel_root, rel_root + '/', rel_root + '0'))
+        else:
+            conn.execute("DELETE FROM dir_usage")
+        conn.executemany("INSERT INTO dir_usage (path, bytes, files, dirs) VALUES (?, ?, ?, ?)",
+                         [(path, *total) for path, total in totals.items()])
+        self.usage_version += 1
+
+    def get_usage(self, rel_path='', children_limit=USAGE_CHILDREN_LIMIT):
+        """
+        Returns the recursive usage of rel_path ('' is the root) and its largest direct
+        children, or None if rel_path is not in the index.
+        """
+        rel_path = rel_path.strip('/')
+        conn = self._connect()
+        item_type = "directory"
+        if rel_path:
+            row = conn.execute("SELECT type, size FROM files WHERE path = ?", (rel_path,)).fetchone()
+            if row is None:
+                return None
+            item_type = row["type"]
+            if item_type != "directory":
+                return {"path": rel_path, "type": item_type, "total_size": row["size"] or 0,
+                        "file_count": 1, "dir_count": 0, "children": []}
+
+        usage = conn.execute("SELECT bytes, files, dirs FROM dir_usage WHERE path = ?", (rel_path,)).fetchone()
+        children = conn.execute(
+            """
+            SELECT files.name, files.path, files.type,
+                   COALESCE(dir_usage.bytes, files.size, 0) AS total_size,
+                   COALESCE(dir_usage.files, files.type = 'file') AS file_count,
+                   COALESCE(dir_usage.dirs, 0) AS dir_count
+            FROM files LEFT JOIN dir_usage ON dir_usage.path = files.path
+            WHERE files.parent = ? ORDER BY total_size DESC, files.name LIMIT ?
+            """,
+            (rel_path, children_limit)
+        ).fetchall()
+        return {
+            "path": rel_path,
+            "type": item_type,
+            "total_size": usage["bytes"] if usage else 0,
+            "file_count": usage["files"] if usage else 0,
+            "dir_count": usage["dirs"] if usage else 0,
+            "children": [dict(child) for child in children]
+        }
+
+    def get_usage_many(self, rel_paths):
+        """Returns {rel_path: (bytes, files, dirs)} for the given directories (missing ones are left out)."""
+        usage = {}
+        rel_paths = list(rel_paths)
+        conn = self._connect()
+        for start in range(0, len(rel_paths), 500):  # Stay below SQLite's bound-parameter limit
+            chunk = rel_paths[start:start + 500]
+            for row in conn.execute(
+                    f"SELECT path, bytes, files, dirs FROM dir_usage WHERE path IN ({', '.join('?' * len(chunk))})",
+                    chunk):
+                usage[row["path"]] = (row["bytes"], row["files"], row["dirs"])
+        return usage
+
+    # --- Queries ---
+
+    def search(self, query=None, item_type=None, extensions=None, path=None, min_size=None, max_size=None,
+               modified_after=None, modified_before=None, cursor=None, limit=SEARCH_DEFAULT_LIMIT):
+        """
+        Returns items matching all given filters, in index order.
+        `query` matches a substring of the name (case-insensitive) or, if it contains
+        * ? or [, a glob against the whole name (case-sensitive). `path` restricts the
+        search to that directory's subtree, `modified_after`/`modified_before` are epoch
+        seconds, and `cursor` is the `next_cursor` of a previous page.
+        Returns {"items": [...], "next_cursor": str or None}. Raises ValueError for a malformed cursor.
+        """
+        limit = max(1, min(int(limit), SEARCH_MAX_LIMIT))
+        cursor_id = int(cursor) if cursor else None
+        if cursor_id is not None and not 0 <= cursor_id <= SQLITE_MAX_INTEGER:
+            raise ValueError(f"Cursor out of range: {cursor}")
+        conn = self._connect()
+
+        # Each filter is (driver, clause, params). A clause's "{p}" is replaced with "+" unless
+        # that filter drives the query, which keeps SQLite from using the other filters' indexes.
+        filters = []
+        fts_filter = None
+        if query:
+            is_glob = any(char in GLOB_CHARACTERS for char in query)
+            if is_glob:
+                filters.append(("name", "files.name GLOB ?", [query]))
+                # Trigrams only help if the pattern has a literal run of 3+ characters
+                literal_runs = query.replace('?', '*').replace('[', '*').replace(']', '*').split('*')
+                if self.fts_enabled and max(len(run) for run in literal_runs) >= 3:
+                    fts_filter = ("files_fts.name GLOB ?", [query])
+            else:
+                escaped = query.replace('\\', '\\\\').replace('%', '\\%').replace('_', '\\_')
+                filters.append(("name", "files.name LIKE ? ESCAPE '\\'", [f"%{escaped}%"]))
+                if self.fts_enabled and len(query) >= 3:
+                    fts_filter = ("files_fts MATCH ?", ['name:"' + query.replace('"', '""') + '"'])
+        if item_type:
+            filters.append((None, "files.type = ?", [item_type]))
+        if extensions:
+            filters.append(("extension", f"{{p}}files.extension IN ({', '.join('?' * len(extensions))})",
+                            [extension.lower().lstrip('.') for extension in extensions]))
+        if path:
+            path = path.strip('/')
+            # '0' sorts right after '/', so this range is exactly the subtree
+            filters.append(("path", "{p}files.path >= ? AND {p}files.path < ?", [path + '/', path + '0']))
+        if min_size is not None or max_size is not None:
+            filters.append(("size", "{p}files.size BETWEEN ? AND ?",
+                            [min_size if min_size is not None else 0, max_size if max_size is not None else 2 ** 63 - 1]))
+        if modified_after is not None or modified_before is not None:
+            filters.append(("mtime", "{p}files.mtime >= ? AND {p}files.mtime < ?",
+                            [modified_after if modified_after is not None else float('-inf'),
+                             modified_before if modified_before is not None else float('inf')]))
+
+        driver, estimate = self._choose_search_driver(conn, filters, fts_filter)
+        if estimate == 0:
+            return {"items": [], "next_cursor": None}
+        clauses, params = [], []
+        if driver == "fts":
+            # Stream FTS matches in rowid order; LIMIT stops the scan as soon as the page is full
+            source, order_by = "files_fts JOIN files ON files.id = files_fts.rowid", "files_fts.rowid"
+            clauses.append(fts_filter[0])
+            params.extend(fts_filter[1])
+        else:
+            source, order_by = "files", "files.id"
+        for filter_driver, clause, filter_params in filters:
+            if filter_driver == "name" and driver == "fts":
+                continue
+            clauses.append(clause.format(p='' if filter_driver == driver else '+'))
+            params.extend(filter_params)
+        if cursor_id is not None:
+            # With an index driving the query, the rowid bound must not replace that index
+            clauses.append(f"{'' if driver in (None, 'fts') else '+'}{order_by} > ?")
+            params.append(cursor_id)
+
+        where = f"WHERE {' AND '.join(clauses)}" if clauses else ""
+        rows = conn.execute(
+            f"SELECT files.id, files.path, files.name, files.type, files.extension, files.size, files.mtime "
+            f"FROM {source} {where} ORDER BY {order_by} LIMIT ?",
+            params + [limit + 1]
+        ).fetchall()
+
+        items = [dict(row) for row in rows[:limit]]
+        next_cursor = str(items[-1]["id"]) if len(rows) > limit else None
+        for item in items:
+            del item["id"]
+        return {"items": items, "next_cursor": next_cursor}
+
+    def _choose_search_driver(self, conn, filters, fts_filter):
+        """
+        Picks the filter whose index should drive a search. Every indexed filter is probed
+        for its match count (capped at SEARCH_PROBE_LIMIT); the most selective one wins if it
+        is below the cap, since sorting a few thousand rows by id is cheap. If every filter
+        matches a lot, rows are read in id order instead (from the FTS index if there is a
+        name query) and the page fills up quickly.
+        Returns (driver name or None, match count of the driving filter or None if unknown).
+        """
+        candidates = []
+        if fts_filter:
+            candidates.append(("fts", f"SELECT 1 FROM files_fts WHERE {fts_filter[0]}", fts_filter[1]))
+        for filter_driver, clause, filter_params in filters:
+            if filter_driver not in (None, "name"):
+                candidates.append((filter_driver, f"SELECT 1 FROM files WHERE {clause.format(p='')}", filter_params))
+        if not candidates:
+            return None, None
+
+        best_driver, best_count = None, SEARCH_PROBE_LIMIT
+        for candidate_driver, probe_sql, probe_params in candidates:
+            count = conn.execute(f"SELECT COUNT(*) FROM ({probe_sql} LIMIT {SEARCH_PROBE_LIMIT})",
+                                 probe_params).fetchone()[0]
+            if count < best_count:
+                best_driver, best_count = candidate_driver, count
+                if count == 0:
+                    break
+        if best_driver is None:
+            return ("fts" if fts_filter else None), None
+        return best_driver, best_count
+
+    # --- Checksums ---
+
+    def set_checksum(self, abs_path, algorithm, digest):
+        """Records the digest of a file's current content (computed by the caller while writing it)."""
+        self.set_checksums([(abs_path, algorithm, digest)])
+
+    def set_checksums(self, entries):
+        """set_checksum() for many (abs_path, algorithm, digest) entries, in one transaction."""
+        rows = []
+        for abs_path, algorithm, digest in entries:
+            rel_path = os.path.relpath(os.path.normpath(abs_path), self.root_dir).replace('\\', '/')
+            try:
+                stat_result = os.stat(abs_path)
+            except OSError:
+                continue  # Gone again already
+            rows.append((rel_path, algorithm, digest, stat_result.st_size, stat_result.st_mtime))
+        with self._write_lock:
+            conn = self._connect()
+            with conn:
+                conn.executemany("INSERT OR REPLACE INTO checksums (path, algorithm, digest, size, mtime) VALUES (?, ?, ?, ?, ?)",
+                                 rows)
+
+    def get_checksum(self, rel_path):
+        """{"algorithm", "digest"} recorded for a file, or None if there is none or the file changed since."""
+        row = self._connect().execute("SELECT algorithm, digest, size, mtime FROM checksums WHERE path = ?",
+                                      (rel_path,)).fetchone()
+        if row is None:
+            return None
+        try:
+            stat_result = os.stat(os.path.join(self.root_dir, rel_path))
+        except OSError:
+            return None
+        if (stat_result.st_size, stat_result.st_mtime) != (row['size'], row['mtime']):
+            return None
+        return {"algorithm": row['algorithm'], "digest": row['digest']}
+
+    def add_chunk_refs(self, abs_path, algorithm, chunks):
+        """Records where chunks of a file just written can be found: `chunks` is [(digest, offset, length)]."""
+        rel_path = os.path.relpath(os.path.normpath(abs_path), self.root_dir).replace('\\', '/')
+        stat_result = os.stat(abs_path)
+        with self._write_lock:
+            conn = self._connect()
+            with conn:
+                conn.execute("DELETE FROM chunk_refs WHERE path = ?", (rel_path,))  # Refs to its previous content
+                conn.executemany(
+                    "INSERT OR REPLACE INTO chunk_refs (algorithm, digest, path, offset, length, size, mtime) VALUES (?, ?, ?, ?, ?, ?, ?)",
+                    [(algorithm, digest, rel_path, offset, length, stat_result.st_size, stat_result.st_mtime)
+                     for digest, offset, length in chunks]
+                )
+
+    def find_chunk(self, algorithm, digest, length):
+        """
+        (abs_path, offset) of a file range recorded with this digest and length whose file is
+        unchanged since, or None. Refs to files that changed or vanished are dropped on the way.
+        """
+        rows = self._connect().execute(
+            "SELECT path, offset, size, mtime FROM chunk_refs WHERE algorithm = ? AND digest = ? AND length = ?",
+            (algorithm, digest, length)
+        ).fetchall()
+        stale_paths = set()
+        found = None
+        for row in rows:
+            abs_path = os.path.join(self.root_dir, row['path'])
+            try:
+                stat_result = os.stat(abs_path)
+            except OSError:
+                stat_result = None
+            if stat_result is None or (stat_result.st_size, stat_result.st_mtime) != (row['size'], row['mtime']):
+                stale_paths.add(row['path'])
+                continue
+            found = (abs_path, row['offset'])
+            break
+        if stale_paths:
+            with self._write_lock:
+                conn = self._connect()
+                with conn:
+                    conn.executemany("DELETE FROM chunk_refs WHERE path = ?", [(path,) for path in stale_paths])
+        return found
+
+    def count(self):
+        return self._connect().execute("SELECT COUNT(*) FROM files").fetchone()[0]
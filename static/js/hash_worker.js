@@ -0,0 +1,12 @@
+// Hashes upload chunks off the UI thread.
+// Request: { id, blob, algorithm } (a WebCrypto name, e.g. 'SHA-256'); reply: { id, digest } as hex, or { id, error }.
+self.onmessage = async (event) => {
+    const { id, blob, algorithm } = event.data;
+    try {
+        const digest = await crypto.subtle.digest(algorithm, await blob.arrayBuffer());
+        const hex = Array.from(new Uint8Array(digest), (byte) => byte.toString(16).padStart(2, '0')).join('');
+        self.postMessage({ id, digest: hex });
+    } catch (error) {
+        self.postMessage({ id, error: error.message });
+    }
+};
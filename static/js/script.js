@@ -53,6 +53,45 @@ document.addEventListener('DOMContentLoaded', () => {
     const cancelUnzipButton = document.getElementById('cancelUnzip');
     const closeUnzipModalButton = document.getElementById('closeUnzipModal');
 
+    const ETAG_CACHE_MAX_ENTRIES = 50; // Listings kept for If-None-Match revalidation
+    const etagCache = new Map(); // endpoint -> { etag, data }, in least-recently-used order
+
+    const LISTING_PAGE_SIZE = 1000; // Entries per /api/files request; later pages load while the first is shown
+    const VIRTUAL_ROW_HEIGHT_DEFAULT = 41; // px, until a rendered row has been measured
+    const VIRTUAL_OVERSCAN_ROWS = 10; // Rows materialized above and below the visible window
+    const UPLOAD_JOB_POLL_INTERVAL_MS = 3000; // Fallback polling of upload finalization jobs
+
+    const uploadJobWaiters = new Map(); // job id -> waiter of waitForUploadJob()
+    const UPLOAD_RESUME_KEY_PREFIX = 'qfm-upload:'; // localStorage: file identity -> upload id, for resuming
+    const pendingUploadResumes = []; // Interrupted uploads, restarted on the next (re)connect
+    const UPLOAD_CONNECTION_BUDGET = 6; // Upload requests in flight across all files (what browsers open per server over HTTP/1.1)
+    let activeUploadConnections = 0;
+    const uploadConnectionWaiters = []; // resolve() of requests waiting for a connection, in order
+    const UPLOAD_BUNDLE_FILE_MAX_BYTES = 1024 * 1024; // Files up to this size go in bundles (one tar stream per request)
+    const UPLOAD_BUNDLE_MAX_BYTES = 16 * 1024 * 1024; // Same limits as the server's BUNDLE_MAX_BYTES
+    const UPLOAD_BUNDLE_MAX_FILES = 1000; // and BUNDLE_MAX_ENTRIES (files and folders)
+    const TAR_BLOCK_SIZE = 512;
+    const HASH_WORKER_URL = '/static/js/hash_worker.js';
+    const UPLOAD_TARGET_REQUEST_SECONDS = 2; // Chunk requests are grown or shrunk to take about this long
+    const UPLOAD_REQUEST_TIMEOUT_MS = 120000;
+    const UPLOAD_BUSY_THRESHOLD = 0.8; // Server load ('busy') from which uploads stop growing
+    const WEBCRYPTO_ALGORITHMS = { sha1: 'SHA-1', sha256: 'SHA-256', sha384: 'SHA-384', sha512: 'SHA-512' };
+    const STANDARD_UPLOAD_HASH_MAX_BYTES = 64 * 1024 * 1024; // WebCrypto hashes in one go; larger files aren't read into memory
+    let hashWorker = null;
+    const hashRequests = new Map(); // request id -> resolve(digest or null)
+    let hashRequestId = 0;
+
+    // Virtual model of the directory on screen: only the rows in view exist in the DOM
+    let listingItems = []; // Loaded entries, in the server's order
+    let listingNames = new Set(); // Names in listingItems, to drop duplicates from later pages
+    let listingCursor = null; // next_cursor of the last page loaded, null once complete
+    let listingLoadId = 0; // Incremented per loadFiles() so stale page loads stop
+    let renderedRows = new Map(); // path -> materialized <li>
+    let rowHeight = VIRTUAL_ROW_HEIGHT_DEFAULT;
+    let topSpacer = null;
+    let bottomSpacer = null;
+    let renderScheduled = false;
+
     let currentDirectory = '';
     let currentlyEditingPath = null;
     let selectedItems = new Set();
@@ -103,7 +142,7 @@ document.addEventListener('DOMContentLoaded', () => {
                 clearAllSelections();
             }
             updateButtonVisibility(); // Update button visibility
-            loadFiles(currentDirectory); // Reload files to show/hide checkboxes
+            renderVisibleRows(true); // Rebuild the visible rows to show/hide checkboxes
         });
     }
 
@@ -120,6 +159,14 @@ document.addEventListener('DOMContentLoaded', () => {
             config.body = JSON.stringify(options.body);
         }
 
+        // GET responses that carry an ETag are remembered and revalidated with If-None-Match
+        const isGet = !config.method || config.method.toUpperCase() === 'GET';
+        const cached = isGet ? etagCache.get(endpoint) : null;
+        if (cached) {
+            config.headers = { ...config.headers, 'If-None-Match': cached.etag };
+            config.cache = 'no-store'; // We handle revalidation ourselves; keep the browser cache out of it
+        }
+
         try {
             const response = await fetch(endpoint, config);
             if (response.status === 401) { // Unauthorized
@@ -127,11 +174,26 @@ document.addEventListener('DOMContentLoaded', () => {
                 window.location.href = '/login';
                 return null;
             }
+            if (response.status === 304 && cached) {
+                // Refresh the entry's position so the cache behaves as an LRU
+                etagCache.delete(endpoint);
+                etagCache.set(endpoint, cached);
+                return cached.data;
+            }
             if (!response.ok) {
                 const errorData = await response.json().catch(() => ({ error: `HTTP error! status: ${response.status}` }));
                 throw new Error(errorData.error || `HTTP error! status: ${response.status}`);
             }
-            return response.json();
+            const data = await response.json();
+            const etag = response.headers.get('ETag');
+            if (isGet && etag) {
+                etagCache.delete(endpoint);
+                etagCache.set(endpoint, { etag, data });
+                if (etagCache.size > ETAG_CACHE_MAX_ENTRIES) {
+                    etagCache.delete(etagCache.keys().next().value);
+                }
+            }
+            return data;
         } catch (error) {
             console.error(`API Error (${endpoint}):`, error);
             showToast(`Error: ${error.message}`, 'error');
@@ -141,19 +203,15 @@ document.addEventListener('DOMContentLoaded', () => {
 
     // --- File & Folder Listing ---
     async function loadFiles(path = '') {
-        const data = await fetchAPI(`/api/files/${path}`);
+        const loadId = ++listingLoadId;
+        const data = await fetchAPI(`/api/files/${path}?limit=${LISTING_PAGE_SIZE}`);
+        if (loadId !== listingLoadId) return; // Another directory was opened meanwhile
         if (data && data.items) {
             currentDirectory = data.path || '';
             if (currentPathDisplay) currentPathDisplay.textContent = currentDirectory === '' ? '/' : `/${currentDirectory}`;
-            if (fileList) fileList.innerHTML = ''; // Clear previous list
+            resetVirtualList();
 
-            // Sort: folders first, then by name
-            data.items.sort((a, b) => {
-                if (a.type === b.type) {
-                    return a.name.localeCompare(b.name);
-                }
-                return a.type === 'directory' ? -1 : 1;
-            });
+            // Items arrive already sorted by the server (folders first, then by name)
 
             // If not root, create an '..' entry for parent directory
             if (currentDirectory !== '' && currentDirectory !== '/') {
@@ -181,243 +239,401 @@ document.addEventListener('DOMContentLoaded', () => {
                 
 
                 
-                if (fileList) fileList.appendChild(parentItem);
+                if (fileList) fileList.insertBefore(parentItem, topSpacer);
             }
 
-            data.items.forEach(item => {
-                const itemElement = document.createElement('li');
-                itemElement.className = item.type === 'directory' ? 'folder-item' : 'file-item';
-                itemElement.dataset.path = item.path;
-                itemElement.dataset.name = item.name;
-                itemElement.dataset.type = item.type;
-                if (selectedItems.has(item.path)) { // Re-apply 'selected' class if item is in selection set
-                    itemElement.classList.add('selected');
-                }
+            if (fileListContainer) fileListContainer.scrollTop = 0;
+            appendListingPage(data);
+            updateSelectionControls(); // Fixed function name - Initial update after loading
+            // Only receive file_changed events for the directory on screen
+            updatesSocket.emit('watch_directory', { path: currentDirectory });
+            loadRemainingPages(loadId);
+        } else {
+            resetVirtualList();
+            topSpacer = bottomSpacer = null; // Nothing to render until the next successful load
+            if (currentPathDisplay) currentPathDisplay.textContent = `/${currentDirectory}`;
+            if (fileList) fileList.innerHTML = '<p>Could not load files or directory is empty.</p>';
+        }
+        closeFilePreview(); // Close preview when navigating
+    }
 
-                const itemDetails = document.createElement('div');
-                itemDetails.className = 'item-details';
-
-                // Add checkbox if in select mode
-                if (isCheckboxSelectModeActive) {
-                    const checkbox = document.createElement('input');
-                    checkbox.type = 'checkbox';
-                    checkbox.className = 'item-checkbox';
-                    checkbox.dataset.path = item.path;
-                    checkbox.checked = selectedItems.has(item.path);
-                    checkbox.addEventListener('click', (e) => {
-                        e.stopPropagation(); // Prevent item click event when clicking checkbox
-                        toggleItemSelectionState(itemElement, item.path, checkbox.checked);
-                    });
-                    itemDetails.appendChild(checkbox);
-                }
+    // Fetches the rest of a paged listing in the background, rendering each page as it arrives
+    async function loadRemainingPages(loadId) {
+        while (listingCursor && loadId === listingLoadId) {
+            const data = await fetchAPI(`/api/files/${currentDirectory}?limit=${LISTING_PAGE_SIZE}&cursor=${encodeURIComponent(listingCursor)}`);
+            if (loadId !== listingLoadId) return;
+            if (!data || !data.items) return; // fetchAPI already reported the error
+            appendListingPage(data);
+        }
+    }
 
-                const icon = document.createElement('i');
-                const iconClass = item.type === 'directory' ? 'fa-folder' : getFileIcon(item.name);
-                icon.className = `item-icon fas ${iconClass}`;
-                itemDetails.appendChild(icon);
-
-                const nameSpan = document.createElement('span');
-                nameSpan.className = 'item-name';
-                nameSpan.textContent = item.name;
-                itemDetails.appendChild(nameSpan);
-                itemElement.appendChild(itemDetails);
-
-                const actionsWrapper = document.createElement('div');
-                actionsWrapper.className = 'file-item-actions-wrapper';
-                const ellipsisButton = document.createElement('button');
-                ellipsisButton.className = 'ellipsis-button';
-                ellipsisButton.innerHTML = '<i class="fas fa-ellipsis-v"></i>';
-                const actionsDropdown = document.createElement('div');
-                actionsDropdown.className = 'actions-dropdown';
-
-                // --- RENAME --- 
-                const renameButton = document.createElement('button');
-                renameButton.innerHTML = '<i class="fas fa-edit"></i> Rename';
-                renameButton.onclick = (e) => { 
-                    e.stopPropagation(); 
-                    closeAllDropdowns();
-                    renameItem(item.path, item.name, item.type, itemElement); 
-                };
-                actionsDropdown.appendChild(renameButton);
-
-                // --- DOWNLOAD (for files) / OPEN (for folders) --- 
-                if (item.type === 'file') {
-                    const downloadButton = document.createElement('button');
-                    downloadButton.innerHTML = '<i class="fas fa-download"></i> Download';
-                    downloadButton.onclick = (e) => {
-                        e.stopPropagation();
-                        closeAllDropdowns();
-                        downloadFile(item.path, true);
-                    };
-                    actionsDropdown.appendChild(downloadButton);
-                } else if (item.type === 'directory') {
-                    const openButton = document.createElement('button');
-                    openButton.innerHTML = '<i class="fas fa-folder-open"></i> Open';
-                    openButton.onclick = (e) => {
-                        e.stopPropagation();
-                        closeAllDropdowns();
-                        loadFiles(item.path);
-                    };
-                    actionsDropdown.appendChild(openButton);
-                }
+    function appendListingPage(data) {
+        data.items.forEach(item => {
+            if (!listingNames.has(item.name)) { // Already added from a file_changed event
+                listingNames.add(item.name);
+                listingItems.push(item);
+            }
+        });
+        listingCursor = data.next_cursor || null;
+        renderVisibleRows();
+    }
+
+    function resetVirtualList() {
+        if (currentRenameOperation) currentRenameOperation.cancel();
+        renderedRows.forEach(row => removeRowElement(row));
+        renderedRows = new Map();
+        listingItems = [];
+        listingNames = new Set();
+        listingCursor = null;
+        if (!fileList) return;
+        fileList.innerHTML = ''; // Clear previous list
+        topSpacer = document.createElement('li');
+        topSpacer.className = 'virtual-spacer';
+        bottomSpacer = document.createElement('li');
+        bottomSpacer.className = 'virtual-spacer';
+        fileList.appendChild(topSpacer);
+        fileList.appendChild(bottomSpacer);
+    }
+
+    // Materializes the rows in (and just around) the scrolled-to window and drops the rest.
+    // Rows still in the window are kept as they are (open menus, rename inputs); `rebuild`
+    // recreates them all, e.g. after switching between click and select mode.
+    function renderVisibleRows(rebuild = false) {
+        if (!fileList || !topSpacer) return;
+        if (rebuild) {
+            if (currentRenameOperation) currentRenameOperation.cancel();
+            renderedRows.forEach(row => removeRowElement(row));
+            renderedRows = new Map();
+        }
+        const scrollTop = fileListContainer ? fileListContainer.scrollTop : 0;
+        const viewportHeight = fileListContainer ? fileListContainer.clientHeight : window.innerHeight;
+        const listTop = topSpacer.offsetTop; // Below the '..' row, relative to the container
+        const first = Math.max(0, Math.floor((scrollTop - listTop) / rowHeight) - VIRTUAL_OVERSCAN_ROWS);
+        const last = Math.min(listingItems.length,
+            Math.ceil((scrollTop - listTop + viewportHeight) / rowHeight) + VIRTUAL_OVERSCAN_ROWS);
+
+        const wanted = new Map();
+        for (let i = first; i < last; i++) {
+            const item = listingItems[i];
+            wanted.set(item.path, renderedRows.get(item.path) || createFileItemElement(item));
+        }
+        renderedRows.forEach((row, rowPath) => {
+            if (!wanted.has(rowPath)) removeRowElement(row);
+        });
+        // Kept rows are already in order; only insert the new ones around them
+        let next = topSpacer.nextSibling;
+        wanted.forEach(row => {
+            if (row === next) next = next.nextSibling;
+            else fileList.insertBefore(row, next);
+        });
+        renderedRows = wanted;
 
-                // --- DELETE --- 
-                const deleteButton = document.createElement('button');
-                deleteButton.innerHTML = '<i class="fas fa-trash-alt"></i> Delete';
-                deleteButton.onclick = (e) => {
-                    e.stopPropagation();
-                    closeAllDropdowns();
-                    deleteItem(item.path, item.name, item.type);
-                };
-                actionsDropdown.appendChild(deleteButton);
-
-                // --- EXTRACT (for archive files) ---
-                if (item.type === 'file' && isArchive(item.name)) {
-                    const extractButton = document.createElement('button');
-                    extractButton.innerHTML = '<i class="fas fa-file-archive"></i> Extract';
-                    extractButton.onclick = (e) => {
-                        e.stopPropagation();
-                        closeAllDropdowns();
-                        showExtractModal(item.path);
-                    };
-                    actionsDropdown.appendChild(extractButton);
-                }
+        const firstRow = wanted.values().next().value;
+        if (firstRow && firstRow.offsetHeight > 0 && firstRow.offsetHeight !== rowHeight) {
+            rowHeight = firstRow.offsetHeight;
+            scheduleRender(); // Positions were computed with the old estimate
+        }
+        topSpacer.style.height = `${first * rowHeight}px`;
+        bottomSpacer.style.height = `${(listingItems.length - last) * rowHeight}px`;
+    }
 
-                if (actionsDropdown.childElementCount > 0) {
-                    actionsWrapper.appendChild(ellipsisButton);
-                    document.body.appendChild(actionsDropdown); // Append dropdown to body for fixed positioning
+    function scheduleRender() {
+        if (renderScheduled) return;
+        renderScheduled = true;
+        requestAnimationFrame(() => {
+            renderScheduled = false;
+            renderVisibleRows();
+        });
+    }
 
-                    ellipsisButton.addEventListener('click', (e) => {
-                        e.stopPropagation(); 
-                        const isActive = actionsDropdown.classList.contains('active');
-                        
-                        // Always close all dropdowns first. This simplifies state management.
-                        closeAllDropdowns(); 
-                        
-                        if (!isActive) { // If it wasn't active, we are opening it.
-                            const buttonRect = ellipsisButton.getBoundingClientRect();
-                            // Position dropdown: attempt to position above, then to left, then below.
-                            let top = buttonRect.top - actionsDropdown.offsetHeight - 5; // 5px margin
-                            let left = buttonRect.left;
-
-                            // Check if it goes off-screen top
-                            if (top < 0) {
-                                top = buttonRect.bottom + 5;
-                            }
-                            // Check if it goes off-screen right
-                            if (left + actionsDropdown.offsetWidth > window.innerWidth) {
-                                left = window.innerWidth - actionsDropdown.offsetWidth - 5; // 5px margin from edge
-                            }
-                             // Check if it goes off-screen left
-                            if (left < 0) {
-                                left = 5; // 5px margin from edge
-                            }
+    if (fileListContainer) fileListContainer.addEventListener('scroll', scheduleRender);
+    window.addEventListener('resize', scheduleRender);
 
-                            actionsDropdown.style.left = `${left}px`;
-                            actionsDropdown.style.top = `${top}px`;
-                            
-                            ellipsisButton.innerHTML = '<i class="fas fa-times"></i>';
-                            actionsDropdown.classList.add('active');
-                            actionsDropdown._associatedButton = ellipsisButton; // Store reference
-                        }
-                        // If it *was* active, closeAllDropdowns already handled it (and reset its icon).
-                    });
-                    itemElement.appendChild(actionsWrapper);
-                } else {
-                    itemElement.appendChild(actionsWrapper); 
-                }
+    // Builds the <li> of one listing entry (also used to patch single entries from file_changed events)
+    function createFileItemElement(item) {
+        const itemElement = document.createElement('li');
+        itemElement.className = item.type === 'directory' ? 'folder-item' : 'file-item';
+        itemElement.dataset.path = item.path;
+        itemElement.dataset.name = item.name;
+        itemElement.dataset.type = item.type;
+        if (selectedItems.has(item.path)) { // Re-apply 'selected' class if item is in selection set
+            itemElement.classList.add('selected');
+        }
 
-                // Handle single and double clicks differently
-                let clickTimer = null;
-                itemElement.addEventListener('click', function(e) {
-                    if (e.target.type === 'checkbox' || e.target.closest('.ellipsis-button') || e.target.closest('.actions-dropdown')) {
-                        return; 
-                    }
-                    
-                    const isCtrlOrMeta = e.ctrlKey || e.metaKey;
-                    
-                    if (isCheckboxSelectModeActive || isCtrlOrMeta) {
-                        // If using Ctrl/Cmd and not in select mode, enable it
-                        if (!isCheckboxSelectModeActive && isCtrlOrMeta) {
-                            isCheckboxSelectModeActive = true;
-                            toggleSelectModeButton.classList.add('active');
-                            toggleSelectModeButton.innerHTML = '<i class="fas fa-mouse-pointer"></i> Click Mode';
-                            updateButtonVisibility();
-                            // Instead of reloading which loses context, just add checkboxes dynamically
-                            document.querySelectorAll('.file-item, .folder-item:not(.navigation-item)').forEach(item => {
-                                if (!item.querySelector('.item-checkbox')) {
-                                    const itemDetails = item.querySelector('.item-details');
-                                    if (itemDetails) {
-                                        const checkbox = document.createElement('input');
-                                        checkbox.type = 'checkbox';
-                                        checkbox.className = 'item-checkbox';
-                                        checkbox.dataset.path = item.dataset.path;
-                                        checkbox.checked = selectedItems.has(item.dataset.path);
-                                        checkbox.addEventListener('click', (e) => {
-                                            e.stopPropagation();
-                                            toggleItemSelectionState(item, item.dataset.path, checkbox.checked);
-                                        });
-                                        // Insert checkbox as first child of itemDetails
-                                        itemDetails.insertBefore(checkbox, itemDetails.firstChild);
-                                    }
-                                }
-                            });
-                        }
-                        // Toggle selection state of clicked item
-                        toggleItemSelectionState(itemElement, item.path, !selectedItems.has(item.path));
-                        updateSelectionControls();
-                    } else {
-                        // Single click without Ctrl/Meta and not in checkbox mode: just select
-                        clearAllSelections();
-                        toggleItemSelectionState(itemElement, item.path, true);
-                        updateSelectionControls();
-                    }
-                });
+        const itemDetails = document.createElement('div');
+        itemDetails.className = 'item-details';
+
+        // Add checkbox if in select mode
+        if (isCheckboxSelectModeActive) {
+            const checkbox = document.createElement('input');
+            checkbox.type = 'checkbox';
+            checkbox.className = 'item-checkbox';
+            checkbox.dataset.path = item.path;
+            checkbox.checked = selectedItems.has(item.path);
+            checkbox.addEventListener('click', (e) => {
+                e.stopPropagation(); // Prevent item click event when clicking checkbox
+                toggleItemSelectionState(itemElement, item.path, checkbox.checked);
+            });
+            itemDetails.appendChild(checkbox);
+        }
+
+        const icon = document.createElement('i');
+        const iconClass = item.type === 'directory' ? 'fa-folder' : getFileIcon(item.name);
+        icon.className = `item-icon fas ${iconClass}`;
+        itemDetails.appendChild(icon);
+
+        const nameSpan = document.createElement('span');
+        nameSpan.className = 'item-name';
+        nameSpan.textContent = item.name;
+        itemDetails.appendChild(nameSpan);
+        itemElement.appendChild(itemDetails);
+
+        const actionsWrapper = document.createElement('div');
+        actionsWrapper.className = 'file-item-actions-wrapper';
+        const ellipsisButton = document.createElement('button');
+        ellipsisButton.className = 'ellipsis-button';
+        ellipsisButton.innerHTML = '<i class="fas fa-ellipsis-v"></i>';
+        const actionsDropdown = document.createElement('div');
+        actionsDropdown.className = 'actions-dropdown';
+
+        // --- RENAME --- 
+        const renameButton = document.createElement('button');
+        renameButton.innerHTML = '<i class="fas fa-edit"></i> Rename';
+        renameButton.onclick = (e) => { 
+            e.stopPropagation(); 
+            closeAllDropdowns();
+            renameItem(item.path, item.name, item.type, itemElement); 
+        };
+        actionsDropdown.appendChild(renameButton);
+
+        // --- DOWNLOAD (for files) / OPEN (for folders) --- 
+        if (item.type === 'file') {
+            const downloadButton = document.createElement('button');
+            downloadButton.innerHTML = '<i class="fas fa-download"></i> Download';
+            downloadButton.onclick = (e) => {
+                e.stopPropagation();
+                closeAllDropdowns();
+                downloadFile(item.path, true);
+            };
+            actionsDropdown.appendChild(downloadButton);
+        } else if (item.type === 'directory') {
+            const openButton = document.createElement('button');
+            openButton.innerHTML = '<i class="fas fa-folder-open"></i> Open';
+            openButton.onclick = (e) => {
+                e.stopPropagation();
+                closeAllDropdowns();
+                loadFiles(item.path);
+            };
+            actionsDropdown.appendChild(openButton);
+        }
+
+        // --- DELETE --- 
+        const deleteButton = document.createElement('button');
+        deleteButton.innerHTML = '<i class="fas fa-trash-alt"></i> Delete';
+        deleteButton.onclick = (e) => {
+            e.stopPropagation();
+            closeAllDropdowns();
+            deleteItem(item.path, item.name, item.type);
+        };
+        actionsDropdown.appendChild(deleteButton);
+
+        // --- EXTRACT (for archive files) ---
+        if (item.type === 'file' && isArchive(item.name)) {
+            const extractButton = document.createElement('button');
+            extractButton.innerHTML = '<i class="fas fa-file-archive"></i> Extract';
+            extractButton.onclick = (e) => {
+                e.stopPropagation();
+                closeAllDropdowns();
+                showExtractModal(item.path);
+            };
+            actionsDropdown.appendChild(extractButton);
+        }
+
+        if (actionsDropdown.childElementCount > 0) {
+            actionsWrapper.appendChild(ellipsisButton);
+            document.body.appendChild(actionsDropdown); // Append dropdown to body for fixed positioning
+            itemElement._actionsDropdown = actionsDropdown; // So removeRowElement() can drop it too
 
-                // Handle double-click to open
-                itemElement.addEventListener('dblclick', function(e) {
-                    if (e.target.type === 'checkbox' || e.target.closest('.ellipsis-button') || e.target.closest('.actions-dropdown')) {
-                        return; 
+            ellipsisButton.addEventListener('click', (e) => {
+                e.stopPropagation(); 
+                const isActive = actionsDropdown.classList.contains('active');
+                
+                // Always close all dropdowns first. This simplifies state management.
+                closeAllDropdowns(); 
+                
+                if (!isActive) { // If it wasn't active, we are opening it.
+                    const buttonRect = ellipsisButton.getBoundingClientRect();
+                    // Position dropdown: attempt to position above, then to left, then below.
+                    let top = buttonRect.top - actionsDropdown.offsetHeight - 5; // 5px margin
+                    let left = buttonRect.left;
+
+                    // Check if it goes off-screen top
+                    if (top < 0) {
+                        top = buttonRect.bottom + 5;
                     }
-                    
-                    // Clear the single-click timer if it exists
-                    if (clickTimer) {
-                        clearTimeout(clickTimer);
-                        clickTimer = null;
+                    // Check if it goes off-screen right
+                    if (left + actionsDropdown.offsetWidth > window.innerWidth) {
+                        left = window.innerWidth - actionsDropdown.offsetWidth - 5; // 5px margin from edge
                     }
-                    
-                    if (item.type === 'directory') {
-                        loadFiles(item.path);
-                    } else if (item.type === 'file') {
-                        // Log the preview intent first
-                        fetchAPI('/api/preview/intent', { 
-                            method: 'POST', 
-                            body: { path: item.path }
-                        });
-                        openFilePreview(item.path);
+                     // Check if it goes off-screen left
+                    if (left < 0) {
+                        left = 5; // 5px margin from edge
                     }
-                });
-                
-                // Drag and Drop specific logic for items
-                if (item.type === 'file') {
-                    itemElement.setAttribute('draggable', true);
-                    itemElement.addEventListener('dragstart', (e) => handleDragStart(e, item.path));
-                } else if (item.type === 'directory') {
-                    itemElement.setAttribute('draggable', true); 
-                    itemElement.addEventListener('dragstart', (e) => handleDragStart(e, item.path));
-                    itemElement.addEventListener('dragover', handleDragOver);
-                    itemElement.addEventListener('dragleave', handleDragLeave);
-                    itemElement.addEventListener('drop', (e) => handleDrop(e, item.path));
-                }
 
-                if (fileList) fileList.appendChild(itemElement);
+                    actionsDropdown.style.left = `${left}px`;
+                    actionsDropdown.style.top = `${top}px`;
+                    
+                    ellipsisButton.innerHTML = '<i class="fas fa-times"></i>';
+                    actionsDropdown.classList.add('active');
+                    actionsDropdown._associatedButton = ellipsisButton; // Store reference
+                }
+                // If it *was* active, closeAllDropdowns already handled it (and reset its icon).
             });
-            updateSelectionControls(); // Fixed function name - Initial update after loading
+            itemElement.appendChild(actionsWrapper);
         } else {
-            if (currentPathDisplay) currentPathDisplay.textContent = `/${currentDirectory}`;
-            if (fileList) fileList.innerHTML = '<p>Could not load files or directory is empty.</p>';
+            itemElement.appendChild(actionsWrapper); 
         }
-        closeFilePreview(); // Close preview when navigating
+
+        // Handle single and double clicks differently
+        let clickTimer = null;
+        itemElement.addEventListener('click', function(e) {
+            if (e.target.type === 'checkbox' || e.target.closest('.ellipsis-button') || e.target.closest('.actions-dropdown')) {
+                return; 
+            }
+            
+            const isCtrlOrMeta = e.ctrlKey || e.metaKey;
+            
+            if (isCheckboxSelectModeActive || isCtrlOrMeta) {
+                // If using Ctrl/Cmd and not in select mode, enable it
+                if (!isCheckboxSelectModeActive && isCtrlOrMeta) {
+                    isCheckboxSelectModeActive = true;
+                    toggleSelectModeButton.classList.add('active');
+                    toggleSelectModeButton.innerHTML = '<i class="fas fa-mouse-pointer"></i> Click Mode';
+                    updateButtonVisibility();
+                    // Instead of reloading which loses context, just add checkboxes dynamically
+                    document.querySelectorAll('.file-item, .folder-item:not(.navigation-item)').forEach(item => {
+                        if (!item.querySelector('.item-checkbox')) {
+                            const itemDetails = item.querySelector('.item-details');
+                            if (itemDetails) {
+                                const checkbox = document.createElement('input');
+                                checkbox.type = 'checkbox';
+                                checkbox.className = 'item-checkbox';
+                                checkbox.dataset.path = item.dataset.path;
+                                checkbox.checked = selectedItems.has(item.dataset.path);
+                                checkbox.addEventListener('click', (e) => {
+                                    e.stopPropagation();
+                                    toggleItemSelectionState(item, item.dataset.path, checkbox.checked);
+                                });
+                                // Insert checkbox as first child of itemDetails
+                                itemDetails.insertBefore(checkbox, itemDetails.firstChild);
+                            }
+                        }
+                    });
+                }
+                // Toggle selection state of clicked item
+                toggleItemSelectionState(itemElement, item.path, !selectedItems.has(item.path));
+                updateSelectionControls();
+            } else {
+                // Single click without Ctrl/Meta and not in checkbox mode: just select
+                clearAllSelections();
+                toggleItemSelectionState(itemElement, item.path, true);
+                updateSelectionControls();
+            }
+        });
+
+        // Handle double-click to open
+        itemElement.addEventListener('dblclick', function(e) {
+            if (e.target.type === 'checkbox' || e.target.closest('.ellipsis-button') || e.target.closest('.actions-dropdown')) {
+                return; 
+            }
+            
+            // Clear the single-click timer if it exists
+            if (clickTimer) {
+                clearTimeout(clickTimer);
+                clickTimer = null;
+            }
+            
+            if (item.type === 'directory') {
+                loadFiles(item.path);
+            } else if (item.type === 'file') {
+                // Log the preview intent first
+                fetchAPI('/api/preview/intent', { 
+                    method: 'POST', 
+                    body: { path: item.path }
+                });
+                openFilePreview(item.path);
+            }
+        });
+        
+        // Drag and Drop specific logic for items
+        if (item.type === 'file') {
+            itemElement.setAttribute('draggable', true);
+            itemElement.addEventListener('dragstart', (e) => handleDragStart(e, item.path));
+        } else if (item.type === 'directory') {
+            itemElement.setAttribute('draggable', true); 
+            itemElement.addEventListener('dragstart', (e) => handleDragStart(e, item.path));
+            itemElement.addEventListener('dragover', handleDragOver);
+            itemElement.addEventListener('dragleave', handleDragLeave);
+            itemElement.addEventListener('drop', (e) => handleDrop(e, item.path));
+        }
+
+        return itemElement;
+    }
+
+    // Drops a materialized row (and its actions menu, which lives in <body>); the entry stays in the model
+    function removeRowElement(itemElement) {
+        if (itemElement._actionsDropdown) itemElement._actionsDropdown.remove();
+        if (currentRenameOperation && currentRenameOperation.path === itemElement.dataset.path) {
+            currentRenameOperation.cancel();
+        }
+        itemElement.remove();
+    }
+
+    // Same order as the server's default listing: folders first, then by name (case-insensitive)
+    function compareListingEntries(a, b) {
+        if (a.type !== b.type) return a.type === 'directory' ? -1 : 1;
+        const nameA = a.name.toLowerCase();
+        const nameB = b.name.toLowerCase();
+        if (nameA !== nameB) return nameA < nameB ? -1 : 1;
+        return a.name < b.name ? -1 : (a.name > b.name ? 1 : 0);
+    }
+
+    // Applies a file_changed delta for the current directory to the model, without reloading the listing
+    function applyListingDelta(upserted, removed) {
+        const changed = new Set(removed.concat(upserted.map(item => item.name)));
+        const removedPaths = listingItems.filter(item => changed.has(item.name)).map(item => item.path);
+        listingItems = listingItems.filter(item => !changed.has(item.name));
+        removedPaths.forEach(itemPath => {
+            const row = renderedRows.get(itemPath);
+            if (row) {
+                removeRowElement(row);
+                renderedRows.delete(itemPath);
+            }
+        });
+        removed.forEach(name => {
+            listingNames.delete(name);
+            selectedItems.delete(currentDirectory ? `${currentDirectory}/${name}` : name);
+        });
+
+        upserted.forEach(item => {
+            // Binary search for the insert position
+            let low = 0;
+            let high = listingItems.length;
+            while (low < high) {
+                const mid = (low + high) >> 1;
+                if (compareListingEntries(listingItems[mid], item) < 0) low = mid + 1;
+                else high = mid;
+            }
+            if (low === listingItems.length && listingCursor) {
+                // Beyond the pages loaded so far: a later page will bring it
+                listingNames.delete(item.name);
+                return;
+            }
+            listingItems.splice(low, 0, item);
+            listingNames.add(item.name);
+        });
+        renderVisibleRows();
+        updateSelectionControls();
     }
 
     // --- Item Selection ---
@@ -453,19 +669,9 @@ document.addEventListener('DOMContentLoaded', () => {
             const files = event.target.files;
             if (files.length === 0) return;
 
-            if (files.length > 5) {
-                showToast('You can upload a maximum of 5 files at a time.', 'error');
-                fileUploadInput.value = '';
-                return;
-            }
-
             if (uploadProgressArea) uploadProgressArea.innerHTML = ''; // Clear previous progress bars
 
-            // Use the new upload system for all files
-            for (let i = 0; i < files.length; i++) {
-                const file = files[i];
-                await uploadSingleFile(file);
-            }
+            handleFileUploads(Array.from(files));
 
             fileUploadInput.value = ''; // Reset input after initiating uploads
         });
@@ -1037,6 +1243,12 @@ document.addEventListener('DOMContentLoaded', () => {
     // Updates socket event handlers
     updatesSocket.on('connect', () => {
         console.log('Connected to /updates namespace');
+        // Rooms don't survive a reconnect, so rejoin the one of the directory on screen
+        if (currentDirectory !== undefined) {
+            updatesSocket.emit('watch_directory', { path: currentDirectory });
+        }
+        // The server is reachable again: resume uploads a dropped connection interrupted
+        pendingUploadResumes.splice(0).forEach(resume => resume());
     });
 
     updatesSocket.on('disconnect', (reason) => {
@@ -1086,54 +1298,32 @@ document.addEventListener('DOMContentLoaded', () => {
         console.log('Failed to reconnect to /logs:', error);
     });
 
+    updatesSocket.on('upload_job', (job) => {
+        const waiter = uploadJobWaiters.get(job.id);
+        if (waiter) waiter.settle(job);
+    });
+
     updatesSocket.on('user_count_update', (data) => {
         if (userCountDisplay) userCountDisplay.textContent = `Connected Users: ${data.count}`;
     });
 
     updatesSocket.on('file_changed', function(data) {
-        console.log('File change event received:', data);
-        
+        // The server only sends this socket changes to the directory it watches (see loadFiles),
+        // as deltas: 'upserted' entries and 'removed' names. 'refresh' means the directory itself
+        // was replaced or removed, 'rescan' that anything may have changed.
+        const currentPath = currentDirectory || '';
+        if (!data.rescan && data.directory !== currentPath) return; // Sent before we switched rooms
+
         if (data.external) {
-            // Show notification for external changes
-            showToast(`External change detected: ${data.action} - ${data.path || 'file'}`, 'info');
+            showToast(`External change detected in /${data.rescan ? '' : data.directory}`, 'info');
         }
-        
-        // Refresh the current directory if it's affected
-        let shouldRefresh = false;
-        const currentPath = currentDirectory || '';
-        
-        if (data.action === 'renamed' && data.old_path && data.new_path) {
-            // Check if the renamed item affects current view
-            const oldParent = data.old_path.includes('/') ? data.old_path.substring(0, data.old_path.lastIndexOf('/')) : '';
-            const newParent = data.new_path.includes('/') ? data.new_path.substring(0, data.new_path.lastIndexOf('/')) : '';
-            
-            if (oldParent === currentPath || newParent === currentPath) {
-                shouldRefresh = true;
-            }
-        } else if (data.action === 'batch_deleted' && data.paths) {
-            // For batch delete, check if any of the deleted items affects current view
-            for (const path of data.paths) {
-                const itemParent = path && path.includes('/') ? 
-                    path.substring(0, path.lastIndexOf('/')) : '';
-                
-                if (itemParent === currentPath || path === currentPath) {
-                    shouldRefresh = true;
-                    break; // No need to check further once we know we need to refresh
-                }
-            }
+        if (data.refresh && data.deleted) {
+            const parentPath = currentPath.includes('/') ? currentPath.substring(0, currentPath.lastIndexOf('/')) : '';
+            loadFiles(parentPath);
+        } else if (data.rescan || data.refresh) {
+            loadFiles(currentPath);
         } else {
-            // For other actions, check if the path affects current view
-            const itemParent = data.path && data.path.includes('/') ? 
-                data.path.substring(0, data.path.lastIndexOf('/')) : '';
-            
-            if (itemParent === currentPath || data.path === currentPath) {
-                shouldRefresh = true;
-            }
-        }
-        
-        if (shouldRefresh) {
-            console.log('Refreshing directory due to file change');
-            loadFiles(currentDirectory);
+            applyListingDelta(data.upserted || [], data.removed || []);
         }
     });
 
@@ -1150,6 +1340,12 @@ document.addEventListener('DOMContentLoaded', () => {
         addLogEntry(log, true);
     });
 
+    // The server coalesces activity into one event per log flush (entries are oldest first)
+    logsSocket.on('new_activity_batch', (data) => {
+        if (!data || !data.entries) return;
+        data.entries.forEach(log => addLogEntry(log, true));
+    });
+
     function addLogEntry(log, prepend = false) {
         if (!activityLogList) return;
         const li = document.createElement('li');
@@ -1374,7 +1570,7 @@ document.addEventListener('DOMContentLoaded', () => {
         };
         cancelBtn.onclick = cleanup;
 
-        currentRenameOperation = { cancel: cleanup }; // Store cleanup function
+        currentRenameOperation = { cancel: cleanup, path: itemPath }; // Store cleanup function
     }
 
     async function loadArchiveContents(archiveFilePath) {
@@ -1540,28 +1736,23 @@ document.addEventListener('DOMContentLoaded', () => {
                 isCheckboxSelectModeActive = true;
                 toggleSelectModeButton.classList.add('active');
                 toggleSelectModeButton.innerHTML = '<i class="fas fa-mouse-pointer"></i> Click Mode';
-                loadFiles(currentDirectory); // Reload to show checkboxes
-                return; // Exit early, let the reload handle selection
+                renderVisibleRows(true); // Rebuild the visible rows to show checkboxes
+                return; // Exit early, select on the next click
             }
             
-            const allItemElements = fileList.querySelectorAll('.file-item, .folder-item:not(.navigation-item)');
-            const allCurrentlySelectedOnPage = Array.from(allItemElements).every(el => selectedItems.has(el.dataset.path));
-
-            if (allCurrentlySelectedOnPage && selectedItems.size >= allItemElements.length) {
-                // If all visible items are selected, deselect all *visible* items
-                allItemElements.forEach(itemEl => {
-                    if(selectedItems.has(itemEl.dataset.path)) {
-                        toggleItemSelectionState(itemEl, itemEl.dataset.path, false);
-                    }
-                });
-            } else {
-                // Otherwise, select all visible items
-                allItemElements.forEach(itemEl => {
-                    if(!selectedItems.has(itemEl.dataset.path)) {
-                         toggleItemSelectionState(itemEl, itemEl.dataset.path, true);
-                    }
-                });
-            }
+            // Selection lives in the model, so this covers rows that are not materialized too
+            const allCurrentlySelected = listingItems.every(item => selectedItems.has(item.path));
+            listingItems.forEach(item => {
+                if (allCurrentlySelected) selectedItems.delete(item.path);
+                else selectedItems.add(item.path);
+            });
+            renderedRows.forEach((row, rowPath) => {
+                const isSelected = selectedItems.has(rowPath);
+                row.classList.toggle('selected', isSelected);
+                const checkbox = row.querySelector('.item-checkbox');
+                if (checkbox) checkbox.checked = isSelected;
+            });
+            updateSelectionControls();
         });
     }
 
@@ -1573,7 +1764,7 @@ document.addEventListener('DOMContentLoaded', () => {
         }
     }
 
-    function createUploadProgressItem(fileName, fileSize = null) {
+    function createUploadProgressItem(fileName, fileSize = null, directory = currentDirectory) {
         const fileId = `upload-${Date.now()}-${Math.random().toString(36).substr(2, 9)}`;
         
         // Create progress bar elements for this file
@@ -1583,7 +1774,7 @@ document.addEventListener('DOMContentLoaded', () => {
         
         const fileInfoSpan = document.createElement('span');
         fileInfoSpan.classList.add('file-info');
-        const displayPath = currentDirectory || '/';
+        const displayPath = directory || '/';
         const fileInfo = fileSize ? `${fileName} (${formatBytes(fileSize)})` : fileName;
         fileInfoSpan.textContent = `${fileInfo} → ${displayPath}`;
 
@@ -1702,10 +1893,55 @@ document.addEventListener('DOMContentLoaded', () => {
         }, false);
     }
 
-    function handleFiles(e) {
-        const dt = e.dataTransfer;
-        const files = dt.files;
-        handleFileUploads(files);
+    async function handleFiles(e) {
+        const uploadDirectory = currentDirectory;
+        const { files, layout } = await collectDroppedFiles(e.dataTransfer);
+        handleFileUploads(files, uploadDirectory, layout);
+    }
+
+    // Files of a drop, with dropped folders walked so their structure can be recreated on the
+    // server: layout.directories maps each file to its folder (relative, sanitized like the
+    // server's secure_filename), layout.emptyFolders lists folders without files
+    async function collectDroppedFiles(dataTransfer) {
+        // Entries must be taken before the drop handler yields; the DataTransfer is emptied then
+        const entries = Array.from(dataTransfer.items || [])
+            .filter(item => item.kind === 'file')
+            .map(item => item.webkitGetAsEntry ? item.webkitGetAsEntry() : null);
+        if (entries.length === 0 || entries.some(entry => !entry)) {
+            return { files: Array.from(dataTransfer.files), layout: null };
+        }
+
+        const files = [];
+        const layout = { directories: new Map(), emptyFolders: [] };
+        const walk = async (entry, folder) => {
+            if (entry.isFile) {
+                const file = await new Promise((resolve, reject) => entry.file(resolve, reject));
+                files.push(file);
+                layout.directories.set(file, folder);
+                return;
+            }
+            const path = joinUploadPath(folder, secureFilename(entry.name) || 'folder');
+            const reader = entry.createReader();
+            const children = [];
+            // readEntries() returns a directory's entries in portions, until an empty one
+            for (;;) {
+                const portion = await new Promise((resolve, reject) => reader.readEntries(resolve, reject));
+                if (portion.length === 0) break;
+                children.push(...portion);
+            }
+            if (children.length === 0) layout.emptyFolders.push(path);
+            for (const child of children) {
+                await walk(child, path);
+            }
+        };
+        try {
+            for (const entry of entries) {
+                await walk(entry, '');
+            }
+        } catch (error) {
+            showToast(`Could not read the dropped folder: ${error.message}`, 'error');
+        }
+        return { files, layout };
     }
 
     // Add missing drag and drop handlers for file/directory items
@@ -1786,160 +2022,343 @@ document.addEventListener('DOMContentLoaded', () => {
         }
     }
 
-    // Global upload configuration cache
-    let uploadConfig = null;
-
+    // Fetched once per upload batch, so uploads start from the server's current load
     async function getUploadConfig() {
-        if (!uploadConfig) {
-            try {
-                const response = await fetchAPI('/api/upload/config');
-                uploadConfig = response;
-            } catch (error) {
-                console.warn('Failed to get upload config, using defaults:', error);
-                            uploadConfig = {
-                chunked_upload_enabled: true,
-                chunk_size_mb: 10,
-                max_concurrent_chunks: 3,
-                max_file_size_gb: 8
-            };
-            }
+        const config = await fetchAPI('/api/upload/config');
+        if (config) return config;
+        console.warn('Failed to get upload config, using defaults');
+        return {
+            chunked_upload_enabled: true,
+            chunk_size_mb: 10,
+            max_concurrent_chunks: 3,
+            max_file_size_gb: 8
+        };
+    }
+
+    // Every upload request (a standard upload, or one request of a chunked upload) holds one of
+    // UPLOAD_CONNECTION_BUDGET connections while it is in flight, whatever file or batch it belongs to
+    function acquireUploadConnection() {
+        if (activeUploadConnections < UPLOAD_CONNECTION_BUDGET) {
+            activeUploadConnections++;
+            return Promise.resolve();
         }
-        return uploadConfig;
+        return new Promise(resolve => uploadConnectionWaiters.push(resolve));
     }
 
-    async function handleFileUploads(files) {
-        for (const file of files) {
-            await uploadSingleFile(file);
+    function releaseUploadConnection() {
+        const next = uploadConnectionWaiters.shift();
+        if (next) {
+            next(); // Handed over, the count stays the same
+        } else {
+            activeUploadConnections--;
         }
     }
 
-    async function uploadSingleFile(file) {
+    // Uploads a batch of files (one drop or file selection) several at a time, smallest first,
+    // with the upload config fetched once for the whole batch. `layout` (see collectDroppedFiles)
+    // places the files of dropped folders.
+    async function handleFileUploads(files, uploadDirectory = currentDirectory, layout = null) {
+        files = Array.from(files);
+        const emptyFolders = layout ? layout.emptyFolders : [];
+        if (files.length === 0 && emptyFolders.length === 0) return;
         const config = await getUploadConfig();
+        const batch = createUploadBatch(files, uploadDirectory, layout);
+
+        // Small files first: most of a large drop is done early, and big files don't hold up the rest
+        const queue = files.slice().sort((a, b) => a.size - b.size);
+        let smallFiles = queue.findIndex(file => file.size > UPLOAD_BUNDLE_FILE_MAX_BYTES);
+        if (smallFiles === -1) smallFiles = queue.length;
+
+        // Several small files travel in bundles instead of a request each
+        const items = [];
+        if (smallFiles > 1 || emptyFolders.length > 0) {
+            let bundle = null;
+            for (const file of queue.slice(0, smallFiles)) {
+                if (!bundle || bundle.files.length >= UPLOAD_BUNDLE_MAX_FILES || bundle.bytes + file.size > UPLOAD_BUNDLE_MAX_BYTES) {
+                    bundle = { files: [], bytes: 0, folders: [] };
+                    items.push(bundle);
+                }
+                bundle.files.push(file);
+                bundle.bytes += file.size;
+            }
+            if (items.length === 0) items.push({ files: [], bytes: 0, folders: [] });
+            // Empty folders count as bundle entries too: they fill the first bundle, then bundles of their own
+            let folderCount = UPLOAD_BUNDLE_MAX_FILES - items[0].files.length;
+            items[0].folders = emptyFolders.slice(0, folderCount);
+            for (; folderCount < emptyFolders.length; folderCount += UPLOAD_BUNDLE_MAX_FILES) {
+                items.push({ files: [], bytes: 0, folders: emptyFolders.slice(folderCount, folderCount + UPLOAD_BUNDLE_MAX_FILES) });
+            }
+            items.push(...queue.slice(smallFiles));
+        } else {
+            items.push(...queue);
+        }
+
+        let next = 0;
+        const uploadQueued = async () => {
+            while (next < items.length && !batch.cancelled) {
+                const item = items[next++];
+                if (item instanceof Blob) {
+                    await uploadSingleFile(item, config, batch);
+                } else {
+                    await uploadBundle(item, batch);
+                }
+            }
+        };
+        const parallelFiles = Math.min(UPLOAD_CONNECTION_BUDGET, items.length);
+        await Promise.all(Array.from({ length: parallelFiles }, uploadQueued));
+        batch.finish();
+    }
+
+    // Aggregate progress of a batch. A batch of several files gets one progress row for all of them
+    // (small files get no row of their own) and one toast and listing refresh at the end.
+    function createUploadBatch(files, directory, layout = null) {
+        const multiple = files.length > 1;
+        const totalBytes = files.reduce((sum, file) => sum + file.size, 0);
+        const loadedBytes = new Map(); // file -> bytes sent so far
+        const outcomes = { done: 0, failed: 0, interrupted: 0, cancelled: 0 };
+        const failedNames = [];
+        const startTime = Date.now();
+        let uploadedBytes = 0;
+        let renderQueued = false;
+
+        const progressItem = multiple ? createUploadProgressItem(`${files.length} files`, totalBytes, directory) : null;
+        const progressBar = progressItem && progressItem.querySelector('.progress-bar');
+        const progressText = progressItem && progressItem.querySelector('.progress-text');
+        const uploadSpeed = progressItem && progressItem.querySelector('.upload-speed');
+        const endedFiles = () => outcomes.done + outcomes.failed + outcomes.interrupted + outcomes.cancelled;
+
+        // At most once per frame, however many requests report progress
+        const render = () => {
+            if (!progressItem || renderQueued) return;
+            renderQueued = true;
+            requestAnimationFrame(() => {
+                renderQueued = false;
+                const percent = totalBytes > 0 ? uploadedBytes / totalBytes * 100 : 0;
+                progressBar.style.width = percent + '%';
+                progressText.textContent = `${endedFiles()} of ${files.length} files, ${Math.round(percent)}%`;
+                const elapsedTime = (Date.now() - startTime) / 1000;
+                if (elapsedTime > 0) {
+                    uploadSpeed.textContent = `${formatBytes(uploadedBytes / elapsedTime)}/s`;
+                }
+            });
+        };
+
+        const batch = {
+            directory,
+            multiple,
+            cancelled: false,
+            // Where a file goes: the batch's directory, or the folder it had in a dropped folder below it
+            directoryOf(file) {
+                return layout ? joinUploadPath(directory, layout.directories.get(file)) : directory;
+            },
+            setLoaded(file, bytes) {
+                uploadedBytes += bytes - (loadedBytes.get(file) || 0);
+                loadedBytes.set(file, bytes);
+                render();
+            },
+            // outcome: 'done', 'failed', 'interrupted' (resumes on reconnect) or 'cancelled'
+            fileEnded(file, outcome, message = '') {
+                outcomes[outcome]++;
+                if (outcome === 'failed') failedNames.push(file.name);
+                if (!multiple && outcome === 'done') {
+                    showToast(`File "${file.name}" uploaded successfully.`, 'success');
+                } else if (!multiple && outcome === 'failed') {
+                    showToast(`Failed to upload "${file.name}": ${message}`, 'error');
+                }
+                render();
+            },
+            finish() {
+                if (currentDirectory === directory) {
+                    loadFiles(currentDirectory);
+                }
+                if (!multiple) return;
+
+                if (batch.cancelled) {
+                    showToast(`Upload stopped, ${outcomes.done} of ${files.length} files uploaded.`, 'warning');
+                    return;
+                }
+                progressBar.style.width = '100%';
+                if (outcomes.failed > 0) {
+                    const names = failedNames.slice(0, 5).join(', ') + (failedNames.length > 5 ? ', ...' : '');
+                    progressText.textContent = `${outcomes.done} of ${files.length} files uploaded`;
+                    progressBar.style.backgroundColor = 'var(--error-color)';
+                    showToast(`Failed to upload ${outcomes.failed} of ${files.length} files: ${names}`, 'error');
+                } else if (outcomes.interrupted > 0) {
+                    progressText.textContent = `${outcomes.interrupted} files will resume when reconnected`;
+                    progressBar.style.backgroundColor = 'var(--warning-color, orange)';
+                } else {
+                    progressText.textContent = 'Upload complete!';
+                    progressBar.style.backgroundColor = 'var(--success-color)';
+                    showToast(`${outcomes.done} files uploaded successfully.`, 'success');
+                    hideUploadProgressItem(progressItem);
+                }
+            }
+        };
+
+        if (progressItem) {
+            // Closing the batch row stops files that haven't started; running uploads finish
+            const closeButton = progressItem.querySelector('.upload-progress-close');
+            const originalCloseHandler = closeButton.onclick;
+            closeButton.onclick = () => {
+                batch.cancelled = true;
+                originalCloseHandler();
+            };
+        }
+        return batch;
+    }
+
+    function hideUploadProgressItem(progressItem) {
+        // Auto-hide after 5 seconds
+        setTimeout(() => {
+            progressItem.style.transition = 'opacity 1s ease';
+            progressItem.style.opacity = '0';
+            setTimeout(() => {
+                if (progressItem.parentNode) {
+                    progressItem.parentNode.removeChild(progressItem);
+                }
+            }, 1000);
+        }, 5000);
+    }
+
+    // Resolves once the file is uploaded, has failed or was interrupted
+    async function uploadSingleFile(file, config, batch) {
         const chunkSizeBytes = config.chunk_size_mb * 1024 * 1024;
         const maxFileSizeBytes = config.max_file_size_gb * 1024 * 1024 * 1024;
         
         // Check file size limit
         if (file.size > maxFileSizeBytes) {
             const fileSizeGB = (file.size / (1024 * 1024 * 1024)).toFixed(2);
-            showToast(`File "${file.name}" (${fileSizeGB}GB) exceeds maximum allowed size of ${config.max_file_size_gb}GB.`, 'error');
+            batch.fileEnded(file, 'failed', `File (${fileSizeGB}GB) exceeds maximum allowed size of ${config.max_file_size_gb}GB.`);
             return;
         }
         
         // Use chunked upload for large files or if chunked upload is enabled
         if (config.chunked_upload_enabled && file.size > chunkSizeBytes) {
-            await uploadFileInChunks(file, config);
+            await uploadFileInChunks(file, config, batch);
         } else {
-            await uploadFileStandard(file);
+            await uploadFileStandard(file, config, batch);
         }
     }
 
-    async function uploadFileStandard(file) {
-        const uploadDirectory = currentDirectory; // Capture directory at upload start
-        const formData = new FormData();
-        formData.append('file', file);
-        formData.append('path', uploadDirectory);
+    async function uploadFileStandard(file, config, batch) {
+        const uploadParams = new URLSearchParams({ filename: file.name, path: batch.directoryOf(file) });
+        if (file.size <= STANDARD_UPLOAD_HASH_MAX_BYTES) {
+            const checksum = await hashBlob(file, config.checksum_algorithm); // Server rejects the upload if it differs
+            if (checksum) uploadParams.set('checksum', checksum);
+        }
 
-        // Create progress indicator
-        const progressItem = createUploadProgressItem(file.name, file.size);
-        const progressBar = progressItem.querySelector('.progress-bar');
-        const progressText = progressItem.querySelector('.progress-text');
-        const uploadSpeed = progressItem.querySelector('.upload-speed');
+        // Create progress indicator (in a batch of several files, the batch's row covers this one)
+        const progressItem = batch.multiple ? null : createUploadProgressItem(file.name, file.size, batch.directoryOf(file));
+        const progressBar = progressItem && progressItem.querySelector('.progress-bar');
+        const progressText = progressItem && progressItem.querySelector('.progress-text');
+        const uploadSpeed = progressItem && progressItem.querySelector('.upload-speed');
 
+        await acquireUploadConnection();
         try {
-            const xhr = new XMLHttpRequest();
-            
-            // Track upload progress
-            xhr.upload.addEventListener('progress', (e) => {
-                if (e.lengthComputable) {
-                    const percentComplete = (e.loaded / e.total) * 100;
-                    progressBar.style.width = percentComplete + '%';
-                    progressText.textContent = `${Math.round(percentComplete)}%`;
-                    
-                    // Calculate upload speed
-                    const uploadSpeedValue = (e.loaded / 1024 / 1024).toFixed(2); // MB
-                    uploadSpeed.textContent = `${uploadSpeedValue} MB uploaded`;
-                }
-            });
-
-            // Handle upload completion
-            xhr.addEventListener('load', () => {
-                if (xhr.status === 200) {
-                    const response = JSON.parse(xhr.responseText);
-                    if (response.success) {
-                        progressText.textContent = 'Upload complete!';
-                        progressBar.style.backgroundColor = 'var(--success-color)';
-                        showToast(`File "${file.name}" uploaded successfully.`, 'success');
-                        
-                        // Refresh file list to show the new file if we're still in the upload directory
-                        if (currentDirectory === uploadDirectory) {
-                            loadFiles(currentDirectory);
-                        }
+            const response = await new Promise((resolve, reject) => {
+                const xhr = new XMLHttpRequest();
+                
+                // Track upload progress
+                xhr.upload.addEventListener('progress', (e) => {
+                    if (e.lengthComputable) {
+                        batch.setLoaded(file, e.loaded);
+                        if (!progressItem) return;
+                        const percentComplete = (e.loaded / e.total) * 100;
+                        progressBar.style.width = percentComplete + '%';
+                        progressText.textContent = `${Math.round(percentComplete)}%`;
                         
-                        // Auto-hide after 5 seconds
-                        setTimeout(() => {
-                            progressItem.style.transition = 'opacity 1s ease';
-                            progressItem.style.opacity = '0';
-                            setTimeout(() => {
-                                if (progressItem.parentNode) {
-                                    progressItem.parentNode.removeChild(progressItem);
-                                }
-                            }, 1000);
-                        }, 5000);
-                    } else {
-                        throw new Error(response.error || 'Upload failed');
+                        // Calculate upload speed
+                        const uploadSpeedValue = (e.loaded / 1024 / 1024).toFixed(2); // MB
+                        uploadSpeed.textContent = `${uploadSpeedValue} MB uploaded`;
                     }
-                } else {
-                    throw new Error('Upload failed');
-                }
-            });
+                });
 
-            // Handle upload errors
-            xhr.addEventListener('error', () => {
-                progressText.textContent = 'Upload failed!';
-                progressBar.style.backgroundColor = 'var(--error-color)';
-                showToast(`Failed to upload "${file.name}".`, 'error');
-                
-                // Auto-hide after 5 seconds
-                setTimeout(() => {
-                    progressItem.style.transition = 'opacity 1s ease';
-                    progressItem.style.opacity = '0';
-                    setTimeout(() => {
-                        if (progressItem.parentNode) {
-                            progressItem.parentNode.removeChild(progressItem);
-                        }
-                    }, 1000);
-                }, 5000);
+                // Handle upload completion
+                xhr.addEventListener('load', () => {
+                    try {
+                        resolve(JSON.parse(xhr.responseText));
+                    } catch (e) {
+                        reject(new Error(`HTTP ${xhr.status}: ${xhr.statusText}`));
+                    }
+                });
+                xhr.addEventListener('error', () => reject(new Error('Network error')));
+
+                // Send the request
+                // Raw body: streamed to disk by the server without a multipart spool
+                xhr.open('POST', `/api/upload?${uploadParams}`);
+                xhr.setRequestHeader('Content-Type', 'application/octet-stream');
+                xhr.send(file);
             });
+            if (!response.success) {
+                throw new Error(response.error || 'Upload failed');
+            }
 
-            // Send the request
-            xhr.open('POST', '/api/upload');
-            xhr.send(formData);
-            
+            batch.setLoaded(file, file.size);
+            batch.fileEnded(file, 'done');
+            if (progressItem) {
+                progressText.textContent = 'Upload complete!';
+                progressBar.style.backgroundColor = 'var(--success-color)';
+                hideUploadProgressItem(progressItem);
+            }
         } catch (error) {
-            progressText.textContent = 'Upload failed!';
-            progressBar.style.backgroundColor = 'var(--error-color)';
-            showToast(`Failed to upload "${file.name}": ${error.message}`, 'error');
+            batch.setLoaded(file, 0);
+            batch.fileEnded(file, 'failed', error.message);
+            if (progressItem) {
+                progressText.textContent = 'Upload failed!';
+                progressBar.style.backgroundColor = 'var(--error-color)';
+                hideUploadProgressItem(progressItem);
+            }
+        } finally {
+            releaseUploadConnection();
         }
     }
 
-    async function uploadFileInChunks(file, config) {
-        const uploadDirectory = currentDirectory; // Capture directory at upload start
-        const chunkSizeBytes = config.chunk_size_mb * 1024 * 1024;
+    async function uploadFileInChunks(file, config, batch) {
+        const uploadDirectory = batch.directoryOf(file);
+        // The server tracks the upload in chunks of the smallest request size; each request carries
+        // as many consecutive chunks as the rate controller currently asks for
+        const chunkSizeBytes = (config.min_chunk_size_mb || config.chunk_size_mb) * 1024 * 1024;
         const totalChunks = Math.ceil(file.size / chunkSizeBytes);
-        const uploadId = generateUploadId();
         let uploadCancelled = false;
 
+        // The same file going to the same folder reuses its upload id, so an upload interrupted
+        // by a reload, a dropped connection or a server restart resumes where it stopped
+        const resumeKey = `${UPLOAD_RESUME_KEY_PREFIX}${uploadDirectory}/${file.name}:${file.size}:${file.lastModified}`;
+        let uploadId = localStorage.getItem(resumeKey);
+        let resumeStatus = uploadId ? await getUploadStatus(uploadId) : null;
+        if (resumeStatus && !resumeStatus.completed && !resumeStatus.finalizing &&
+                (resumeStatus.chunk_size !== chunkSizeBytes || resumeStatus.total_chunks !== totalChunks)) {
+            resumeStatus = null; // Chunk size changed in the config meanwhile; start over
+        }
+        if (!resumeStatus) {
+            uploadId = generateUploadId();
+            localStorage.setItem(resumeKey, uploadId);
+        }
+
         // Create progress indicator
-        const progressItem = createUploadProgressItem(file.name, file.size);
+        const progressItem = createUploadProgressItem(file.name, file.size, uploadDirectory);
         const progressBar = progressItem.querySelector('.progress-bar');
         const progressText = progressItem.querySelector('.progress-text');
         const uploadSpeed = progressItem.querySelector('.upload-speed');
         const closeButton = progressItem.querySelector('.upload-progress-close');
 
+        // The upload's outcome goes to the batch exactly once; it is over for the scheduler from then on
+        let resolveFinished;
+        const finished = new Promise(resolve => { resolveFinished = resolve; });
+        let ended = false;
+        const endUpload = (outcome, message) => {
+            if (ended) return;
+            ended = true;
+            batch.fileEnded(file, outcome, message);
+            resolveFinished();
+        };
+
         // Add cancel functionality
         const originalCloseHandler = closeButton.onclick;
         closeButton.onclick = async () => {
             uploadCancelled = true;
+            endUpload('cancelled');
+            localStorage.removeItem(resumeKey);
             try {
                 await fetchAPI('/api/upload/cancel', {
                     method: 'POST',
@@ -1954,72 +2373,167 @@ document.addEventListener('DOMContentLoaded', () => {
         const startTime = Date.now();
         const chunkBytesUploaded = new Array(totalChunks).fill(0); // Track bytes uploaded per chunk
 
+        const completeUpload = () => {
+            localStorage.removeItem(resumeKey);
+            progressBar.style.width = '100%';
+            progressText.textContent = 'Upload complete!';
+            progressBar.style.backgroundColor = 'var(--success-color)';
+            batch.setLoaded(file, file.size);
+            endUpload('done');
+            hideUploadProgressItem(progressItem);
+        };
+
+        const failUpload = (message) => {
+            localStorage.removeItem(resumeKey);
+            progressText.textContent = 'Upload failed!';
+            progressBar.style.backgroundColor = 'var(--error-color)';
+            batch.setLoaded(file, 0);
+            endUpload('failed', message);
+        };
+
+        // Deduplication: the digests of all chunks go first, and chunks the server already holds
+        // (from earlier uploads, or repeated within this file) are copied there instead of sent
+        let chunkDigests = null;
+        if (config.dedup_enabled && !(resumeStatus && (resumeStatus.completed || resumeStatus.finalizing))) {
+            chunkDigests = await hashFileChunks(file, chunkSizeBytes, totalChunks, config.checksum_algorithm, (done) => {
+                progressText.textContent = `Checking for existing data... ${Math.round(done / totalChunks * 100)}%`;
+            }, () => uploadCancelled);
+            if (uploadCancelled) return; // Ended by the close button
+            const dedupStatus = chunkDigests && await requestUploadDedup({
+                uploadId,
+                totalChunks,
+                filename: file.name,
+                path: uploadDirectory,
+                chunkSize: chunkSizeBytes,
+                fileSize: file.size,
+                chunkChecksums: chunkDigests
+            });
+            if (dedupStatus) resumeStatus = dedupStatus;
+        }
+
+        if (resumeStatus && (resumeStatus.completed || resumeStatus.finalizing)) {
+            // Every chunk reached the server before the interruption, or was there already
+            try {
+                if (resumeStatus.finalizing) await waitForUploadJob(resumeStatus.job_id);
+                completeUpload();
+            } catch (error) {
+                failUpload(error.message);
+            }
+            return;
+        }
+
         try {
-            // Create chunks and track concurrent uploads
-            const chunks = [];
+            // Chunks still to send (only the ones the server is missing when resuming), in file order
+            const missingChunks = resumeStatus ? new Set(resumeStatus.missing_chunks) : null;
+            const pendingChunks = [];
             for (let i = 0; i < totalChunks; i++) {
-                const start = i * chunkSizeBytes;
-                const end = Math.min(start + chunkSizeBytes, file.size);
-                chunks.push({ index: i, start, end });
+                if (missingChunks && !missingChunks.has(i)) {
+                    chunkBytesUploaded[i] = Math.min(chunkSizeBytes, file.size - i * chunkSizeBytes); // Already on the server
+                    continue;
+                }
+                pendingChunks.push(i);
+            }
+            if (resumeStatus) {
+                const resumedProgress = resumeStatus.chunks_received / totalChunks * 100;
+                progressBar.style.width = resumedProgress + '%';
+                progressText.textContent = resumeStatus.deduplicated
+                    ? `${resumeStatus.deduplicated} of ${totalChunks} chunks already on the server`
+                    : `Resuming at ${Math.round(resumedProgress)}%`;
             }
 
-            // Upload chunks with concurrency limit
-            const maxConcurrent = config.max_concurrent_chunks || 3;
+            // Chunk size and concurrency adapt to the link and the server's load while uploading
+            const rate = createUploadRateController(config);
             const activeUploads = new Set();
-            let chunkIndex = 0;
-            const chunksStatus = new Array(totalChunks).fill('pending'); // Track status of each chunk
-            const retryQueue = []; // Queue for chunks that need to be retried
+            let nextPending = 0;
+            const retryQueue = []; // Runs that need to be sent again
+
+            const updateSpeed = () => {
+                const totalUploadedBytes = chunkBytesUploaded.reduce((sum, bytes) => sum + bytes, 0);
+                batch.setLoaded(file, totalUploadedBytes);
+                const elapsedTime = (Date.now() - startTime) / 1000;
+                if (elapsedTime > 0) {
+                    uploadSpeed.textContent = `${formatBytes(totalUploadedBytes / elapsedTime)}/s`;
+                }
+            };
 
-            const uploadNextChunk = async () => {
-                if (uploadCancelled) {
-                    return;
+            // Next run of consecutive chunks, at most rate.chunksPerRequest long
+            const takeRun = () => {
+                if (retryQueue.length > 0) return retryQueue.shift();
+                if (nextPending >= pendingChunks.length) return null;
+                const first = pendingChunks[nextPending];
+                let count = 1;
+                while (count < rate.chunksPerRequest && nextPending + count < pendingChunks.length &&
+                        pendingChunks[nextPending + count] === first + count) {
+                    count++;
                 }
+                nextPending += count;
+                return { first, count, retryCount: 0 };
+            };
 
-                // First check retry queue, then get next new chunk
-                let chunk;
-                if (retryQueue.length > 0) {
-                    chunk = retryQueue.shift(); // Get chunk from retry queue
-                } else if (chunkIndex < chunks.length) {
-                    chunk = chunks[chunkIndex++]; // Get next new chunk
-                    chunk.retryCount = chunk.retryCount || 0;
-                } else {
-                    return; // No more chunks to process
+            const fillPipeline = () => {
+                while (!uploadCancelled && activeUploads.size < rate.concurrency &&
+                        (retryQueue.length > 0 || nextPending < pendingChunks.length)) {
+                    uploadNextRun(takeRun());
                 }
-                
+            };
+
+            const uploadNextRun = async (run) => {
                 // Add to active uploads for concurrency control
-                activeUploads.add(chunk.index);
-                
-                const chunkData = file.slice(chunk.start, chunk.end);
-                
-                const formData = new FormData();
-                formData.append('chunk', chunkData);
-                formData.append('uploadId', uploadId);
-                formData.append('chunkIndex', chunk.index);
-                formData.append('totalChunks', totalChunks);
-                formData.append('filename', file.name);
-                formData.append('path', uploadDirectory);
+                activeUploads.add(run);
+                const start = run.first * chunkSizeBytes;
+                const end = Math.min((run.first + run.count) * chunkSizeBytes, file.size);
+                const runData = file.slice(start, end);
+
+                // A chunk damaged on the way fails verification and goes through the retry below
+                let runChecksums = [];
+                for (let i = run.first; i < run.first + run.count && runChecksums; i++) {
+                    const checksum = chunkDigests ? chunkDigests[i]
+                        : await hashBlob(file.slice(i * chunkSizeBytes, (i + 1) * chunkSizeBytes), config.checksum_algorithm);
+                    runChecksums = checksum ? [...runChecksums, checksum] : null;
+                }
+                if (uploadCancelled) {
+                    activeUploads.delete(run);
+                    return;
+                }
+
+                // Sent as a raw body (parameters in the query), which the server streams
+                // straight into the file instead of spooling a multipart form first
+                const chunkParams = new URLSearchParams({
+                    uploadId,
+                    chunkIndex: run.first,
+                    chunkCount: run.count,
+                    totalChunks,
+                    filename: file.name,
+                    path: uploadDirectory,
+                    chunkSize: chunkSizeBytes, // Lets the server write the chunks at their offset
+                    fileSize: file.size
+                });
+                if (runChecksums) chunkParams.set('chunkChecksum', runChecksums.join(','));
 
+                await acquireUploadConnection();
+                if (uploadCancelled) {
+                    releaseUploadConnection();
+                    activeUploads.delete(run);
+                    return;
+                }
+                const requestStart = performance.now();
+                let bodySent = requestStart;
                 try {
-                    // Use XMLHttpRequest for chunk upload to better handle FormData
                     const response = await new Promise((resolve, reject) => {
                         const xhr = new XMLHttpRequest();
-                        xhr.open('POST', '/api/upload/chunk');
+                        xhr.open('POST', `/api/upload/chunk?${chunkParams}`);
+                        xhr.setRequestHeader('Content-Type', 'application/octet-stream');
+                        xhr.timeout = UPLOAD_REQUEST_TIMEOUT_MS;
                         
                         // Update speed during upload
                         xhr.upload.addEventListener('progress', (e) => {
                             if (e.lengthComputable && !uploadCancelled) {
-                                // Update bytes for this specific chunk (for speed calculation)
-                                chunkBytesUploaded[chunk.index] = e.loaded;
-                                
-                                // Calculate total uploaded bytes and speed
-                                const totalUploadedBytes = chunkBytesUploaded.reduce((sum, bytes) => sum + bytes, 0);
-                                const elapsedTime = (Date.now() - startTime) / 1000;
-                                if (elapsedTime > 0) {
-                                    const speed = totalUploadedBytes / elapsedTime;
-                                    uploadSpeed.textContent = `${formatBytes(speed)}/s`;
-                                }
+                                chunkBytesUploaded[run.first] = e.loaded; // Credited to the run's first chunk until done
+                                updateSpeed();
                             }
                         });
+                        // Body on the wire; what follows until the response is server time plus round trip
+                        xhr.upload.addEventListener('load', () => { bodySent = performance.now(); });
                         
                         xhr.onload = () => {
                             if (xhr.status === 200) {
@@ -2029,97 +2543,114 @@ document.addEventListener('DOMContentLoaded', () => {
                                     reject(new Error('Invalid response format'));
                                 }
                             } else {
-                                reject(new Error(`HTTP ${xhr.status}: ${xhr.statusText}`));
+                                let body = null;
+                                try {
+                                    body = JSON.parse(xhr.responseText);
+                                } catch (e) { /* A proxy's error page */ }
+                                const error = new Error((body && body.error) || `HTTP ${xhr.status}: ${xhr.statusText}`);
+                                error.insufficientStorage = xhr.status === 507; // Retrying won't free any disk space
+                                error.resumable = xhr.status >= 500 && !error.insufficientStorage; // Server or proxy trouble, not a rejected upload
+                                if (xhr.status === 503 && body && body.backpressure) {
+                                    error.retryAfter = body.retry_after || 1;
+                                }
+                                reject(error);
                             }
                         };
-                        xhr.onerror = () => reject(new Error('Network error'));
-                        xhr.send(formData);
-                    });
+                        xhr.onerror = () => reject(Object.assign(new Error('Network error'), { resumable: true }));
+                        xhr.ontimeout = () => reject(Object.assign(new Error('Request timed out'), { resumable: true }));
+                        xhr.send(runData);
+                    }).finally(releaseUploadConnection);
 
                     if (uploadCancelled) return;
 
                     if (response.success) {
-                        // Mark chunk as completed and set full chunk size for speed calculation
-                        if (chunksStatus[chunk.index] !== 'completed') {
-                            chunksStatus[chunk.index] = 'completed';
-                            chunkBytesUploaded[chunk.index] = chunkData.size; // Full chunk size
+                        for (let i = run.first; i < run.first + run.count; i++) {
+                            chunkBytesUploaded[i] = Math.min(chunkSizeBytes, file.size - i * chunkSizeBytes);
                         }
+                        const now = performance.now();
+                        rate.onSuccess({
+                            bytes: runData.size,
+                            seconds: (now - requestStart) / 1000,
+                            latency: (now - bodySent) / 1000,
+                            serverBusy: response.server_busy
+                        });
                         
                         // Update progress based on API response
                         if (response.progress !== undefined) {
                             progressBar.style.width = response.progress + '%';
                             progressText.textContent = `${Math.round(response.progress)}%`;
                         }
-                        
-                        // Update speed calculation (keep this exactly as before)
-                        const totalUploadedBytes = chunkBytesUploaded.reduce((sum, bytes) => sum + bytes, 0);
-                        const elapsedTime = (Date.now() - startTime) / 1000;
-                        if (elapsedTime > 0) {
-                            const speed = totalUploadedBytes / elapsedTime;
-                            uploadSpeed.textContent = `${formatBytes(speed)}/s`;
+                        updateSpeed();
+
+                        if (response.finalizing) {
+                            // Every chunk is in; the server finishes the file in the background
+                            progressText.textContent = 'Finalizing...';
+                            try {
+                                await waitForUploadJob(response.job_id, (job) => {
+                                    progressText.textContent = `Finalizing... ${job.progress}%`;
+                                });
+                            } catch (error) {
+                                failUpload(error.message);
+                                return;
+                            }
                         }
 
-                        if (response.completed) {
-                            // Upload completed
-                            progressText.textContent = 'Upload complete!';
-                            progressBar.style.backgroundColor = 'var(--success-color)';
-                            showToast(`File "${file.name}" uploaded successfully.`, 'success');
-                            
-                            // Refresh file list if we're still in the upload directory
-                            if (currentDirectory === uploadDirectory) {
-                                loadFiles(currentDirectory);
-                            }
-                            
-                            // Auto-hide after 5 seconds
-                            setTimeout(() => {
-                                progressItem.style.transition = 'opacity 1s ease';
-                                progressItem.style.opacity = '0';
-                                setTimeout(() => {
-                                    if (progressItem.parentNode) {
-                                        progressItem.parentNode.removeChild(progressItem);
-                                    }
-                                }, 1000);
-                            }, 5000);
-                        } else {
-                            // Continue uploading next chunk if we have capacity
-                            if (activeUploads.size < maxConcurrent) {
-                                uploadNextChunk();
-                            }
+                        if (response.completed || response.finalizing) {
+                            completeUpload();
                         }
                     } else {
                         throw new Error(response.error || 'Chunk upload failed');
                     }
                 } catch (error) {
-                    // Reset bytes for this chunk on failure (for speed calculation)
-                    chunkBytesUploaded[chunk.index] = 0;
+                    // Reset bytes for this run on failure (for speed calculation)
+                    for (let i = run.first; i < run.first + run.count; i++) chunkBytesUploaded[i] = 0;
+                    if (uploadCancelled) return;
+
+                    if (error.retryAfter) {
+                        // The server is saturated: fewer requests in flight, and this one again once it has room
+                        rate.onFailure({ backpressure: true });
+                        activeUploads.delete(run);
+                        setTimeout(() => {
+                            retryQueue.push(run);
+                            fillPipeline();
+                        }, error.retryAfter * 1000);
+                        return;
+                    }
+                    if (error.resumable) rate.onFailure({ backpressure: false });
                     
                     // Retry logic: allow up to 3 retries for non-200 responses
-                    if (!uploadCancelled && chunk.retryCount < 3 && chunksStatus[chunk.index] !== 'completed') {
-                        chunk.retryCount++;
-                        chunksStatus[chunk.index] = 'retrying';
-                        console.warn(`Chunk ${chunk.index} failed, retrying (${chunk.retryCount}/3):`, error.message);
+                    if (run.retryCount < 3 && !error.insufficientStorage) {
+                        run.retryCount++;
+                        console.warn(`Chunks ${run.first}-${run.first + run.count - 1} failed, retrying (${run.retryCount}/3):`, error.message);
                         
                         // Remove from active uploads before retry
-                        activeUploads.delete(chunk.index);
+                        activeUploads.delete(run);
                         
                         // Schedule retry with exponential backoff
                         setTimeout(() => {
                             if (!uploadCancelled) {
-                                // Add the failed chunk to retry queue
-                                retryQueue.push(chunk);
-                                // Start processing retry queue
-                                uploadNextChunk();
+                                retryQueue.push(run);
+                                fillPipeline();
                             }
-                        }, 1000 * chunk.retryCount);
+                        }, 1000 * run.retryCount);
                         return;
                     }
                     
-                    if (!uploadCancelled) {
+                    if (error.resumable) {
+                        // Keep what the server has; carry on from there once the connection is back
+                        console.warn('Chunk upload failed after 3 retries, waiting to resume:', error);
+                        uploadCancelled = true;
+                        progressText.textContent = 'Interrupted, will resume when reconnected';
+                        progressBar.style.backgroundColor = 'var(--warning-color, orange)';
+                        endUpload('interrupted');
+                        pendingUploadResumes.push(() => {
+                            if (progressItem.parentNode) progressItem.parentNode.removeChild(progressItem);
+                            handleFileUploads([file], uploadDirectory);
+                        });
+                    } else {
                         console.error('Chunk upload failed after 3 retries:', error);
                         uploadCancelled = true;
-                        progressText.textContent = 'Upload failed!';
-                        progressBar.style.backgroundColor = 'var(--error-color)';
-                        showToast(`Failed to upload "${file.name}": ${error.message}`, 'error');
+                        failUpload(error.message);
                         
                         // Try to cancel on server
                         try {
@@ -2132,27 +2663,294 @@ document.addEventListener('DOMContentLoaded', () => {
                         }
                     }
                 } finally {
-                    // Always remove from active uploads when done (successful or failed)
-                    activeUploads.delete(chunk.index);
-                    
-                    // Start next chunk if we have capacity and there are chunks remaining (new or retry)
-                    if (!uploadCancelled && (chunkIndex < chunks.length || retryQueue.length > 0) && activeUploads.size < maxConcurrent) {
-                        uploadNextChunk();
-                    }
+                    // Always remove from active uploads when done (successful or failed), then top up
+                    activeUploads.delete(run);
+                    fillPipeline();
                 }
             };
 
-            // Start initial concurrent uploads
-            for (let i = 0; i < Math.min(maxConcurrent, totalChunks); i++) {
-                uploadNextChunk();
-            }
+            fillPipeline();
+            await finished;
 
         } catch (error) {
             if (!uploadCancelled) {
-                progressText.textContent = 'Upload failed!';
-                progressBar.style.backgroundColor = 'var(--error-color)';
-                showToast(`Failed to upload "${file.name}": ${error.message}`, 'error');
+                failUpload(error.message);
+            }
+        }
+    }
+
+    // Uploads a bundle of small files (and the empty folders of a drop) as one tar stream to
+    // /api/upload/bundle, which unpacks it into the batch's directory as it arrives
+    async function uploadBundle(bundle, batch) {
+        const relativeDirectory = (file) => batch.directoryOf(file).slice(batch.directory.length).replace(/^\//, '');
+        const entries = bundle.folders.map(path => ({ path, file: null }));
+        const paths = new Map(); // file -> path in the bundle
+        for (const file of bundle.files) {
+            const name = secureFilename(file.name);
+            if (!name) {
+                batch.fileEnded(file, 'failed', 'Invalid filename.');
+                continue;
+            }
+            paths.set(file, joinUploadPath(relativeDirectory(file), name));
+            entries.push({ path: paths.get(file), file });
+        }
+        const body = buildTarBundle(entries);
+
+        await acquireUploadConnection();
+        try {
+            const response = await new Promise((resolve, reject) => {
+                const xhr = new XMLHttpRequest();
+                xhr.upload.addEventListener('progress', (e) => {
+                    if (e.lengthComputable) {
+                        batch.setLoaded(bundle, e.loaded / e.total * bundle.bytes); // Without the tar headers
+                    }
+                });
+                xhr.addEventListener('load', () => {
+                    try {
+                        resolve(JSON.parse(xhr.responseText));
+                    } catch (e) {
+                        reject(new Error(`HTTP ${xhr.status}: ${xhr.statusText}`));
+                    }
+                });
+                xhr.addEventListener('error', () => reject(new Error('Network error')));
+                xhr.open('POST', `/api/upload/bundle?${new URLSearchParams({ path: batch.directory })}`);
+                xhr.setRequestHeader('Content-Type', 'application/x-tar');
+                xhr.send(body);
+            });
+            if (!response.success) {
+                throw new Error(response.error || 'Upload failed');
+            }
+
+            const failures = new Map(response.errors.map(error => [error.path, error.error]));
+            batch.setLoaded(bundle, 0);
+            for (const [file, path] of paths) {
+                if (failures.has(path)) {
+                    batch.fileEnded(file, 'failed', failures.get(path));
+                } else {
+                    batch.setLoaded(file, file.size);
+                    batch.fileEnded(file, 'done');
+                }
+            }
+        } catch (error) {
+            batch.setLoaded(bundle, 0);
+            for (const file of paths.keys()) {
+                batch.fileEnded(file, 'failed', error.message);
+            }
+        } finally {
+            releaseUploadConnection();
+        }
+    }
+
+    // Tar (ustar, with a pax header for long or non-ASCII paths) of entries { path, file }, file
+    // null for a folder. The files are referenced, not read: the browser streams them when sending.
+    function buildTarBundle(entries) {
+        const parts = [];
+        const padding = (size) => new Uint8Array((TAR_BLOCK_SIZE - size % TAR_BLOCK_SIZE) % TAR_BLOCK_SIZE);
+        for (const { path, file } of entries) {
+            const name = file ? path : `${path}/`;
+            const mtime = Math.floor((file ? file.lastModified : Date.now()) / 1000);
+            const encodedName = new TextEncoder().encode(name);
+            if (encodedName.length > 100 || encodedName.length !== name.length) {
+                const record = paxRecord('path', name);
+                parts.push(tarHeader('PaxHeader', record.length, mtime, 'x'), record, padding(record.length));
+            }
+            parts.push(tarHeader(name, file ? file.size : 0, mtime, file ? '0' : '5'));
+            if (file) parts.push(file, padding(file.size));
+        }
+        parts.push(new Uint8Array(TAR_BLOCK_SIZE * 2)); // End of archive
+        return new Blob(parts, { type: 'application/x-tar' });
+    }
+
+    function tarHeader(name, size, mtime, type) {
+        const header = new Uint8Array(TAR_BLOCK_SIZE);
+        const encoder = new TextEncoder();
+        const put = (text, offset, length) => header.set(encoder.encode(text).subarray(0, length), offset);
+        const octal = (value, length) => value.toString(8).padStart(length - 1, '0') + '\0';
+        put(name, 0, 100); // Truncated when a pax header carries the full path
+        put(octal(type === '5' ? 0o755 : 0o644, 8), 100, 8);
+        put(octal(0, 8), 108, 8);
+        put(octal(0, 8), 116, 8);
+        put(octal(size, 12), 124, 12);
+        put(octal(mtime, 12), 136, 12);
+        put(' '.repeat(8), 148, 8); // Checksum counts as spaces while it is computed
+        put(type, 156, 1);
+        put('ustar\0', 257, 6);
+        put('00', 263, 2);
+        const checksum = header.reduce((sum, byte) => sum + byte, 0);
+        put(checksum.toString(8).padStart(6, '0') + '\0 ', 148, 8);
+        return header;
+    }
+
+    function paxRecord(key, value) {
+        // "<length> <key>=<value>\n", where the length counts its own digits
+        const body = new TextEncoder().encode(` ${key}=${value}\n`);
+        let length = body.length + String(body.length).length;
+        length = body.length + String(length).length;
+        const record = new Uint8Array(length);
+        record.set(new TextEncoder().encode(String(length)));
+        record.set(body, length - body.length);
+        return record;
+    }
+
+    // Client-side copy of werkzeug's secure_filename(), so folders of dropped files come out
+    // the same whether their files are bundled or uploaded on their own
+    function secureFilename(name) {
+        const ascii = name.normalize('NFKD').replace(/[^\x00-\x7f]/g, '').replace(/\//g, ' ');
+        return ascii.split(/\s+/).filter(Boolean).join('_').replace(/[^A-Za-z0-9_.-]/g, '').replace(/^[._]+|[._]+$/g, '');
+    }
+
+    function joinUploadPath(...parts) {
+        return parts.filter(Boolean).join('/');
+    }
+
+    // AIMD control of one upload's request size (in chunks) and concurrency, within the bounds the
+    // server advertises. Fast requests on an idle server grow the request size additively, and each
+    // round of `concurrency` requests that raised throughput (or was dominated by latency) adds one
+    // request in flight. Timeouts, errors and server backpressure halve them.
+    function createUploadRateController(config) {
+        const unitMb = config.min_chunk_size_mb || config.chunk_size_mb;
+        const maxChunksPerRequest = Math.max(1, Math.floor((config.max_chunk_size_mb || config.chunk_size_mb) / unitMb));
+        const initialChunksPerRequest = Math.min(maxChunksPerRequest, Math.max(1, Math.round(config.chunk_size_mb / unitMb)));
+        const sizeStep = Math.max(1, Math.round(initialChunksPerRequest / 2));
+        const maxConcurrency = Math.max(1, config.max_concurrency || config.max_concurrent_chunks || 3);
+        const serverBusy = config.load ? config.load.busy : 0;
+
+        let roundStart = performance.now();
+        let roundBytes = 0;
+        let roundRequests = 0;
+        let lastThroughput = 0;
+        const startRound = () => {
+            roundStart = performance.now();
+            roundBytes = 0;
+            roundRequests = 0;
+        };
+
+        const rate = {
+            chunksPerRequest: initialChunksPerRequest,
+            concurrency: serverBusy >= UPLOAD_BUSY_THRESHOLD ? 1 : Math.min(maxConcurrency, config.max_concurrent_chunks || 3),
+            onSuccess({ bytes, seconds, latency, serverBusy }) {
+                if (serverBusy >= 1) {
+                    rate.onFailure({ backpressure: true });
+                    return;
+                }
+                const canGrow = serverBusy === undefined || serverBusy < UPLOAD_BUSY_THRESHOLD;
+                if (seconds > UPLOAD_TARGET_REQUEST_SECONDS * 2) {
+                    // Slow link: smaller requests, so they don't run into timeouts
+                    rate.chunksPerRequest = Math.max(1, Math.floor(rate.chunksPerRequest / 2));
+                } else if (canGrow && seconds < UPLOAD_TARGET_REQUEST_SECONDS / 2) {
+                    rate.chunksPerRequest = Math.min(maxChunksPerRequest, rate.chunksPerRequest + sizeStep);
+                }
+
+                roundBytes += bytes;
+                roundRequests++;
+                if (roundRequests >= rate.concurrency) {
+                    const throughput = roundBytes / Math.max(0.001, (performance.now() - roundStart) / 1000);
+                    if (canGrow && (throughput > lastThroughput * 1.1 || latency > seconds / 4)) {
+                        rate.concurrency = Math.min(maxConcurrency, rate.concurrency + 1);
+                    }
+                    lastThroughput = throughput;
+                    startRound();
+                }
+            },
+            onFailure({ backpressure }) {
+                rate.concurrency = Math.max(1, Math.floor(rate.concurrency / 2));
+                if (!backpressure) rate.chunksPerRequest = Math.max(1, Math.floor(rate.chunksPerRequest / 2));
+                startRound();
+            }
+        };
+        return rate;
+    }
+
+    // Resolves once the server job finalizing an upload is done (rejects if it failed).
+    // Updates arrive as 'upload_job' events; polling covers missed events and lost connections.
+    function waitForUploadJob(jobId, onProgress) {
+        return new Promise((resolve, reject) => {
+            const waiter = { onProgress, pollTimer: null };
+            waiter.settle = (job) => {
+                if (job.status === 'done' || job.status === 'error') {
+                    clearInterval(waiter.pollTimer);
+                    uploadJobWaiters.delete(jobId);
+                    if (job.status === 'done') resolve(job);
+                    else reject(new Error(job.error || 'Finalizing the upload failed'));
+                } else if (onProgress) {
+                    onProgress(job);
+                }
+            };
+            uploadJobWaiters.set(jobId, waiter);
+            const poll = async () => {
+                const job = await fetchAPI(`/api/upload/jobs/${jobId}`);
+                if (job && uploadJobWaiters.has(jobId)) waiter.settle(job);
+            };
+            waiter.pollTimer = setInterval(poll, UPLOAD_JOB_POLL_INTERVAL_MS);
+            poll();
+        });
+    }
+
+    // Server-side state of a chunked upload (missing chunks, or its finalizing job), or null if unknown
+    async function getUploadStatus(uploadId) {
+        try {
+            const response = await fetch(`/api/upload/status?uploadId=${encodeURIComponent(uploadId)}`, {
+                headers: { 'X-Requested-With': 'XMLHttpRequest' }
+            });
+            return response.ok ? await response.json() : null;
+        } catch (error) {
+            return null;
+        }
+    }
+
+    // Hex digest of a Blob in the server's checksum algorithm, computed in a Web Worker. Null when the
+    // browser can't compute it (no WebCrypto outside secure contexts, or an algorithm it doesn't have);
+    // the upload then goes without checksums.
+    function hashBlob(blob, algorithm) {
+        const webCryptoAlgorithm = WEBCRYPTO_ALGORITHMS[algorithm];
+        if (!webCryptoAlgorithm || !window.Worker || !window.isSecureContext) return Promise.resolve(null);
+        if (!hashWorker) {
+            try {
+                hashWorker = new Worker(HASH_WORKER_URL);
+            } catch (error) {
+                console.warn('Checksum worker unavailable:', error);
+                return Promise.resolve(null);
             }
+            hashWorker.onmessage = (event) => {
+                const resolve = hashRequests.get(event.data.id);
+                hashRequests.delete(event.data.id);
+                if (event.data.error) console.warn('Checksum failed:', event.data.error);
+                if (resolve) resolve(event.data.digest || null);
+            };
+        }
+        return new Promise((resolve) => {
+            const id = ++hashRequestId;
+            hashRequests.set(id, resolve);
+            hashWorker.postMessage({ id, blob, algorithm: webCryptoAlgorithm });
+        });
+    }
+
+    // Digests of every chunk of a file, hashed one after the other (a chunk in memory at a time).
+    // Null if the browser can't hash or the upload was cancelled meanwhile.
+    async function hashFileChunks(file, chunkSizeBytes, totalChunks, algorithm, onProgress, isCancelled) {
+        const digests = [];
+        for (let i = 0; i < totalChunks; i++) {
+            if (isCancelled()) return null;
+            const digest = await hashBlob(file.slice(i * chunkSizeBytes, (i + 1) * chunkSizeBytes), algorithm);
+            if (!digest) return null;
+            digests.push(digest);
+            onProgress(i + 1);
+        }
+        return digests;
+    }
+
+    // Deduplicated start of a chunked upload; the upload status after the server copied what it had,
+    // or null (the upload then simply sends every chunk)
+    async function requestUploadDedup(params) {
+        try {
+            const response = await fetch('/api/upload/dedup', {
+                method: 'POST',
+                headers: { 'Content-Type': 'application/json', 'X-Requested-With': 'XMLHttpRequest' },
+                body: JSON.stringify(params)
+            });
+            return response.ok ? await response.json() : null;
+        } catch (error) {
+            return null;
         }
     }
 
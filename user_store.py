@@ -0,0 +1,137 @@
+import os
+import sqlite3
+import datetime
+import threading
+
+USER_DB_FILE = "users.db"   # SQLite database holding users and their known browsers
+MAX_BROWSER_HISTORY = 5     # Maximum number of browser entries to keep per user
+
+BROWSER_FIELDS = ("browser_identity", "ip_address", "user_agent", "session_id", "first_login", "last_login")
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS users (
+    username TEXT PRIMARY KEY,
+    created_at TEXT NOT NULL
+);
+CREATE TABLE IF NOT EXISTS browsers (
+    username TEXT NOT NULL REFERENCES users(username) ON DELETE CASCADE,
+    browser_identity TEXT NOT NULL,
+    ip_address TEXT,
+    user_agent TEXT,
+    session_id TEXT,
+    first_login TEXT NOT NULL,
+    last_login TEXT NOT NULL,
+    PRIMARY KEY (username, browser_identity)
+);
+CREATE INDEX IF NOT EXISTS idx_browsers_identity ON browsers(browser_identity);
+CREATE INDEX IF NOT EXISTS idx_browsers_last_login ON browsers(username, last_login);
+"""
+
+
+class UserStore:
+    """
+    Users and the browsers they logged in from, kept in SQLite (WAL mode) instead of
+    config.yml. Lookups go through the (username, browser_identity) primary key, so
+    resolving a request's browser is a single indexed read instead of a list scan.
+    """
+
+    def __init__(self, db_path=USER_DB_FILE, max_browser_history=MAX_BROWSER_HISTORY):
+        self.db_path = os.path.abspath(db_path)
+        self.max_browser_history = max_browser_history
+        self._local = threading.local()
+        self._write_lock = threading.Lock()
+        with self._write_lock:
+            conn = self._connect()
+            conn.executescript(SCHEMA)
+            conn.commit()
+
+    def _connect(self):
+        """Returns this thread's connection, opening it on first use."""
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            conn = sqlite3.connect(self.db_path, timeout=10)
+            conn.row_factory = sqlite3.Row
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            conn.execute("PRAGMA foreign_keys=ON")
+            self._local.conn = conn
+        return conn
+
+    def record_login(self, username, browser_data):
+        """
+        Registers a login for `username` from the browser described by `browser_data`
+        (see auth.get_browser_data). Keeps only the newest MAX_BROWSER_HISTORY browsers.
+        Returns the stored browser record.
+        """
+        now = browser_data.get("last_login") or datetime.datetime.now().isoformat()
+        with self._write_lock:
+            conn = self._connect()
+            with conn:
+                conn.execute("INSERT OR IGNORE INTO users (username, created_at) VALUES (?, ?)", (username, now))
+                conn.execute(
+                    """
+                    INSERT INTO browsers (username, browser_identity, ip_address, user_agent, session_id, first_login, last_login)
+                    VALUES (?, ?, ?, ?, ?, ?, ?)
+                    ON CONFLICT (username, browser_identity) DO UPDATE SET
+                        ip_address = excluded.ip_address,
+                        session_id = excluded.session_id,
+                        last_login = excluded.last_login
+                    """,
+                    (username, browser_data["browser_identity"], browser_data.get("ip_address"),
+                     browser_data.get("user_agent"), browser_data.get("session_id"),
+                     browser_data.get("first_login") or now, now)
+                )
+                conn.execute(
+                    """
+                    DELETE FROM browsers WHERE username = ? AND browser_identity NOT IN (
+                        SELECT browser_identity FROM browsers WHERE username = ?
+                        ORDER BY last_login DESC LIMIT ?
+                    )
+                    """,
+                    (username, username, self.max_browser_history)
+                )
+        return self.get_browser(username, browser_data["browser_identity"])
+
+    def user_exists(self, username):
+        row = self._connect().execute("SELECT 1 FROM users WHERE username = ?", (username,)).fetchone()
+        return row is not None
+
+    def get_browser(self, username, browser_identity):
+        """Returns the browser record for this user and fingerprint, or None."""
+        row = self._connect().execute(
+            f"SELECT {', '.join(BROWSER_FIELDS)} FROM browsers WHERE username = ? AND browser_identity = ?",
+            (username, browser_identity)
+        ).fetchone()
+        return dict(row) if row else None
+
+    def get_browsers(self, username):
+        """Returns all known browsers for a user, most recent login first."""
+        rows = self._connect().execute(
+            f"SELECT {', '.join(BROWSER_FIELDS)} FROM browsers WHERE username = ? ORDER BY last_login DESC",
+            (username,)
+        ).fetchall()
+        return [dict(row) for row in rows]
+
+    def count_users(self):
+        return self._connect().execute("SELECT COUNT(*) FROM users").fetchone()[0]
+
+    def import_from_config(self, users_dict):
+        """Imports the legacy `users` -> `browsers` structure that used to live in config.yml."""
+        imported = 0
+        for username, user_details in (users_dict or {}).items():
+            browsers = (user_details or {}).get("browsers") or []
+            now = datetime.datetime.now().isoformat()
+            with self._write_lock:
+                conn = self._connect()
+                with conn:
+                    conn.execute("INSERT OR IGNORE INTO users (username, created_at) VALUES (?, ?)", (username, now))
+                    for browser in browsers:
+                        if not browser.get("browser_identity"):
+                            continue
+                        conn.execute(
+                            f"INSERT OR IGNORE INTO browsers (username, {', '.join(BROWSER_FIELDS)}) VALUES (?, ?, ?, ?, ?, ?, ?)",
+                            (username,) + tuple(browser.get(field) or (now if field.endswith("_login") else None)
+                                                for field in BROWSER_FIELDS)
+                        )
+            imported += 1
+        return imported